@@ -0,0 +1,69 @@
+"""Benchmark cold start: import time of the entry points and time until a fresh server answers /ready."""
+
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+NUM_RUNS = 5
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def server_env(tmp: Path) -> dict[str, str]:
+    return {
+        **os.environ,
+        "DATA_PATH": str(Path(__file__).resolve().parents[2] / "data"),
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "unused"),
+        "STORE_PATH": str(tmp / "store.sqlite3"),
+        "TRACE_PATH": str(tmp / "traces.jsonl"),
+        "WARMUP": "0",
+    }
+
+
+def import_time(module: str, env: dict[str, str]) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", f"import {module}"], env=env, check=True, capture_output=True)
+    return time.perf_counter() - start
+
+
+def time_to_ready(env: dict[str, str]) -> float:
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "eeva", "--port", str(port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=1):
+                    return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError):
+                if process.poll() is not None:
+                    raise RuntimeError("Server exited before becoming ready") from None
+                time.sleep(0.01)
+    finally:
+        process.terminate()
+        process.wait()
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        env = server_env(Path(tmp))
+        for module in ["eeva.app", "eeva.experiment.run"]:
+            times = sorted(import_time(module, env) for _ in range(NUM_RUNS))
+            print(f"import {module:<20} | median {times[NUM_RUNS // 2]:.3f}s | min {times[0]:.3f}s")
+        times = sorted(time_to_ready(env) for _ in range(NUM_RUNS))
+        print(f"{'first /ready':<27} | median {times[NUM_RUNS // 2]:.3f}s | min {times[0]:.3f}s")
@@ -0,0 +1,222 @@
+"""Benchmark loading and filtering experiment data snapshots at 10k and 100k users.
+
+Compares validating a snapshot from JSON with building it from parsed JSON without validation, revalidating set
+rebuilds with unvalidated ones, and per-sample results as pydantic models with the slotted `AnalysisResult`.
+"""
+
+import json
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from random import Random
+from typing import Any, Callable, TypeVar
+
+from pydantic import BaseModel, Field
+
+from eeva.experiment import run
+from eeva.experiment.analysis import AnalysisResult
+from eeva.experiment.answer_index import AnswerIndex
+from eeva.experiment.types import (
+    BaseData,
+    CouplePairs,
+    Profile,
+    Question,
+    QuestionResponse,
+    QuestionSet,
+    QuestionTranslation,
+    Response,
+    RunConfig,
+    User,
+    UserId,
+    UserSet,
+)
+from eeva.models import ModelSpecifier, UsageData
+
+NUM_QUESTIONS = 30
+ANSWERS_PER_USER = 12
+NUM_RESULTS = 200_000
+WORDS = "the a to of and I my it is in that with for on was me so be have like".split()
+
+T = TypeVar("T")
+
+
+class LegacyAnalysisResult(BaseModel):
+    """`AnalysisResult` as it was before it became a slotted dataclass."""
+
+    profile: Profile = Field()
+    cot: str | None = Field()
+    response_metadata: UsageData = Field()
+    model: ModelSpecifier | None = Field(default=None)
+
+
+def construct_base_data(data: dict) -> BaseData:
+    """Build a snapshot with `model_construct` instead of validating it."""
+    return BaseData.model_construct(
+        users=UserSet.model_construct(
+            root={
+                UserId.model_construct(root=user_id): User.model_construct(
+                    response=Response.model_construct(
+                        first_name=user["response"]["first_name"],
+                        last_name=user["response"]["last_name"],
+                        responses={
+                            question_id: QuestionResponse.model_construct(**response)
+                            for question_id, response in user["response"]["responses"].items()
+                        },
+                    ),
+                    prod_profile=None,
+                    language_code=user["language_code"],
+                    hidden=user["hidden"],
+                )
+                for user_id, user in data["users"].items()
+            }
+        ),
+        questions=QuestionSet.model_construct(
+            root={
+                question_id: Question.model_construct(
+                    translations={
+                        language: QuestionTranslation.model_construct(**translation)
+                        for language, translation in question["translations"].items()
+                    },
+                    active=question["active"],
+                )
+                for question_id, question in data["questions"].items()
+            }
+        ),
+    )
+
+
+def text(rng: Random, num_words: int) -> str:
+    return " ".join(rng.choices(WORDS, k=num_words))
+
+
+def snapshot(num_users: int, rng: Random) -> dict[str, dict[str, dict[str, Any]]]:
+    questions: dict[str, dict[str, Any]] = {
+        f"q{i}": {
+            "translations": {
+                language: {"text": text(rng, 8), "examples": [text(rng, rng.randint(20, 60)) for _ in range(3)]}
+                for language in ["en", "da"]
+            },
+            "active": True,
+        }
+        for i in range(NUM_QUESTIONS)
+    }
+    users = {
+        f"user-{i}": {
+            "response": {
+                "first_name": "First",
+                "last_name": "Last",
+                "responses": {
+                    question_id: {
+                        "question": questions[question_id]["translations"]["en"]["text"],
+                        "response": text(rng, rng.randint(0, 60)),
+                    }
+                    for question_id in rng.sample(sorted(questions), ANSWERS_PER_USER)
+                },
+            },
+            "prod_profile": None,
+            "language_code": rng.choice(["en", "da"]),
+            "hidden": False,
+        }
+        for i in range(num_users)
+    }
+    return {"users": users, "questions": questions}
+
+
+def timed(f: Callable[[], T]) -> tuple[float, T]:
+    start = time.perf_counter()
+    result = f()
+    return time.perf_counter() - start, result
+
+
+def bench_load_and_filter(num_users: int, rng: Random) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp)
+        (data_dir / "user_sets").mkdir()
+        (data_dir / "user_sets" / "exclude.txt").write_text("\n".join(f"user-{i}" for i in range(0, num_users, 50)))
+        raw = snapshot(num_users, rng)
+        data_path = data_dir / "base_data.json"
+        data_path.write_text(json.dumps(raw))
+        data = data_path.read_bytes()
+
+        validated_time, base_data = timed(lambda: BaseData.model_validate_json(data))
+        constructed_time, _ = timed(lambda: construct_base_data(json.loads(data)))
+        print(f"{num_users:>7} users: load validated {validated_time:7.3f}s, constructed {constructed_time:7.3f}s")
+        answer_index = AnswerIndex.load_or_build(data_path, base_data)
+
+        users = base_data.users
+        revalidated_time, _ = timed(lambda: UserSet({user_id: user for user_id, user in users.items()}))
+        constructed_time, _ = timed(
+            lambda: UserSet.model_construct(root={user_id: user for user_id, user in users.items()})
+        )
+        print(f"{'':>14} UserSet rebuild validated {revalidated_time:7.3f}s, constructed {constructed_time:7.3f}s")
+
+        def responses(user: User) -> dict[str, QuestionResponse]:
+            return dict(list(user.response.responses.items())[: ANSWERS_PER_USER // 2])
+
+        model_copy_time, _ = timed(
+            lambda: [
+                user.model_copy(update={"response": user.response.model_copy(update={"responses": responses(user)})})
+                for user in users.values()
+            ]
+        )
+        with_responses_time, _ = timed(lambda: [user.with_responses(responses(user)) for user in users.values()])
+        print(f"{'':>14} user copies model_copy {model_copy_time:7.3f}s, with_responses {with_responses_time:7.3f}s")
+
+        config = RunConfig(
+            secrets_path=data_dir,
+            data_dir=data_dir,
+            output_dir=data_dir,
+            model="gpt-5-mini",
+            model_provider="openai",
+            reasoning_effort="low",
+            identity_prompt="",
+            identity_extraction_prompt="",
+            explicit_cot=True,
+            two_step_analysis=False,
+            system_prompt=None,
+            user_prompt="",
+            num_tests=1,
+            question_exclusion_sets=set(),
+            question_inclusion_sets=None,
+            user_exclusion_sets={"exclude"},
+            user_inclusion_sets=None,
+            only_couples=False,
+            answer_progress_minimum=0.3,
+            num_answers_minimum=3,
+        )
+        couple_pairs: CouplePairs = {
+            f"couple-{i}": (UserId(f"user-{2 * i}"), UserId(f"user-{2 * i + 1}")) for i in range(num_users // 4)
+        }
+        questions = run.filter_questions(base_data.questions, config)
+        filter_time, (filtered, _) = timed(
+            lambda: run.filter_users(users, questions, couple_pairs, config, answer_index)
+        )
+        print(f"{'':>14} filter_users {filter_time:7.3f}s, {len(filtered)} users kept")
+
+
+def bench_results() -> None:
+    profile = Profile(identity=0.5)
+    usage = UsageData(input_tokens=1000, cached_input_tokens=500, output_tokens=200, reasoning_tokens=100)
+    for name, make in [
+        ("pydantic model", lambda: LegacyAnalysisResult(profile=profile, cot="cot", response_metadata=usage)),
+        ("slotted dataclass", lambda: AnalysisResult(profile=profile, cot="cot", response_metadata=usage)),
+    ]:
+        tracemalloc.start()
+        start = time.perf_counter()
+        results = [make() for _ in range(NUM_RESULTS)]
+        elapsed = time.perf_counter() - start
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{NUM_RESULTS} results as {name:>17}: {elapsed:6.3f}s, {memory / len(results):5.0f} bytes each")
+
+
+def main() -> None:
+    rng = Random(0)
+    for num_users in [10_000, 100_000]:
+        bench_load_and_filter(num_users, rng)
+    bench_results()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Benchmark the queue-based structured logging pipeline against the previous synchronous handler.
+
+Reports records per second end to end, the time each logging call costs the calling thread, and the worst
+event-loop stall observed while a coroutine logs in bursts.
+"""
+
+import asyncio
+import json
+import logging
+import sys
+import tempfile
+import time
+import traceback
+from typing import Any, Callable
+
+from eeva.server import logging_config
+
+NUM_RECORDS = 100_000
+BURST = 200
+
+LEGACY_RESERVED = [
+    "name",
+    "msg",
+    "args",
+    "levelname",
+    "levelno",
+    "pathname",
+    "filename",
+    "module",
+    "exc_info",
+    "exc_text",
+    "stack_info",
+    "lineno",
+    "funcName",
+    "created",
+    "msecs",
+    "relativeCreated",
+    "thread",
+    "threadName",
+    "processName",
+    "process",
+    "getMessage",
+]
+
+
+class LegacyStructuredFormatter(logging.Formatter):
+    """The formatter as it was before the queue-based pipeline."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        log_entry: dict[str, Any] = {
+            "timestamp": self.formatTime(record),
+            "severity": record.levelname,
+            "message": record.getMessage(),
+            "logger": record.name,
+        }
+        if record.exc_info:
+            exc_text = traceback.format_exception(*record.exc_info)
+            log_entry["exception"] = "\\n".join(line.rstrip() for line in exc_text)
+        for key, value in record.__dict__.items():
+            if key not in LEGACY_RESERVED:
+                log_entry[key] = value
+        return json.dumps(log_entry, ensure_ascii=False, separators=(",", ":"))
+
+
+def setup_legacy() -> None:
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(LegacyStructuredFormatter())
+    root_logger.addHandler(handler)
+    root_logger.setLevel(logging.INFO)
+
+
+def setup_queued() -> None:
+    logging_config.setup_logging()
+
+
+def log_records(logger: logging.Logger, count: int) -> None:
+    for i in range(count):
+        logger.info("Analyzing response for user %s", i, extra={"user_id": f"user-{i}", "endpoint": "/api/analyze"})
+
+
+async def max_loop_lag(logger: logging.Logger) -> float:
+    lag = 0.0
+    done = False
+
+    async def ticker() -> None:
+        nonlocal lag
+        while not done:
+            started = time.perf_counter()
+            await asyncio.sleep(0)
+            lag = max(lag, time.perf_counter() - started)
+
+    async def producer() -> None:
+        nonlocal done
+        for _ in range(NUM_RECORDS // BURST):
+            log_records(logger, BURST)
+            await asyncio.sleep(0)
+        done = True
+
+    await asyncio.gather(ticker(), producer())
+    return lag
+
+
+def bench(name: str, setup: Callable[[], None]) -> None:
+    stdout = sys.stdout
+    with tempfile.TemporaryFile("w", encoding="utf-8") as sink:
+        sys.stdout = sink
+        try:
+            setup()
+            logger = logging.getLogger("eeva.bench")
+
+            start = time.perf_counter()
+            log_records(logger, NUM_RECORDS)
+            caller_time = time.perf_counter() - start
+            logging_config.stop_logging()
+            total_time = time.perf_counter() - start
+
+            setup()
+            lag = asyncio.run(max_loop_lag(logger))
+            logging_config.stop_logging()
+        finally:
+            sys.stdout = stdout
+    print(
+        f"{name:>7} | {NUM_RECORDS / total_time:9.0f} records/s end to end"
+        f" | {caller_time / NUM_RECORDS * 1e6:6.2f}us per call on the caller"
+        f" | max loop stall {lag * 1e3:6.2f}ms per {BURST}-record burst"
+    )
+
+
+if __name__ == "__main__":
+    bench("before", setup_legacy)
+    bench("after", setup_queued)
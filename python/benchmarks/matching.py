@@ -0,0 +1,52 @@
+"""Benchmark the top-k matching index against a linear scan at 100k and 1M stored profiles."""
+
+import time
+from random import Random
+
+from eeva.server.matching import IdentityIndex
+
+K = 10
+NUM_QUERIES = 1_000
+NUM_UPDATES = 1_000
+
+
+def linear_top_k(entries: list[tuple[str, float, bool]], identity: float, k: int) -> list[str]:
+    visible = [(abs(identity - other), user_id) for user_id, other, hidden in entries if not hidden]
+    return [user_id for _, user_id in sorted(visible)[:k]]
+
+
+def bench(num_profiles: int, rng: Random) -> None:
+    # Identity scores from the LLM are coarse, so round to two decimals to get realistic ties.
+    entries = [(f"user-{i}", round(rng.random(), 2), rng.random() < 0.05) for i in range(num_profiles)]
+
+    start = time.perf_counter()
+    index = IdentityIndex(entries)
+    build_time = time.perf_counter() - start
+
+    queries = [rng.random() for _ in range(NUM_QUERIES)]
+    start = time.perf_counter()
+    for identity in queries:
+        index.nearest(identity, K)
+    query_time = (time.perf_counter() - start) / NUM_QUERIES
+
+    start = time.perf_counter()
+    for _ in range(NUM_UPDATES):
+        index.update(f"user-{rng.randrange(num_profiles)}", round(rng.random(), 2))
+    update_time = (time.perf_counter() - start) / NUM_UPDATES
+
+    num_linear = 10
+    start = time.perf_counter()
+    for identity in queries[:num_linear]:
+        linear_top_k(entries, identity, K)
+    linear_time = (time.perf_counter() - start) / num_linear
+
+    print(
+        f"{num_profiles:>9} profiles | build {build_time:7.3f}s | top-{K} query {query_time * 1e6:8.1f}us"
+        f" | update {update_time * 1e6:8.1f}us | linear scan {linear_time * 1e3:8.1f}ms"
+    )
+
+
+if __name__ == "__main__":
+    rng = Random(0)
+    for num_profiles in [100_000, 1_000_000]:
+        bench(num_profiles, rng)
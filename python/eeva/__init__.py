@@ -1,2 +1,15 @@
-from . import experiment as experiment
-from . import utils as utils
+import importlib
+import typing
+
+if typing.TYPE_CHECKING:
+    from . import experiment as experiment
+    from . import utils as utils
+
+_SUBMODULES = {"experiment", "utils"}
+
+
+def __getattr__(name: str):
+    # Submodules are imported on first access so `import eeva` stays cheap for entry points that need only one part.
+    if name in _SUBMODULES:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -11,10 +11,11 @@ def main():
         default="127.0.0.1",
         help="Host to bind the server to",
     )
+    parser.add_argument("--port", type=int, default=8000, help="Port to bind the server to")
     parser.add_argument("--reload", action="store_true", default=False)
     args = parser.parse_args()
 
-    uvicorn.run("eeva.app:app", reload=args.reload, host=args.host)
+    uvicorn.run("eeva.app:app", reload=args.reload, host=args.host, port=args.port)
 
 
 if __name__ == "__main__":
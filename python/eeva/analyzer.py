@@ -1,12 +1,15 @@
 import typing
 from pathlib import Path
-from typing import Annotated
+from typing import Annotated, Any
 
 import aiofiles
-from langchain.chat_models.base import BaseChatModel
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from pydantic import BaseModel, Field
 
+from . import tracing, usage_ledger
+from .models import ModelSpecifier, UsageData, mark_cache_prefix
+
 
 class Profile(BaseModel):
     identity: float = Field(ge=0, le=1)
@@ -36,58 +39,134 @@ ResponseSet = Annotated[dict[str, Response], Field()]
 ProfileSet = Annotated[dict[str, Profile], Field()]
 
 
-async def analyze(response: Response, llm: BaseChatModel, data_path: Path) -> Profile:
-    async with aiofiles.open(data_path / "identity.txt", mode="r", encoding="utf-8") as f:
-        identity_prompt = await f.read()
-    async with aiofiles.open(data_path / "horoscope_helper.txt", mode="r", encoding="utf-8") as f:
-        horoscope_helper_prompt = await f.read()
-    async with aiofiles.open(data_path / "horoscope.txt", mode="r", encoding="utf-8") as f:
-        horoscope_prompt = await f.read()
+def _model_name(llm: BaseChatModel) -> str | None:
+    return getattr(llm, "model_name", None) or getattr(llm, "model", None)
+
+
+def _provider(llm: BaseChatModel) -> str:
+    return {"anthropic-chat": "anthropic", "openai-chat": "openai"}.get(llm._llm_type, llm._llm_type)
+
 
-    class AnalyzerOutput(BaseModel):
-        """ """
+def _trace_usage(message: Any, llm: BaseChatModel) -> None:
+    if isinstance(message, AIMessage) and message.usage_metadata is not None:
+        cached_input_tokens = message.usage_metadata.get("input_token_details", {}).get("cache_read", 0)
+        tracing.set_attributes(
+            input_tokens=message.usage_metadata["input_tokens"],
+            cached_input_tokens=cached_input_tokens,
+            output_tokens=message.usage_metadata["output_tokens"],
+            cache_hit=cached_input_tokens > 0,
+        )
+        usage_ledger.record(
+            ModelSpecifier(name=_model_name(llm) or "unknown", provider=_provider(llm)),
+            UsageData(
+                input_tokens=message.usage_metadata["input_tokens"] - cached_input_tokens,
+                cached_input_tokens=cached_input_tokens,
+                output_tokens=message.usage_metadata["output_tokens"],
+                reasoning_tokens=message.usage_metadata.get("output_token_details", {}).get("reasoning", 0),
+            ),
+        )
 
-        identity: float = Field(ge=0, le=1, description=identity_prompt)
-        horoscope_help: str = Field(description=horoscope_helper_prompt)
-        horoscope: str = Field(description=horoscope_prompt)
 
-    structured_llm = llm.with_structured_output(AnalyzerOutput)
+async def _analyze_content(content: str, llm: BaseChatModel, data_path: Path) -> Profile:
+    with tracing.span("analyzer.load_prompts"):
+        async with aiofiles.open(data_path / "identity.txt", mode="r", encoding="utf-8") as f:
+            identity_prompt = await f.read()
+        async with aiofiles.open(data_path / "horoscope_helper.txt", mode="r", encoding="utf-8") as f:
+            horoscope_helper_prompt = await f.read()
+        async with aiofiles.open(data_path / "horoscope.txt", mode="r", encoding="utf-8") as f:
+            horoscope_prompt = await f.read()
+
+    with tracing.span("analyzer.structured_output_setup"):
+
+        class AnalyzerOutput(BaseModel):
+            """ """
+
+            identity: float = Field(ge=0, le=1, description=identity_prompt)
+            horoscope_help: str = Field(description=horoscope_helper_prompt)
+            horoscope: str = Field(description=horoscope_prompt)
+
+        structured_llm = llm.with_structured_output(AnalyzerOutput, include_raw=True)
+
+    with tracing.span("llm.call", model=_model_name(llm)):
+        message = typing.cast(
+            dict[str, Any],
+            await structured_llm.ainvoke(
+                mark_cache_prefix(
+                    [
+                        SystemMessage(content="Please analyze the identity of this set of answers."),
+                        HumanMessage(content=content),
+                    ],
+                    _provider(llm),
+                )
+            ),
+        )
+        _trace_usage(message["raw"], llm)
+
+    with tracing.span("analyzer.parse"):
+        if message["parsing_error"] is not None:
+            raise message["parsing_error"]
+        raw_output = message["parsed"]
+        if isinstance(raw_output, dict):
+            output = AnalyzerOutput(**raw_output)
+        elif isinstance(raw_output, AnalyzerOutput):
+            output = typing.cast(AnalyzerOutput, raw_output)
+        else:
+            raise ValueError(f"Unexpected output type: {type(raw_output)}. Expected dict or AnalyzerOutput.")
+        avg_identity = output.identity
+        profile = Profile(identity=avg_identity, horoscope=output.horoscope)
+
+    return profile
 
+
+async def analyze(response: Response, llm: BaseChatModel, data_path: Path) -> Profile:
     content = "\n".join(
         f"{question_response.question}: {question_response.response}"
         for question_response in response.responses.values()
     )
+    return await _analyze_content(content, llm, data_path)
+
+
+async def summarize_answer(question_response: QuestionResponse, llm: BaseChatModel, data_path: Path) -> str:
+    with tracing.span("analyzer.load_prompts"):
+        async with aiofiles.open(data_path / "answer_summary.txt", mode="r", encoding="utf-8") as f:
+            answer_summary_prompt = await f.read()
+
+    with tracing.span("llm.call", model=_model_name(llm)):
+        output = await llm.ainvoke(
+            mark_cache_prefix(
+                [
+                    SystemMessage(content=answer_summary_prompt),
+                    HumanMessage(content=f"{question_response.question}: {question_response.response}"),
+                ],
+                _provider(llm),
+            )
+        )
+        _trace_usage(output, llm)
+    if not isinstance(output.content, str):
+        raise ValueError(f"Unexpected response content type: {type(output.content)}. Expected str.")
+    return output.content
 
-    raw_output = await structured_llm.ainvoke(
-        [
-            SystemMessage(content="Please analyze the identity of this set of answers."),
-            HumanMessage(content=content),
-        ]
-    )
-    if isinstance(raw_output, dict):
-        output = AnalyzerOutput(**raw_output)
-    elif isinstance(raw_output, AnalyzerOutput):
-        output = typing.cast(AnalyzerOutput, raw_output)
-    else:
-        raise ValueError(f"Unexpected output type: {type(raw_output)}. Expected dict or AnalyzerOutput.")
-    avg_identity = output.identity
-    profile = Profile(identity=avg_identity, horoscope=output.horoscope)
 
-    return profile
+async def analyze_summaries(summaries: list[str], llm: BaseChatModel, data_path: Path) -> Profile:
+    """Analyze a user from per-answer summaries produced by `summarize_answer` while the interview ran."""
+    return await _analyze_content("\n".join(summaries), llm, data_path)
 
 
 async def analyze_relationship(
     response1: Response, profile1: Profile, response2: Response, profile2: Profile, llm: BaseChatModel, data_path: Path
 ) -> RelationshipProfile:
-    async with aiofiles.open(data_path / "relationship_horoscope.txt", mode="r", encoding="utf-8") as f:
-        relationship_horoscope_prompt = await f.read()
+    with tracing.span("analyzer.load_prompts"):
+        async with aiofiles.open(data_path / "relationship_horoscope.txt", mode="r", encoding="utf-8") as f:
+            relationship_horoscope_prompt = await f.read()
 
-    class AnalyzeRelationshipOutput(BaseModel):
-        """ """
+    with tracing.span("analyzer.structured_output_setup"):
 
-        relationship_horoscope: str = Field(description=relationship_horoscope_prompt)
+        class AnalyzeRelationshipOutput(BaseModel):
+            """ """
 
-    structured_llm = llm.with_structured_output(AnalyzeRelationshipOutput)
+            relationship_horoscope: str = Field(description=relationship_horoscope_prompt)
+
+        structured_llm = llm.with_structured_output(AnalyzeRelationshipOutput, include_raw=True)
     content = (
         "Name and answers: "
         f"{response1.first_name},\n"
@@ -103,17 +182,28 @@ async def analyze_relationship(
         )
     )
 
-    raw_output = await structured_llm.ainvoke(
-        [
-            HumanMessage(content=content),
-        ]
-    )
-
-    if isinstance(raw_output, dict):
-        output = AnalyzeRelationshipOutput(**raw_output)
-    elif isinstance(raw_output, AnalyzeRelationshipOutput):
-        output = typing.cast(AnalyzeRelationshipOutput, raw_output)
-    else:
-        raise ValueError(f"Unexpected output type: {type(raw_output)}. Expected dict or RelationshipHoroscopeOutput.")
+    with tracing.span("llm.call", model=_model_name(llm)):
+        message = typing.cast(
+            dict[str, Any],
+            await structured_llm.ainvoke(
+                [
+                    HumanMessage(content=content),
+                ]
+            ),
+        )
+        _trace_usage(message["raw"], llm)
+
+    with tracing.span("analyzer.parse"):
+        if message["parsing_error"] is not None:
+            raise message["parsing_error"]
+        raw_output = message["parsed"]
+        if isinstance(raw_output, dict):
+            output = AnalyzeRelationshipOutput(**raw_output)
+        elif isinstance(raw_output, AnalyzeRelationshipOutput):
+            output = typing.cast(AnalyzeRelationshipOutput, raw_output)
+        else:
+            raise ValueError(
+                f"Unexpected output type: {type(raw_output)}. Expected dict or RelationshipHoroscopeOutput."
+            )
 
     return RelationshipProfile(horoscope=output.relationship_horoscope)
@@ -1,3 +1,4 @@
+import contextlib
 import os
 from dataclasses import dataclass
 from pathlib import Path
@@ -6,8 +7,13 @@ import hydra
 from hydra.core.config_store import ConfigStore
 from hydra.core.hydra_config import HydraConfig
 
-from . import run
+from .. import profiling
+from ..http_pool import HttpPoolConfig
+from ..models import CascadeConfig
+from . import run, shards
+from .faults import RetryPolicies, RetryPolicy
 from .run import RunConfig
+from .types import AdaptiveSampling
 
 
 @dataclass
@@ -22,10 +28,23 @@ class Config:
     identity_extraction_prompt_path: str
     explicit_cot: bool
     two_step_analysis: bool
+    local_extraction: bool
+    extraction_model: str | None
     system_prompt_path: str | None
     user_prompt_path: str
 
     num_tests: int
+    multi_sample: bool
+    cache_aware: bool
+    adaptive_sampling: bool
+    adaptive_min_samples: int
+    adaptive_round_size: int
+    adaptive_ci_width: float
+    adaptive_confidence: float
+    cascade_models: list[str] | None
+    cascade_max_stddev: float
+    decomposed_scoring: bool
+    answer_cache_path: str
 
     question_exclusion_sets: list[str]
     question_inclusion_sets: list[str] | None
@@ -36,57 +55,105 @@ class Config:
     answer_progress_minimum: float
     num_answers_minimum: int
 
+    profile: bool
+    export_analysis_json: bool
+
+    retry_transient_attempts: int
+    retry_invalid_output_attempts: int
+    retry_passes: int
+
+    num_shards: int
+    http_max_connections: int
+    http_max_keepalive_connections: int
+    http2: bool
+    http_max_requests_per_second: float | None
+
 
 ROOT_PATH = (Path(".")).resolve()
 cs = ConfigStore.instance()
 cs.store(name="experiment_config", node=Config)
 
 
-@hydra.main(version_base=None, config_path=str(ROOT_PATH / "config"), config_name="debug")
-def main(cfg: Config) -> None:
-    os.chdir(ROOT_PATH)
+def to_run_config(cfg: Config, output_dir: Path) -> RunConfig:
+    """Relative paths in `cfg` are resolved against the working directory."""
     [model, model_provider] = cfg.model.split(":")
     data_dir = Path(cfg.data_dir).resolve()
     prompts_dir = (data_dir / cfg.prompts_dir).resolve()
-    output_dir = Path(HydraConfig.get().runtime.output_dir).resolve()
-    run.run(
-        RunConfig(
-            secrets_path=Path(cfg.secrets_path).resolve(),
-            data_dir=data_dir,
-            output_dir=output_dir,
-            model=model,
-            model_provider=model_provider,
-            reasoning_effort=cfg.reasoning_effort,
-            identity_prompt=(prompts_dir / cfg.identity_prompt_path)
-            .with_suffix(".txt")
-            .resolve()
-            .read_text(encoding="utf-8"),
-            identity_extraction_prompt=(prompts_dir / cfg.identity_extraction_prompt_path)
-            .with_suffix(".txt")
-            .resolve()
-            .read_text(encoding="utf-8"),
-            explicit_cot=cfg.explicit_cot,
-            two_step_analysis=cfg.two_step_analysis,
-            system_prompt=(prompts_dir / cfg.system_prompt_path)
-            .with_suffix(".txt")
-            .resolve()
-            .read_text(encoding="utf-8")
-            if cfg.system_prompt_path
-            else None,
-            user_prompt=(prompts_dir / cfg.user_prompt_path).with_suffix(".txt").resolve().read_text(encoding="utf-8"),
-            num_tests=cfg.num_tests,
-            question_exclusion_sets={set_name for set_name in cfg.question_exclusion_sets},
-            question_inclusion_sets={set_name for set_name in cfg.question_inclusion_sets}
-            if cfg.question_inclusion_sets
-            else None,
-            user_exclusion_sets={set_name for set_name in cfg.user_exclusion_sets},
-            user_inclusion_sets={set_name for set_name in cfg.user_inclusion_sets} if cfg.user_inclusion_sets else None,
-            only_couples=cfg.only_couples,
-            answer_progress_minimum=cfg.answer_progress_minimum,
-            num_answers_minimum=cfg.num_answers_minimum,
+    return RunConfig(
+        secrets_path=Path(cfg.secrets_path).resolve(),
+        data_dir=data_dir,
+        output_dir=output_dir,
+        model=model,
+        model_provider=model_provider,
+        reasoning_effort=cfg.reasoning_effort,
+        identity_prompt=(prompts_dir / cfg.identity_prompt_path)
+        .with_suffix(".txt")
+        .resolve()
+        .read_text(encoding="utf-8"),
+        identity_extraction_prompt=(prompts_dir / cfg.identity_extraction_prompt_path)
+        .with_suffix(".txt")
+        .resolve()
+        .read_text(encoding="utf-8"),
+        explicit_cot=cfg.explicit_cot,
+        two_step_analysis=cfg.two_step_analysis,
+        local_extraction=cfg.local_extraction,
+        extraction_model=CascadeConfig.parse_models([cfg.extraction_model])[0] if cfg.extraction_model else None,
+        system_prompt=(prompts_dir / cfg.system_prompt_path).with_suffix(".txt").resolve().read_text(encoding="utf-8")
+        if cfg.system_prompt_path
+        else None,
+        user_prompt=(prompts_dir / cfg.user_prompt_path).with_suffix(".txt").resolve().read_text(encoding="utf-8"),
+        num_tests=cfg.num_tests,
+        multi_sample=cfg.multi_sample,
+        cache_aware=cfg.cache_aware,
+        adaptive_sampling=AdaptiveSampling(
+            min_samples=cfg.adaptive_min_samples,
+            max_samples=cfg.num_tests,
+            round_size=cfg.adaptive_round_size,
+            ci_width=cfg.adaptive_ci_width,
+            confidence=cfg.adaptive_confidence,
         )
+        if cfg.adaptive_sampling
+        else None,
+        cascade=CascadeConfig(models=CascadeConfig.parse_models(cfg.cascade_models), max_stddev=cfg.cascade_max_stddev)
+        if cfg.cascade_models
+        else None,
+        answer_cache_path=Path(cfg.answer_cache_path).resolve() if cfg.decomposed_scoring else None,
+        question_exclusion_sets={set_name for set_name in cfg.question_exclusion_sets},
+        question_inclusion_sets={set_name for set_name in cfg.question_inclusion_sets}
+        if cfg.question_inclusion_sets
+        else None,
+        user_exclusion_sets={set_name for set_name in cfg.user_exclusion_sets},
+        user_inclusion_sets={set_name for set_name in cfg.user_inclusion_sets} if cfg.user_inclusion_sets else None,
+        only_couples=cfg.only_couples,
+        answer_progress_minimum=cfg.answer_progress_minimum,
+        num_answers_minimum=cfg.num_answers_minimum,
+        retry_policies=RetryPolicies(
+            transient=RetryPolicy(max_attempts=cfg.retry_transient_attempts, initial_delay=1.0),
+            invalid_output=RetryPolicy(max_attempts=cfg.retry_invalid_output_attempts),
+        ),
+        retry_passes=cfg.retry_passes,
+        num_shards=cfg.num_shards,
+        http_pool=HttpPoolConfig(
+            max_connections=cfg.http_max_connections,
+            max_keepalive_connections=cfg.http_max_keepalive_connections,
+            http2=cfg.http2,
+            max_requests_per_second=cfg.http_max_requests_per_second,
+        ),
+        export_analysis_json=cfg.export_analysis_json,
     )
 
 
+@hydra.main(version_base=None, config_path=str(ROOT_PATH / "config"), config_name="debug")
+def main(cfg: Config) -> None:
+    os.chdir(ROOT_PATH)
+    output_dir = Path(HydraConfig.get().runtime.output_dir).resolve()
+    with profiling.profile_run(output_dir) if cfg.profile else contextlib.nullcontext():
+        config = to_run_config(cfg, output_dir)
+        if config.num_shards > 1:
+            shards.run_sharded(config)
+        else:
+            run.run(config)
+
+
 if __name__ == "__main__":
     main()
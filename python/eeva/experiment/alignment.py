@@ -0,0 +1,63 @@
+from random import Random
+
+import numpy as np
+from numpy import ndarray
+
+
+def gen_random_couples(num_users: int, num_random_couples: int, rng: Random) -> list[int]:
+    return rng.sample(range(num_users), 2 * num_random_couples)
+
+
+def gen_random_couple_sets(num_users: int, num_random_couples: int, num_sets: int, rng: Random) -> ndarray:
+    return np.array([gen_random_couples(num_users, num_random_couples, rng) for _ in range(num_sets)]).reshape(
+        num_sets, num_random_couples, 2
+    )
+
+
+def couple_alignment(
+    values: ndarray, couple_indices: ndarray, num_random_couples: int, num_random_sets: int = 100_000, seed: int = 45
+) -> tuple[float, float, float, float]:
+    """Compare how close couples are against sets of `num_random_couples` randomly generated couples.
+
+    `values` has shape (num_samples, num_users) and `couple_indices` has shape (num_couples, 2). Returns the
+    absolute and relative difference deltas followed by the absolute and relative steps-to-partner deltas.
+
+    This is pure CPU work with no side effects, so callers on an event loop can run it in a process pool.
+    """
+    couple_values = values[:, couple_indices]  # shape (num_samples, num_couples, 2)
+    couple_diffs = np.abs(couple_values[:, :, 0] - couple_values[:, :, 1])  # shape (num_samples, num_couples)
+    avg_couple_diff = np.mean(couple_diffs, axis=1)  # shape (num_samples,)
+
+    rng = Random(seed)
+    random_couple_sets = gen_random_couple_sets(
+        values.shape[1], num_random_couples, num_random_sets, rng
+    )  # shape (num_random_sets, num_couples, 2)
+
+    random_couple_diffs = np.abs(
+        values[:, random_couple_sets[:, :, 0]] - values[:, random_couple_sets[:, :, 1]]
+    )  # shape (num_samples, num_random_sets, num_couples)
+    random_avgs = random_couple_diffs.mean(axis=(1, 2))  # shape (num_samples,)
+
+    diffs_square = np.abs(values[:, :, None] - values[:, None, :])  # shape (num_samples, num_users, num_users)
+
+    steps_to_partner = (
+        np.sum(diffs_square[:, couple_indices] <= couple_diffs[:, :, None, None], axis=3) - 2
+    )  # shape (num_samples, num_couples)
+
+    avg_steps_to_partner = np.mean(steps_to_partner, axis=(1, 2))  # shape (num_samples,)
+
+    random_steps_to_partner = (
+        np.sum(
+            diffs_square[:, random_couple_sets] <= random_couple_diffs[:, :, :, None, None],
+            axis=4,
+        )
+        - 2
+    )
+    random_avg_steps_to_partner = np.mean(random_steps_to_partner, axis=(1, 2, 3))
+
+    return (
+        float(np.mean(random_avgs - avg_couple_diff)),
+        float(np.mean(random_avgs / (avg_couple_diff + 1e-8))),
+        float(np.mean(random_avg_steps_to_partner - avg_steps_to_partner)),
+        float(np.mean(random_avg_steps_to_partner / (avg_steps_to_partner + 1e-8))),
+    )
@@ -1,16 +1,42 @@
 import asyncio
-
+import hashlib
+import logging
+import math
+import statistics
+import time
+import typing
+from collections import Counter
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass, replace
+from typing import Annotated, Any, Callable
+
+import scipy.stats
+import tabulate
 from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
-from pydantic import BaseModel, Field, RootModel
+from pydantic import BaseModel, Field, PrivateAttr, RootModel
+
+from .. import usage_ledger
+from ..models import Model, ModelSpecifier, UsageData, mark_cache_prefix, model_pricing
+from .answer_cache import AnswerScore, AnswerScoreCache, answer_hash
+from .extraction import NO_USAGE, Extraction, Extractor, LocalScoreExtractor, ModelExtractor
+from .faults import RetryPolicies, SampleFailure, with_retries
+from .types import AdaptiveSampling, Profile, QuestionResponse, Response, User, UserId, UserSet
 
-from ..models import Model, UsageData
-from .types import Profile, User, UserId, UserSet
 
+@dataclass(slots=True)
+class AnalysisResult:
+    """One sample of a user. Slotted rather than a model since runs hold many. It is still validated when loaded as
+    part of an `AnalysisResultSet`."""
 
-class AnalysisResult(BaseModel):
-    profile: Profile = Field()
-    cot: str | None = Field()
-    response_metadata: UsageData = Field()
+    profile: Profile
+    cot: str | None
+    response_metadata: UsageData
+    model: Annotated[ModelSpecifier | None, Field(description="Set when results of a run come from several models")] = (
+        None
+    )
+    extraction: Annotated[Extraction | None, Field(description="How the score was extracted in two-step analysis")] = (
+        None
+    )
 
 
 class AnalysisResultUser(BaseModel):
@@ -18,6 +44,42 @@ class AnalysisResultUser(BaseModel):
     last_name: str = Field()
     llm_messages: list[BaseMessage] = Field()
     analysis_results: list[AnalysisResult] = Field()
+    failures: list[SampleFailure] = Field(default_factory=list, description="Sample slots that have no result")
+
+    @staticmethod
+    def failed(user: User, num_samples: int, error: Exception) -> "AnalysisResultUser":
+        return AnalysisResultUser(
+            first_name=user.response.first_name,
+            last_name=user.response.last_name,
+            llm_messages=[],
+            analysis_results=[],
+            failures=[SampleFailure.from_error(i, error) for i in range(num_samples)],
+        )
+
+    def retryable_failures(self) -> list[SampleFailure]:
+        # Fatal errors, such as bad credentials, would only fail again.
+        return [failure for failure in self.failures if failure.error_class != "fatal"]
+
+    def with_retry(self, retry: "AnalysisResultUser") -> "AnalysisResultUser":
+        """Fill the retryable failed slots with the results of `retry`, which sampled only those slots."""
+        retried = self.retryable_failures()
+        return self.model_copy(
+            update={
+                "llm_messages": self.llm_messages or retry.llm_messages,
+                "analysis_results": self.analysis_results + retry.analysis_results,
+                "failures": sorted(
+                    [failure for failure in self.failures if failure not in retried]
+                    + [
+                        failure.model_copy(update={"sample": retried[failure.sample].sample})
+                        for failure in retry.failures
+                    ],
+                    key=lambda failure: failure.sample,
+                ),
+            }
+        )
+
+
+UserCallback = Callable[[UserId, AnalysisResultUser], None]
 
 
 class AnalysisResultSet(RootModel):
@@ -53,6 +115,30 @@ class Analyzer(BaseModel):
     system_prompt: str | None = Field()
     user_prompt: str = Field()
     llm: Model = Field()
+    multi_sample: bool = Field(
+        default=False, description="Get all samples for a user from one call instead of one call per sample"
+    )
+    cache_aware: bool = Field(
+        default=False,
+        description="Put all instructions in a shared, cache-marked system message ahead of the user's answers",
+    )
+    local_extraction: bool = Field(
+        default=False, description="In two-step analysis, parse explicitly stated scores without calling a model"
+    )
+    extraction_llm: Model | None = Field(
+        default=None, description="Cheap model to extract scores with before falling back to `llm`"
+    )
+    retry_policies: RetryPolicies = Field(default_factory=RetryPolicies, description="Retries of failed calls")
+
+    def extractors(self) -> list[Extractor]:
+        """The extractors tried in order for step 2 of two-step analysis. The last one always gives a score."""
+        extractors: list[Extractor] = []
+        if self.local_extraction:
+            extractors.append(LocalScoreExtractor())
+        if self.extraction_llm is not None:
+            extractors.append(ModelExtractor(self.extraction_llm))
+        extractors.append(ModelExtractor(self.llm, final=True))
+        return extractors
 
     async def analyze(self, messages: list[BaseMessage]) -> AnalysisResult:
         if self.two_step_analysis:
@@ -60,7 +146,36 @@ class Analyzer(BaseModel):
         else:
             return await self._analyze_single_step(messages)
 
-    async def _analyze_single_step(self, messages: list[BaseMessage]) -> AnalysisResult:
+    async def analyze_samples(self, messages: list[BaseMessage], num_samples: int) -> list[AnalysisResult]:
+        """Analyze the same messages `num_samples` times using a single multi-sample call.
+
+        The usage of the call is apportioned evenly over the results.
+        """
+        if self.two_step_analysis:
+            with usage_ledger.scope(step="analysis"):
+                free_text_responses, usage_data = await self.llm.get_unstructured_outputs(messages, num_samples)
+            return list(
+                await asyncio.gather(
+                    *(
+                        self._extract(free_text_response, step1_usage)
+                        for free_text_response, step1_usage in zip(
+                            free_text_responses, usage_data.split(num_samples), strict=True
+                        )
+                    )
+                )
+            )
+        output_type = self._output_type()
+        with usage_ledger.scope(step="analysis"):
+            raw_outputs, usage_data = await self.llm.get_structured_outputs(messages, output_type, num_samples)
+        return [
+            self._to_result(raw_output, output_type, sample_usage)
+            for raw_output, sample_usage in zip(raw_outputs, usage_data.split(len(raw_outputs)), strict=True)
+        ]
+
+    def _output_type(self) -> type[BaseModel]:
+        if self.cache_aware:
+            return self._cache_aware_output_type()
+
         class CotAnalyzerOutput(BaseModel):
             """ """
 
@@ -72,14 +187,36 @@ class Analyzer(BaseModel):
 
             identity: float = Field(ge=0, le=1, description=self.identity_prompt)
 
-        output_type = CotAnalyzerOutput if self.explicit_cot else AnalyzerOutput
+        return CotAnalyzerOutput if self.explicit_cot else AnalyzerOutput
+
+    def _cache_aware_output_type(self) -> type[BaseModel]:
+        # The instructions live in the system message, so the schema is identical for every run and prompt variant.
+        class CotAnalyzerOutput(BaseModel):
+            """ """
+
+            identity_cot: str = Field(description="Your analysis, following the identity analysis instructions.")
+            identity: float = Field(ge=0, le=1, description="The score, following the identity score instructions.")
+
+        class AnalyzerOutput(BaseModel):
+            """ """
+
+            identity: float = Field(ge=0, le=1, description="The score, following the identity analysis instructions.")
+
+        return CotAnalyzerOutput if self.explicit_cot else AnalyzerOutput
 
-        raw_output, usage_data = await self.llm.get_structured_output(messages, output_type)
+    def _cache_aware_system_prompt(self) -> str:
+        parts = [self.system_prompt] if self.system_prompt else []
+        if not self.two_step_analysis:
+            parts.append(f"Identity analysis instructions:\n{self.identity_prompt}")
+            if self.explicit_cot:
+                parts.append(f"Identity score instructions:\n{self.identity_extraction_prompt}")
+        return "\n\n".join(parts)
 
+    def _to_result(self, raw_output: Any, output_type: type[BaseModel], usage_data: UsageData) -> AnalysisResult:
         if isinstance(raw_output, dict):
             output = output_type(**raw_output)
         elif isinstance(raw_output, output_type):
-            output = raw_output  # type: ignore
+            output = raw_output
         else:
             raise ValueError(f"Unexpected output type: {type(raw_output)}. Expected dict or {output_type.__name__}.")
         avg_identity = output.identity  # type: ignore
@@ -89,71 +226,515 @@ class Analyzer(BaseModel):
 
         return AnalysisResult(profile=profile, cot=cot, response_metadata=usage_data)
 
-    async def _analyze_two_step(self, messages: list[BaseMessage]) -> AnalysisResult:
-        # Step 1: Get free text response
-        free_text_response, step1_usage = await self.llm.get_unstructured_output(messages)
+    async def _analyze_single_step(self, messages: list[BaseMessage]) -> AnalysisResult:
+        output_type = self._output_type()
 
-        # Step 2: Extract structured data from the free text response
-        extraction_prompt = f"""Please extract the identity score from the following analysis.
+        with usage_ledger.scope(step="analysis"):
+            raw_output, usage_data = await self.llm.get_structured_output(messages, output_type)
 
-Analysis:
-{free_text_response}"""
+        return self._to_result(raw_output, output_type, usage_data)
 
-        class ExtractionOutput(BaseModel):
-            """ """
+    async def _analyze_two_step(self, messages: list[BaseMessage]) -> AnalysisResult:
+        # Step 1: Get free text response
+        with usage_ledger.scope(step="analysis"):
+            free_text_response, step1_usage = await self.llm.get_unstructured_output(messages)
 
-            identity: float = Field(ge=0, le=1, description="Extracted identity score between 0 and 1.")
+        return await self._extract(free_text_response, step1_usage)
 
-        extraction_messages = [HumanMessage(content=extraction_prompt)]
-        extraction_output, step2_usage = await self.llm.get_structured_output(extraction_messages, ExtractionOutput)
+    async def _extract(self, free_text_response: str, step1_usage: UsageData) -> AnalysisResult:
+        # Step 2: Extract structured data from the free text response
+        with usage_ledger.scope(step="extraction"):
+            for extractor in self.extractors():
+                extracted = await extractor.extract(free_text_response)
+                if extracted is not None:
+                    break
+            else:
+                raise ValueError("No extractor produced an identity score.")
+        identity, extraction = extracted
 
-        # Combine usage data
-        combined_usage = step1_usage.combine(step2_usage)
+        # Usage on the analysis model itself is combined, other extraction models are priced separately
+        usage = step1_usage.combine(extraction.usage) if extraction.model == self.llm.specifier else step1_usage
 
-        profile = Profile(identity=extraction_output.identity)
+        profile = Profile(identity=identity)
 
-        return AnalysisResult(profile=profile, cot=free_text_response, response_metadata=combined_usage)
+        return AnalysisResult(profile=profile, cot=free_text_response, response_metadata=usage, extraction=extraction)
 
-    async def generate_user_profiles(
-        self, user_id: UserId, user: User, num_tests: int
-    ) -> tuple[UserId, AnalysisResultUser]:
-        tasks = []
+    def user_messages(self, user: User) -> list[BaseMessage]:
         user_response = "\n".join(
             f"{question.question}: {question.response}" for question in user.response.responses.values()
         )
         user_prompt = self.user_prompt.replace("""{{user_response}}""", user_response)
-        if self.system_prompt:
+        cache_aware_system_prompt = self._cache_aware_system_prompt() if self.cache_aware else None
+        if cache_aware_system_prompt:
+            # Everything shared between users goes first, so only the user's answers fall outside the cached prefix.
+            messages = mark_cache_prefix(
+                [SystemMessage(content=cache_aware_system_prompt), HumanMessage(content=user_prompt)],
+                self.llm.specifier.provider,
+            )
+        elif self.system_prompt:
             messages = [
                 SystemMessage(content=self.system_prompt),
                 HumanMessage(content=user_prompt),
             ]
         else:
             messages = [HumanMessage(content=user_prompt)]
-        for _ in range(num_tests):
-            tasks.append(asyncio.create_task(self.analyze(messages)))
-        profiles = await asyncio.gather(*tasks)
+        return messages
+
+    async def sample_outcomes(
+        self, messages: list[BaseMessage], num_samples: int, first_sample: int = 0
+    ) -> list[AnalysisResult | Exception]:
+        """Like `sample`, but a sample that still fails after retries gives its error instead of failing the others.
+
+        In multi-sample mode the samples share one call, so they fail together.
+        """
+        if self.multi_sample:
+            try:
+                return list(
+                    await with_retries(self.retry_policies, lambda: self.analyze_samples(messages, num_samples))
+                )
+            except Exception as e:
+                return [e] * num_samples
+        tasks = []
+        for i in range(num_samples):
+            # Tasks copy the current context, so each one is attributed to its own sample.
+            with usage_ledger.scope(sample=first_sample + i):
+                tasks.append(asyncio.create_task(with_retries(self.retry_policies, lambda: self.analyze(messages))))
+        outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException) and not isinstance(outcome, Exception):
+                raise outcome
+        return typing.cast(list[AnalysisResult | Exception], outcomes)
+
+    async def sample(
+        self, messages: list[BaseMessage], num_samples: int, first_sample: int = 0
+    ) -> list[AnalysisResult]:
+        """`first_sample` numbers the samples in the usage ledger when a user is sampled in several rounds."""
+        outcomes = await self.sample_outcomes(messages, num_samples, first_sample)
+        for outcome in outcomes:
+            if isinstance(outcome, Exception):
+                raise outcome
+        return typing.cast(list[AnalysisResult], outcomes)
+
+    async def generate_user_profiles(
+        self, user_id: UserId, user: User, num_tests: int
+    ) -> tuple[UserId, AnalysisResultUser]:
+        messages = self.user_messages(user)
+        outcomes = await self.sample_outcomes(messages, num_tests)
         result_user = AnalysisResultUser(
             first_name=user.response.first_name,
             last_name=user.response.last_name,
             llm_messages=messages,
-            analysis_results=profiles,
+            analysis_results=[outcome for outcome in outcomes if isinstance(outcome, AnalysisResult)],
+            failures=[
+                SampleFailure.from_error(i, outcome)
+                for i, outcome in enumerate(outcomes)
+                if isinstance(outcome, Exception)
+            ],
         )
         return (user_id, result_user)
 
 
+class CascadeTierReport(BaseModel):
+    model: ModelSpecifier = Field()
+    users: int = Field(default=0, description="Users scored by this model")
+    escalated: int = Field(default=0, description="Users passed on to the next model")
+    cost: float = Field(default=0.0)
+    latency: float = Field(default=0.0, description="Seconds spent on this model summed over users")
+
+
+class CascadeReport(BaseModel):
+    tiers: list[CascadeTierReport] = Field()
+
+    @staticmethod
+    def combined(reports: list["CascadeReport"]) -> "CascadeReport":
+        """Sum reports of the same cascade over disjoint sets of users."""
+        return CascadeReport(
+            tiers=[
+                CascadeTierReport(
+                    model=tiers[0].model,
+                    users=sum(tier.users for tier in tiers),
+                    escalated=sum(tier.escalated for tier in tiers),
+                    cost=sum(tier.cost for tier in tiers),
+                    latency=sum(tier.latency for tier in tiers),
+                )
+                for tiers in zip(*(report.tiers for report in reports), strict=True)
+            ]
+        )
+
+    def report(self) -> str:
+        num_users = self.tiers[0].users
+        total_cost = sum(tier.cost for tier in self.tiers)
+        total_latency = sum(tier.latency for tier in self.tiers)
+        escalated_fraction = self.tiers[0].escalated / num_users if num_users > 0 else 0
+        top_tier = self.tiers[-1]
+        # What scoring every user with the largest model would have cost, at its observed cost per user.
+        top_tier_cost = top_tier.cost / top_tier.users * num_users if top_tier.users > 0 else float("nan")
+        table = tabulate.tabulate(
+            [
+                [
+                    tier.model.name,
+                    tier.users,
+                    tier.escalated,
+                    f"{tier.cost:.2f}$",
+                    f"{tier.latency / tier.users if tier.users else 0:.1f}s",
+                ]
+                for tier in self.tiers
+            ],
+            headers=["Model", "Users", "Escalated", "Cost", "Mean latency"],
+            tablefmt="plain",
+        )
+        return f"""{100 * escalated_fraction:.1f}% of users escalated past {self.tiers[0].model.name}
+{table}
+Blended cost: {total_cost:.2f}$ ({total_cost / max(1, num_users):.4f}$ per user)
+    Estimated cost with only {top_tier.model.name}: {top_tier_cost:.2f}$
+Mean latency per user: {total_latency / max(1, num_users):.1f}s
+"""
+
+
+class CascadeAnalyzer(BaseModel):
+    """Scores users with the cheapest analyzer first and escalates users whose samples disagree to larger models.
+
+    The results of a user are those of the last analyzer that scored them.
+    """
+
+    tiers: list[Analyzer] = Field(min_length=1, description="Analyzers to try, cheapest first")
+    max_stddev: float = Field(ge=0, description="Escalate when the stddev of a user's identity samples exceeds this")
+    _report: CascadeReport = PrivateAttr()
+
+    def model_post_init(self, context: Any) -> None:
+        self._report = CascadeReport(tiers=[CascadeTierReport(model=tier.llm.specifier) for tier in self.tiers])
+
+    @property
+    def cache_aware(self) -> bool:
+        return self.tiers[0].cache_aware
+
+    @property
+    def report(self) -> CascadeReport:
+        return self._report
+
+    async def generate_user_profiles(
+        self, user_id: UserId, user: User, num_tests: int
+    ) -> tuple[UserId, AnalysisResultUser]:
+        if num_tests < 2:
+            raise ValueError(
+                f"A model cascade needs at least 2 samples per user to measure disagreement, got {num_tests}"
+            )
+        for tier, tier_report in zip(self.tiers, self._report.tiers, strict=True):
+            messages = tier.user_messages(user)
+            started = time.perf_counter()
+            results = await tier.sample(messages, num_tests)
+            tier_report.latency += time.perf_counter() - started
+            tier_report.users += 1
+            pricing_info = model_pricing[tier.llm.specifier]
+            tier_report.cost += sum(result.response_metadata.calculate_cost(pricing_info) for result in results)
+            stddev = statistics.stdev(result.profile.identity for result in results)
+            if stddev <= self.max_stddev or tier is self.tiers[-1]:
+                break
+            logging.debug(f"Escalating user {user_id} past {tier.llm.specifier.name} with identity stddev {stddev:.3f}")
+            tier_report.escalated += 1
+        return (
+            user_id,
+            AnalysisResultUser(
+                first_name=user.response.first_name,
+                last_name=user.response.last_name,
+                llm_messages=messages,
+                analysis_results=[replace(result, model=tier.llm.specifier) for result in results],
+            ),
+        )
+
+
+# Analyzer settings that change how an answer is scored. The sampling mode does not.
+PROMPT_VERSION_FIELDS = {
+    "identity_prompt",
+    "identity_extraction_prompt",
+    "explicit_cot",
+    "two_step_analysis",
+    "system_prompt",
+    "user_prompt",
+    "cache_aware",
+    "local_extraction",
+}
+
+
+class DecomposedAnalyzer(BaseModel):
+    """Scores every answer on its own and composes a user's profile from the scores of their answers.
+
+    Answer scores are cached by answer and prompt version, so runs over different question sets only call the model
+    for answers that have not been scored before. Sample `i` of a user is the mean of sample `i` of their answers.
+    """
+
+    analyzer: Analyzer = Field()
+    prompt_version: str = Field(description="Identifies everything that affects an answer score")
+    _cache: AnswerScoreCache = PrivateAttr()
+
+    @staticmethod
+    def create(analyzer: Analyzer, cache: AnswerScoreCache, model_settings: str = "") -> "DecomposedAnalyzer":
+        """`model_settings` should describe model settings not visible on the analyzer, e.g. the reasoning effort."""
+        prompt_version = hashlib.sha256(
+            analyzer.model_dump_json(include=PROMPT_VERSION_FIELDS).encode("utf-8")
+            + analyzer.llm.specifier.model_dump_json().encode("utf-8")
+            + (analyzer.extraction_llm.specifier.model_dump_json().encode("utf-8") if analyzer.extraction_llm else b"")
+            + model_settings.encode("utf-8")
+        ).hexdigest()
+        decomposed = DecomposedAnalyzer(analyzer=analyzer, prompt_version=prompt_version)
+        decomposed._cache = cache
+        return decomposed
+
+    @property
+    def cache_aware(self) -> bool:
+        return self.analyzer.cache_aware
+
+    def answer_messages(self, user: User, question_response: QuestionResponse) -> list[BaseMessage]:
+        return self.analyzer.user_messages(
+            user.model_copy(
+                update={
+                    "response": Response(
+                        first_name=user.response.first_name,
+                        last_name=user.response.last_name,
+                        responses={"answer": question_response},
+                    )
+                }
+            )
+        )
+
+    async def score_answer(
+        self, messages: list[BaseMessage], question_response: QuestionResponse, num_tests: int
+    ) -> tuple[list[AnswerScore], int]:
+        """Return `num_tests` scores of the answer and how many of them came from the cache."""
+        key = answer_hash(question_response)
+        cached = self._cache.get(key, self.prompt_version, num_tests)
+        if len(cached) == num_tests:
+            return cached, len(cached)
+        results = await self.analyzer.sample(messages, num_tests - len(cached))
+        scores = [
+            AnswerScore(profile=result.profile, cot=result.cot, usage=result.response_metadata) for result in results
+        ]
+        self._cache.put(key, self.prompt_version, len(cached), scores)
+        return cached + scores, len(cached)
+
+    async def generate_user_profiles(
+        self, user_id: UserId, user: User, num_tests: int
+    ) -> tuple[UserId, AnalysisResultUser]:
+        question_responses = list(user.response.responses.values())
+        if not question_responses:
+            raise ValueError(f"User {user_id} has no answers to score")
+        answer_messages = [self.answer_messages(user, question_response) for question_response in question_responses]
+        answer_scores = await asyncio.gather(
+            *(
+                self.score_answer(messages, question_response, num_tests)
+                for messages, question_response in zip(answer_messages, question_responses, strict=True)
+            )
+        )
+        results = []
+        for i in range(num_tests):
+            # Scores from the cache were paid for by an earlier run.
+            usage = NO_USAGE
+            for scores, num_cached in answer_scores:
+                if i >= num_cached:
+                    usage = usage.combine(scores[i].usage)
+            cots = [
+                f"{question_response.question}: {scores[i].cot}"
+                for question_response, (scores, _) in zip(question_responses, answer_scores, strict=True)
+                if scores[i].cot is not None
+            ]
+            results.append(
+                AnalysisResult(
+                    profile=Profile(
+                        identity=statistics.fmean(scores[i].profile.identity for scores, _ in answer_scores)
+                    ),
+                    cot="\n\n".join(cots) if cots else None,
+                    response_metadata=usage,
+                )
+            )
+        return (
+            user_id,
+            AnalysisResultUser(
+                first_name=user.response.first_name,
+                last_name=user.response.last_name,
+                llm_messages=[message for messages in answer_messages for message in messages],
+                analysis_results=results,
+            ),
+        )
+
+
 # Create a dict user_id -> Profile for all users in user_data using their responses to run `analyze`
 # Use asyncio to run analyze concurrently for all users
 async def generate_profiles(
-    analyzer: Analyzer, user_data: UserSet, num_tests: int, user_subset: set[UserId] | None
+    analyzer: Analyzer | CascadeAnalyzer | DecomposedAnalyzer,
+    user_data: UserSet,
+    num_tests: int,
+    user_subset: set[UserId] | None,
+    on_user: UserCallback | None = None,
+    retry_passes: int = 1,
+    previous: Mapping[UserId, AnalysisResultUser] | None = None,
 ) -> AnalysisResultSet:
+    """`on_user` is called with the results of each user as soon as they are done.
+
+    A failing sample or user does not stop the others. Failed sample slots are recorded in the results, and once every
+    user has been tried, up to `retry_passes` follow-up passes sample only the failed slots again, unless they failed
+    with a fatal error. Users with failures are passed to `on_user` after the follow-up passes.
+    Users in `previous`, such as those of a resumed run, keep their results and sample only their failed slots again.
+    """
     if user_subset is not None:
-        user_data = UserSet({k: v for k, v in user_data.items() if k in user_subset})
+        user_data = UserSet.model_construct(root={k: v for k, v in user_data.items() if k in user_subset})
 
-    async def analyze_all_users() -> AnalysisResultSet:
+    async def generate_user_profiles(
+        user_id: UserId, user: User, num_samples: int
+    ) -> tuple[UserId, AnalysisResultUser]:
+        with usage_ledger.scope(user=user_id.root):
+            try:
+                return await analyzer.generate_user_profiles(user_id, user, num_samples)
+            except Exception as e:
+                # Plain analyzers record failures per sample, cascades and decomposed scoring fail as a whole user.
+                logging.warning(f"Scoring user {user_id} failed: {e!r}")
+                return user_id, AnalysisResultUser.failed(user, num_samples, e)
+
+    async def first_pass(user_id: UserId, user: User) -> tuple[UserId, AnalysisResultUser]:
+        if previous is not None and user_id in previous:
+            earlier = previous[user_id]
+            _, retry = await generate_user_profiles(user_id, user, len(earlier.retryable_failures()))
+            result = user_id, earlier.with_retry(retry)
+        else:
+            result = await generate_user_profiles(user_id, user, num_tests)
+        if on_user is not None and not result[1].failures:
+            on_user(*result)
+        return result
+
+    async def analyze_all_users() -> dict[UserId, AnalysisResultUser]:
+        users = list(user_data.items())
+        results: list[tuple[UserId, AnalysisResultUser]] = []
+        if analyzer.cache_aware and len(users) > 1:
+            # Analyze one user on its own first, so the shared prefix is cached before the other requests fan out.
+            user_id, user = users.pop(0)
+            results.append(await first_pass(user_id, user))
         tasks = []
-        for user_id, user in user_data.items():
-            tasks.append(asyncio.create_task(analyzer.generate_user_profiles(user_id, user, num_tests)))
-        results: list[tuple[UserId, AnalysisResultUser]] = await asyncio.gather(*tasks)
-        return AnalysisResultSet({user_id: result for user_id, result in results})
+        for user_id, user in users:
+            tasks.append(asyncio.create_task(first_pass(user_id, user)))
+        results.extend(await asyncio.gather(*tasks))
+        return {user_id: result for user_id, result in results}
+
+    results = await analyze_all_users()
+    failed_users = [user_id for user_id, result in results.items() if result.failures]
+    for _ in range(retry_passes):
+        retry_users = [user_id for user_id in failed_users if results[user_id].retryable_failures()]
+        if not retry_users:
+            break
+        logging.info(
+            f"Retrying {sum(len(results[user_id].retryable_failures()) for user_id in retry_users)} failed samples "
+            f"of {len(retry_users)} users"
+        )
+        retries = await asyncio.gather(
+            *(
+                generate_user_profiles(user_id, user_data[user_id], len(results[user_id].retryable_failures()))
+                for user_id in retry_users
+            )
+        )
+        for user_id, retry in retries:
+            results[user_id] = results[user_id].with_retry(retry)
+    if on_user is not None:
+        for user_id in failed_users:
+            on_user(user_id, results[user_id])
+    log_failures(results.values())
+    return AnalysisResultSet(results)
+
+
+def log_failures(results: Iterable[AnalysisResultUser]) -> None:
+    failures = [failure for result in results for failure in result.failures]
+    if failures:
+        error_classes = Counter(failure.error_class for failure in failures)
+        logging.warning(
+            f"{len(failures)} samples failed: "
+            + ", ".join(f"{count} {error_class}" for error_class, count in error_classes.most_common())
+            + f". First error: {failures[0].error}"
+        )
+
+
+class RunningStats:
+    """Running mean and variance using Welford's algorithm."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    @property
+    def variance(self) -> float:
+        return self._m2 / (self.count - 1) if self.count > 1 else float("inf")
 
-    return await analyze_all_users()
+    def confidence_interval_width(self, confidence: float) -> float:
+        """Width of the two-sided Student t confidence interval of the mean."""
+        if self.count < 2:
+            return float("inf")
+        t = scipy.stats.t.ppf((1 + confidence) / 2, self.count - 1)
+        return 2 * t * math.sqrt(self.variance / self.count)
+
+
+async def generate_profiles_adaptive(
+    analyzer: Analyzer,
+    user_data: UserSet,
+    sampling: AdaptiveSampling,
+    user_subset: set[UserId] | None,
+    on_user: UserCallback | None = None,
+    previous: Mapping[UserId, AnalysisResultUser] | None = None,
+) -> AnalysisResultSet:
+    """Like `generate_profiles`, but sample each user in rounds until their identity estimate converges.
+
+    Users whose scores barely vary stop after `min_samples`, so users end up with different numbers of results.
+    Each user runs their own rounds, so a slow user never holds back the others. A user stops at the first round with
+    failed samples, which are recorded in their results. Users in `previous` continue from their successful samples.
+    """
+    if user_subset is not None:
+        user_data = UserSet.model_construct(root={k: v for k, v in user_data.items() if k in user_subset})
+
+    async def sample_user(user_id: UserId, user: User) -> tuple[UserId, AnalysisResultUser]:
+        messages = analyzer.user_messages(user)
+        running_stats = RunningStats()
+        results = list(previous[user_id].analysis_results) if previous is not None and user_id in previous else []
+        for result in results:
+            running_stats.add(result.profile.identity)
+        failures: list[SampleFailure] = []
+        num_samples = (
+            sampling.min_samples - len(results) if len(results) < sampling.min_samples else sampling.round_size
+        )
+        num_samples = min(num_samples, sampling.max_samples - len(results))
+        while num_samples > 0:
+            with usage_ledger.scope(user=user_id.root):
+                outcomes = await analyzer.sample_outcomes(messages, num_samples, first_sample=len(results))
+            for outcome in outcomes:
+                if isinstance(outcome, Exception):
+                    failures.append(SampleFailure.from_error(len(results) + len(failures), outcome))
+                else:
+                    results.append(outcome)
+                    running_stats.add(outcome.profile.identity)
+            if failures or running_stats.confidence_interval_width(sampling.confidence) < sampling.ci_width:
+                break
+            num_samples = min(sampling.round_size, sampling.max_samples - len(results))
+        result_user = AnalysisResultUser(
+            first_name=user.response.first_name,
+            last_name=user.response.last_name,
+            llm_messages=messages,
+            analysis_results=results,
+            failures=failures,
+        )
+        if on_user is not None:
+            on_user(user_id, result_user)
+        return user_id, result_user
+
+    results = await asyncio.gather(*(sample_user(user_id, user) for user_id, user in user_data.items()))
+    num_samples = sum(len(result.analysis_results) for _, result in results)
+    num_converged = sum(
+        1 for _, result in results if not result.failures and len(result.analysis_results) < sampling.max_samples
+    )
+    logging.info(
+        f"Adaptive sampling drew {num_samples} samples for {len(results)} users "
+        f"({num_samples / max(1, sampling.max_samples * len(results)):.0%} of the maximum). "
+        f"{num_converged} users converged before {sampling.max_samples} samples."
+    )
+    log_failures(result for _, result in results)
+    return AnalysisResultSet({user_id: result for user_id, result in results})
@@ -2,8 +2,8 @@ import asyncio
 import json
 import os
 import typing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from random import Random
 from typing import Annotated, Awaitable, Callable
 
 import aiofiles
@@ -20,6 +20,8 @@ from eeva import utils
 from eeva.analyzer import Response
 from eeva.models import ModelSpecifier
 
+from . import alignment
+
 
 class Profile(BaseModel):
     identity: float = Field(ge=0, le=1)
@@ -94,6 +96,16 @@ LOG_FILE = next_log_path(LOG_DIR)
 utils.load_secrets(WORKSPACE_DIR / "secrets.json")
 
 
+_PROCESS_POOL: ProcessPoolExecutor | None = None
+
+
+def _process_pool() -> ProcessPoolExecutor:
+    global _PROCESS_POOL
+    if _PROCESS_POOL is None:
+        _PROCESS_POOL = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _PROCESS_POOL
+
+
 def _safe_path(path: Path) -> Path:
     """
     Resolve path inside BASE_DIR to avoid escaping the workspace.
@@ -186,15 +198,17 @@ async def test_prompt(identity_prompt: str) -> TestResult:
     try:
         with anyio.fail_after(CONFIG.timeout) as cancel_scope:
             llm = CONFIG.analyzer_model.init_chat_model()
-            with open(DATA_DIR / "user_data.json", "r", encoding="utf-8") as f:
+            async with aiofiles.open(DATA_DIR / "user_data.json", "r", encoding="utf-8") as f:
 
                 class UserSetDeserializer(RootModel[dict[str, User]]):
                     pass
 
-                user_data = UserSetDeserializer.model_validate_json(f.read()).root
+                user_data = (
+                    await anyio.to_thread.run_sync(UserSetDeserializer.model_validate_json, await f.read())
+                ).root
 
-            with open(DATA_DIR / "couples.json", "r", encoding="utf-8") as f:
-                couple_pairs_raw: dict[str, list[str]] = json.load(f)
+            async with aiofiles.open(DATA_DIR / "couples.json", "r", encoding="utf-8") as f:
+                couple_pairs_raw: dict[str, list[str]] = json.loads(await f.read())
                 couple_pairs: dict[str, Couple] = {k: (v[0], v[1]) for k, v in couple_pairs_raw.items()}
 
             async def analyze(response: Response) -> Profile:
@@ -247,50 +261,21 @@ async def test_prompt(identity_prompt: str) -> TestResult:
 
             couple_indices = np.array(couple_indices_list)  # shape (num_couples, 2)
 
-            couple_values = values[:, couple_indices]  # shape (num_samples, num_couples, 2)
-            couple_diffs = np.abs(couple_values[:, :, 0] - couple_values[:, :, 1])  # shape (num_samples, num_couples)
-            avg_couple_diff = np.mean(couple_diffs, axis=1)  # shape (num_samples,)
-
-            def gen_random_couples(num_users: int, num_random_couples: int, rng):
-                return rng.sample(range(num_users), 2 * num_random_couples)
-
-            def gen_random_couple_sets(num_users: int, num_random_couples: int, num_sets: int, rng):
-                return np.array(
-                    [gen_random_couples(num_users, num_random_couples, rng) for _ in range(num_sets)]
-                ).reshape(num_sets, num_random_couples, 2)
-
-            rng = Random(45)
-            random_couple_sets = gen_random_couple_sets(
-                values.shape[1], len(couple_pairs), 100_000, rng
-            )  # shape (num_random_sets, num_couples, 2)
-
-            random_couple_diffs = np.abs(
-                values[:, random_couple_sets[:, :, 0]] - values[:, random_couple_sets[:, :, 1]]
-            )  # shape (num_samples, num_random_sets, num_couples)
-            random_avgs = random_couple_diffs.mean(axis=(1, 2))  # shape (num_samples,)
-
-            diffs_square = np.abs(values[:, :, None] - values[:, None, :])  # shape (num_samples, num_users, num_users)
-
-            steps_to_partner = (
-                np.sum(diffs_square[:, couple_indices] <= couple_diffs[:, :, None, None], axis=3) - 2
-            )  # shape (num_samples, num_couples)
-
-            avg_steps_to_partner = np.mean(steps_to_partner, axis=(1, 2))  # shape (num_samples,)
-
-            random_steps_to_partner = (
-                np.sum(
-                    diffs_square[:, random_couple_sets] <= random_couple_diffs[:, :, :, None, None],
-                    axis=4,
-                )
-                - 2
+            # The statistics take seconds of pure CPU work, which would stall the event loop.
+            (
+                absolute_diff_delta,
+                relative_diff_delta,
+                absolute_steps_to_partner_delta,
+                relative_steps_to_partner_delta,
+            ) = await asyncio.get_running_loop().run_in_executor(
+                _process_pool(), alignment.couple_alignment, values, couple_indices, len(couple_pairs)
             )
-            random_avg_steps_to_partner = np.mean(random_steps_to_partner, axis=(1, 2, 3))
 
             test_result = TestResult(
-                absolute_diff_delta=np.mean(random_avgs - avg_couple_diff),
-                relative_diff_delta=np.mean(random_avgs / (avg_couple_diff + 1e-8)),
-                absolute_steps_to_partner_delta=np.mean(random_avg_steps_to_partner - avg_steps_to_partner),
-                relative_steps_to_partner_delta=np.mean(random_avg_steps_to_partner / (avg_steps_to_partner + 1e-8)),
+                absolute_diff_delta=absolute_diff_delta,
+                relative_diff_delta=relative_diff_delta,
+                absolute_steps_to_partner_delta=absolute_steps_to_partner_delta,
+                relative_steps_to_partner_delta=relative_steps_to_partner_delta,
             )
         if cancel_scope.cancelled_caught:
             raise TimeoutError(f"Test timed out after {CONFIG.timeout} seconds")
@@ -338,11 +323,12 @@ def build_agent(model: ModelSpecifier):
 
 async def main():
     executor = build_agent(CONFIG.agent_model)
-    result = await executor.ainvoke(
-        {
-            "root": BASE_DIR,
-        },
-    )
+    async with utils.loop_lag_monitor():
+        result = await executor.ainvoke(
+            {
+                "root": BASE_DIR,
+            },
+        )
     print("\n=== FINAL AGENT OUTPUT ===\n")
     print(result["output"])
 
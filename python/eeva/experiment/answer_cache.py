@@ -0,0 +1,73 @@
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+
+from pydantic import BaseModel, Field
+
+from ..models import UsageData
+from .types import Profile, QuestionResponse
+
+
+def answer_hash(question_response: QuestionResponse) -> str:
+    return hashlib.sha256(question_response.model_dump_json().encode("utf-8")).hexdigest()
+
+
+class AnswerScore(BaseModel):
+    profile: Profile = Field()
+    cot: str | None = Field()
+    usage: UsageData = Field(description="Usage of the call that produced the score")
+
+
+class AnswerScoreCache:
+    """Scores of single answers, keyed by answer hash, prompt version and sample index.
+
+    Persisted in SQLite so that runs over different question sets reuse the scores of answers they share.
+    """
+
+    def __init__(self, path: Path | str) -> None:
+        self._lock = threading.Lock()
+        # Shards of a run write to the cache from several processes, so writers wait for each other.
+        self._connection = sqlite3.connect(str(path), check_same_thread=False, timeout=60)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS answer_scores (
+                answer_hash TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                sample INTEGER NOT NULL,
+                score TEXT NOT NULL,
+                PRIMARY KEY (answer_hash, prompt_version, sample)
+            )
+            """
+        )
+        self._connection.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def get(self, answer_hash: str, prompt_version: str, num_samples: int) -> list[AnswerScore]:
+        """Return the cached scores among samples `0..num_samples - 1`, in sample order."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT score FROM answer_scores WHERE answer_hash = ? AND prompt_version = ? AND sample < ? "
+                "ORDER BY sample",
+                (answer_hash, prompt_version, num_samples),
+            ).fetchall()
+            self.hits += len(rows)
+            self.misses += num_samples - len(rows)
+        return [AnswerScore.model_validate_json(row[0]) for row in rows]
+
+    def put(self, answer_hash: str, prompt_version: str, first_sample: int, scores: list[AnswerScore]) -> None:
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO answer_scores (answer_hash, prompt_version, sample, score) VALUES (?, ?, ?, ?)",
+                [
+                    (answer_hash, prompt_version, first_sample + i, score.model_dump_json())
+                    for i, score in enumerate(scores)
+                ],
+            )
+            self._connection.commit()
@@ -0,0 +1,131 @@
+import hashlib
+import logging
+from pathlib import Path
+
+import numpy as np
+from numpy import ndarray
+
+from .types import BaseData, QuestionId, UserId
+
+# Bump when the layout or meaning of the cached index changes.
+INDEX_VERSION = 1
+
+
+def word_count(text: str) -> int:
+    return len(text.strip().split())
+
+
+class AnswerIndex:
+    """Answer progress of every answer in a data snapshot, for filtering users without touching their answers.
+
+    Progress is the answer's word count relative to the longest example of its question in the user's language,
+    and NaN for answers to questions that have no examples or are not in the snapshot.
+    """
+
+    def __init__(
+        self,
+        snapshot_hash: str,
+        user_ids: ndarray,
+        question_ids: ndarray,
+        answer_users: ndarray,
+        answer_questions: ndarray,
+        progress: ndarray,
+    ) -> None:
+        self.snapshot_hash = snapshot_hash
+        self.user_ids = user_ids
+        self.question_ids = question_ids
+        self.answer_users = answer_users
+        self.answer_questions = answer_questions
+        self.progress = progress
+        self._question_index = {question_id: i for i, question_id in enumerate(question_ids.tolist())}
+
+    @staticmethod
+    def build(base_data: BaseData, snapshot_hash: str) -> "AnswerIndex":
+        question_ids = list(base_data.questions.keys())
+        # Longest example per (question, language), computed once instead of once per answer.
+        max_example_words = {
+            (question_id, language_code): max((word_count(example) for example in translation.examples), default=0)
+            for question_id, question in base_data.questions.items()
+            for language_code, translation in question.translations.items()
+        }
+        question_index = {question_id: i for i, question_id in enumerate(question_ids)}
+        answers = [
+            (user_index, question_id, user.language_code, response.response)
+            for user_index, user in enumerate(base_data.users.values())
+            for question_id, response in user.response.responses.items()
+        ]
+        answer_words = np.array([word_count(text) for _, _, _, text in answers], dtype=np.float64)
+        example_words = np.array(
+            [max_example_words.get((question_id, language_code), 0) for _, question_id, language_code, _ in answers],
+            dtype=np.float64,
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            progress = np.where(example_words > 0, answer_words / example_words, np.nan)
+        return AnswerIndex(
+            snapshot_hash=snapshot_hash,
+            user_ids=np.array([user_id.root for user_id in base_data.users.keys()], dtype=np.str_),
+            question_ids=np.array(question_ids, dtype=np.str_),
+            answer_users=np.array([user_index for user_index, _, _, _ in answers], dtype=np.int64),
+            answer_questions=np.array(
+                [question_index.get(question_id, -1) for _, question_id, _, _ in answers], dtype=np.int64
+            ),
+            progress=progress,
+        )
+
+    @staticmethod
+    def load_or_build(data_path: Path, base_data: BaseData) -> "AnswerIndex":
+        """Load the index cached next to `data_path`, rebuilding it if the snapshot has changed."""
+        snapshot_hash = f"{INDEX_VERSION}:{hashlib.sha256(data_path.read_bytes()).hexdigest()}"
+        index_path = data_path.with_suffix(".answer_index.npz")
+        if index_path.exists():
+            with np.load(index_path) as cached:
+                if str(cached["snapshot_hash"]) == snapshot_hash:
+                    return AnswerIndex(
+                        snapshot_hash=snapshot_hash,
+                        **{
+                            key: cached[key]
+                            for key in ["user_ids", "question_ids", "answer_users", "answer_questions", "progress"]
+                        },
+                    )
+        logging.info(f"Building answer index for {data_path}")
+        index = AnswerIndex.build(base_data, snapshot_hash)
+        np.savez(
+            index_path,
+            snapshot_hash=np.array(snapshot_hash),
+            user_ids=index.user_ids,
+            question_ids=index.question_ids,
+            answer_users=index.answer_users,
+            answer_questions=index.answer_questions,
+            progress=index.progress,
+        )
+        return index
+
+    def answer_mask(
+        self, questions: set[QuestionId], answer_progress_minimum: float, users: set[UserId] | None = None
+    ) -> ndarray:
+        """Which answers count, in the order the users and their answers appear in the snapshot.
+
+        Only answers of `users` are selected, if given. Answers of other users are not checked for examples.
+        """
+        in_questions = np.zeros(len(self.question_ids) + 1, dtype=bool)
+        in_questions[
+            [self._question_index[question_id] for question_id in questions if question_id in self._question_index]
+        ] = True
+        # Index -1, questions not in the snapshot, maps to the last entry, which is never set.
+        candidates = in_questions[self.answer_questions]
+        if users is not None:
+            in_users = np.isin(self.user_ids, [user_id.root for user_id in users])
+            candidates &= in_users[self.answer_users]
+        if np.isnan(self.progress[candidates]).any():
+            raise ValueError("No examples provided for progress calculation.")
+        return candidates & (self.progress >= answer_progress_minimum)
+
+    def kept_questions(self, mask: ndarray) -> dict[UserId, list[QuestionId]]:
+        """The questions of the answers selected by `mask`, for every user in the snapshot."""
+        kept = self.question_ids[self.answer_questions[mask]].tolist()
+        # Answers are grouped by user in snapshot order, so each user's kept answers are one slice.
+        ends = np.cumsum(np.bincount(self.answer_users[mask], minlength=len(self.user_ids))).tolist()
+        return {
+            UserId(user_id): kept[start:end]
+            for user_id, start, end in zip(self.user_ids.tolist(), [0, *ends[:-1]], ends, strict=True)
+        }
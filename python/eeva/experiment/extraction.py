@@ -0,0 +1,97 @@
+import logging
+import re
+from typing import Protocol
+
+from langchain_core.messages import HumanMessage
+from pydantic import BaseModel, Field
+
+from ..models import Model, ModelSpecifier, UsageData
+
+NO_USAGE = UsageData(input_tokens=0, cached_input_tokens=0, output_tokens=0, reasoning_tokens=0)
+
+# Matches e.g. "Identity score: 0.72" and "**Identity:** 72%". Only scales of 1 and 100 are accepted, so "7/10",
+# "1 out of 10" and "1 on a scale of 1-10" are not.
+_SCORE_PATTERN = re.compile(
+    r"\b(?:identity(?:\s+score)?|final\s+score)\b"
+    r"[^\S\n]*(?:\*\*|__)?[^\S\n]*[:=][^\S\n]*(?:\*\*|__)?[^\S\n]*"
+    r"(?P<value>\d+(?:\.\d+)?|\.\d+)"
+    r"[^\S\n]*(?:(?P<percent>%)|(?:/|\bout\s+of\b)[^\S\n]*(?P<denominator>\d+(?:\.\d+)?)|(?P<scale>\bscale\b|\bon\s+an?\s+scale\b))?",
+    re.IGNORECASE,
+)
+
+
+def parse_identity_score(text: str) -> float | None:
+    """Find an explicitly stated identity score, using the last one if the text states several.
+
+    Returns None if no score is stated or the scale of the last one is ambiguous, e.g. a bare 7 without "/10" or "%",
+    or a score on another scale than 0-1 or 0-100. Earlier scores are not used, since the last one replaced them.
+    """
+    matches = list(_SCORE_PATTERN.finditer(text))
+    if not matches:
+        return None
+    match = matches[-1]
+    value = float(match["value"])
+    if match["scale"] is not None:
+        return None
+    if match["denominator"] is not None:
+        denominator = float(match["denominator"])
+        if denominator not in (1, 100):
+            return None
+        value /= denominator
+    elif match["percent"] is not None:
+        value /= 100
+    return value if 0 <= value <= 1 else None
+
+
+class Extraction(BaseModel):
+    path: str = Field(description='"local", or the name of the model that extracted the score')
+    model: ModelSpecifier | None = Field(default=None, description="Model that extracted the score, if any")
+    usage: UsageData = Field(description="Usage of the extraction step alone")
+
+
+class Extractor(Protocol):
+    async def extract(self, free_text_response: str) -> tuple[float, Extraction] | None:
+        """Extract the identity score, or return None to pass the text on to the next extractor."""
+        ...
+
+
+class LocalScoreExtractor:
+    async def extract(self, free_text_response: str) -> tuple[float, Extraction] | None:
+        identity = parse_identity_score(free_text_response)
+        if identity is None:
+            return None
+        return identity, Extraction(path="local", usage=NO_USAGE)
+
+
+class ModelExtractor:
+    """Extracts the score with a structured output call.
+
+    Unless `final`, failures are logged and the text is passed on to the next extractor.
+    """
+
+    def __init__(self, model: Model, final: bool = False) -> None:
+        self.model = model
+        self.final = final
+
+    async def extract(self, free_text_response: str) -> tuple[float, Extraction] | None:
+        extraction_prompt = f"""Please extract the identity score from the following analysis.
+
+Analysis:
+{free_text_response}"""
+
+        class ExtractionOutput(BaseModel):
+            """ """
+
+            identity: float = Field(ge=0, le=1, description="Extracted identity score between 0 and 1.")
+
+        extraction_messages = [HumanMessage(content=extraction_prompt)]
+        try:
+            extraction_output, usage = await self.model.get_structured_output(extraction_messages, ExtractionOutput)
+        except Exception as e:
+            if self.final:
+                raise
+            logging.warning(f"Extraction with {self.model.specifier.name} failed, falling back: {e}")
+            return None
+        return extraction_output.identity, Extraction(
+            path=self.model.specifier.name, model=self.model.specifier, usage=usage
+        )
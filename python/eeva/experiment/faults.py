@@ -0,0 +1,86 @@
+import asyncio
+import json
+import logging
+import random
+from collections.abc import Awaitable, Callable
+from typing import Literal, TypeVar
+
+import httpx
+import pydantic
+from langchain_core.exceptions import OutputParserException
+from pydantic import BaseModel, Field
+
+T = TypeVar("T")
+
+# transient: timeouts, dropped connections, rate limits and server errors, which usually pass on their own.
+# invalid_output: the model answered, but not with a valid score, so another sample may well be valid.
+# fatal: anything else, such as bad credentials or a bug, which retrying only pays for again.
+ErrorClass = Literal["transient", "invalid_output", "fatal"]
+
+# Provider SDK errors are matched by name, so that classifying them does not import the SDKs.
+TRANSIENT_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError"}
+
+
+def classify_error(error: BaseException) -> ErrorClass:
+    if isinstance(error, (pydantic.ValidationError, OutputParserException, json.JSONDecodeError)):
+        return "invalid_output"
+    if isinstance(error, (TimeoutError, httpx.TransportError)):
+        return "transient"
+    if any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(error).__mro__):
+        return "transient"
+    status_code = getattr(error, "status_code", None)
+    if isinstance(status_code, int) and (status_code in (408, 409, 429) or status_code >= 500):
+        return "transient"
+    return "fatal"
+
+
+class RetryPolicy(BaseModel):
+    max_attempts: int = Field(ge=1, description="Attempts including the first, so 1 means no retries")
+    initial_delay: float = Field(default=0.0, ge=0, description="Seconds before the first retry")
+    max_delay: float = Field(default=30.0, ge=0)
+
+    def delay(self, attempt: int) -> float:
+        """Exponential backoff with jitter, so calls that failed together do not retry together."""
+        return min(self.max_delay, self.initial_delay * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+
+class RetryPolicies(BaseModel):
+    transient: RetryPolicy = Field(default_factory=lambda: RetryPolicy(max_attempts=4, initial_delay=1.0))
+    invalid_output: RetryPolicy = Field(default_factory=lambda: RetryPolicy(max_attempts=2))
+
+    def policy(self, error_class: ErrorClass) -> RetryPolicy | None:
+        if error_class == "transient":
+            return self.transient
+        if error_class == "invalid_output":
+            return self.invalid_output
+        return None
+
+
+async def with_retries(policies: RetryPolicies, call: Callable[[], Awaitable[T]]) -> T:
+    """Await `call()`, calling it again after errors as the policy of the error's class allows.
+
+    Attempts are counted per error class, so e.g. timeouts do not use up the retries of invalid outputs.
+    """
+    failures: dict[ErrorClass, int] = {}
+    while True:
+        try:
+            return await call()
+        except Exception as e:
+            error_class = classify_error(e)
+            policy = policies.policy(error_class)
+            failures[error_class] = failures.get(error_class, 0) + 1
+            if policy is None or failures[error_class] >= policy.max_attempts:
+                raise
+            delay = policy.delay(failures[error_class])
+            logging.warning(f"Call failed with {error_class} error, retrying in {delay:.1f}s: {e!r}")
+            await asyncio.sleep(delay)
+
+
+class SampleFailure(BaseModel):
+    sample: int = Field(description="Index of the sample slot that has no result")
+    error_class: ErrorClass = Field()
+    error: str = Field()
+
+    @staticmethod
+    def from_error(sample: int, error: BaseException) -> "SampleFailure":
+        return SampleFailure(sample=sample, error_class=classify_error(error), error=repr(error))
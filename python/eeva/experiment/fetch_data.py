@@ -1,3 +1,4 @@
+import functools
 import json
 import typing
 from pathlib import Path
@@ -33,16 +34,18 @@ def update_data(secrets_path: Path, output_path: Path):
     )
 
     raw_answers = sb_client.table("user_answers").select("user_id, question_id, answer_text").execute().data
+    # Users have many answers, so validate each ID once.
+    validate_user_id = functools.cache(UserId.model_validate)
     user_answer_lists: dict[UserId, dict[str, str]] = {}
     for ans in raw_answers:
-        user_answer_lists.setdefault(UserId.model_validate(ans["user_id"]), {})[ans["question_id"]] = ans["answer_text"]
+        user_answer_lists.setdefault(validate_user_id(ans["user_id"]), {})[ans["question_id"]] = ans["answer_text"]
 
     raw_user_data = (
         sb_client.table("profiles").select("user_id,first_name,last_name,hidden,profile,language_code").execute().data
     )
     users: dict[UserId, dict[str, Any]] = {}
     for user in raw_user_data:
-        user_id: UserId = UserId.model_validate(user["user_id"])
+        user_id: UserId = validate_user_id(user["user_id"])
         if user["hidden"] or user_id not in user_answer_lists:
             continue
         users[user_id] = {
@@ -0,0 +1,146 @@
+"""Recompute reports from the analysis results of earlier runs, without calling any model.
+
+    python -m eeva.experiment.reanalyze RUN_DIR [RUN_DIR ...] [--set only_couples=false ...]
+
+User and couple filters can be changed with `--set`, and runs of the same analysis config are merged to get more
+samples per user. Only users scored by the runs can be reported on, and their scores are based on the answers the
+original runs saw, so filters that include new users or answers need a new run.
+"""
+
+import argparse
+import json
+import logging
+import typing
+from datetime import datetime
+from pathlib import Path
+
+from omegaconf import DictConfig, OmegaConf
+
+from . import results_store, run
+from .__main__ import ROOT_PATH, Config, to_run_config
+from .analysis import AnalysisResultSet, AnalysisResultUser
+from .types import RunConfig, UserId
+
+# Config keys that only select users, affect how the run was executed or what it wrote, so runs differing in them can
+# be merged.
+MERGEABLE_KEYS = {
+    "num_tests",
+    "user_exclusion_sets",
+    "user_inclusion_sets",
+    "only_couples",
+    "answer_progress_minimum",
+    "num_answers_minimum",
+    "profile",
+    "export_analysis_json",
+    "secrets_path",
+    "http_max_connections",
+    "http_max_keepalive_connections",
+    "http2",
+    "http_max_requests_per_second",
+    "retry_transient_attempts",
+    "retry_invalid_output_attempts",
+    "retry_passes",
+    "num_shards",
+}
+
+
+def load_run_config(run_dir: Path, overrides: list[str]) -> Config:
+    """Load the config a run was made with, filling keys added since from the defaults."""
+    defaults = OmegaConf.load(ROOT_PATH / "config" / "default.yaml")
+    assert isinstance(defaults, DictConfig)
+    defaults.pop("defaults", None)
+    defaults.pop("hydra", None)
+    cfg = OmegaConf.merge(
+        OmegaConf.structured(Config),
+        defaults,
+        OmegaConf.load(run_dir / ".hydra" / "config.yaml"),
+        OmegaConf.from_dotlist(overrides),
+    )
+    assert isinstance(cfg, DictConfig)
+    return typing.cast(Config, cfg)
+
+
+def merge_results(result_sets: list[AnalysisResultSet]) -> AnalysisResultSet:
+    """Concatenate the samples of each user over runs.
+
+    The failed sample slots of later runs are numbered after the slots of earlier ones.
+    """
+    merged: dict[UserId, AnalysisResultUser] = {}
+    for result_set in result_sets:
+        for user_id, user_result in result_set.items():
+            if user_id in merged:
+                merged_user = merged[user_id]
+                num_slots = len(merged_user.analysis_results) + len(merged_user.failures)
+                merged_user.analysis_results.extend(user_result.analysis_results)
+                merged_user.failures.extend(
+                    failure.model_copy(update={"sample": failure.sample + num_slots})
+                    for failure in user_result.failures
+                )
+            else:
+                merged[user_id] = AnalysisResultUser(
+                    first_name=user_result.first_name,
+                    last_name=user_result.last_name,
+                    llm_messages=user_result.llm_messages,
+                    analysis_results=list(user_result.analysis_results),
+                    failures=list(user_result.failures),
+                )
+    return AnalysisResultSet(merged)
+
+
+def reanalyze(run_dirs: list[Path], overrides: list[str], output_dir: Path) -> RunConfig:
+    cfgs = [load_run_config(run_dir, overrides) for run_dir in run_dirs]
+    for run_dir, cfg in zip(run_dirs[1:], cfgs[1:], strict=True):
+        differing = [
+            key
+            for key in vars(Config)["__dataclass_fields__"]
+            if key not in MERGEABLE_KEYS and getattr(cfg, key) != getattr(cfgs[0], key)
+        ]
+        if differing:
+            raise ValueError(f"Run {run_dir} differs from {run_dirs[0]} in {differing}")
+
+    usage_versions = {run_dir: results_store.load_usage_version(run_dir) for run_dir in run_dirs}
+    if len(set(usage_versions.values())) > 1:
+        raise ValueError(f"Runs count token usage differently and cannot be merged: {usage_versions}")
+
+    config = to_run_config(cfgs[0], output_dir)
+    result = merge_results([results_store.load_results(run_dir) for run_dir in run_dirs])
+    logging.info(f"Loaded results for {len(result)} users from {len(run_dirs)} runs")
+
+    users, couple_pairs = run.load_users(config)
+    result, users, couple_pairs = run.scored_users(result, users, couple_pairs)
+    num_tests = max((len(user_result.analysis_results) for user_result in result.values()), default=0)
+    config = config.model_copy(update={"num_tests": max(1, num_tests)})
+    logging.info(f"Reanalyzing {len(users)} users and {len(couple_pairs)} couples with up to {num_tests} samples")
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with (output_dir / "runs.json").open("w", encoding="utf-8") as f:
+        json.dump({"runs": [str(run_dir) for run_dir in run_dirs], "overrides": overrides}, f, indent=2)
+    with results_store.ResultsWriter(output_dir / "results", usage_version=usage_versions[run_dirs[0]]) as writer:
+        writer.add_all(result)
+    run.write_analysis(result, users, couple_pairs, config)
+    return config
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Recompute reports from earlier runs without calling any model")
+    parser.add_argument("run_dirs", type=Path, nargs="+", help="Output directories of the runs to merge")
+    parser.add_argument(
+        "--set",
+        dest="overrides",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="Override a config value, e.g. only_couples=false or user_exclusion_sets=[default_exclude]",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        default=ROOT_PATH / "output" / "reanalyze" / datetime.now().strftime("%Y-%m-%d/%H-%M-%S"),
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)-8s | %(name)s | %(message)s")
+    reanalyze([run_dir.resolve() for run_dir in args.run_dirs], args.overrides, args.output_dir.resolve())
+
+
+if __name__ == "__main__":
+    main()
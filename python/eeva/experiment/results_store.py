@@ -0,0 +1,233 @@
+"""On-disk store for the analysis results of a run.
+
+A store is a directory with
+- `samples.bin`: one fixed-size record per sample (see `SAMPLE_DTYPE`), memory-mappable with `np.memmap`.
+- `users.jsonl`: one line per user, with their failed samples. The line number is the user index used in the sample
+  records.
+- `blobs.bin` and `blob_index.bin`: CoTs, messages and other text, stored once per distinct content.
+- `meta.json`: the `USAGE_VERSION` the token counts were recorded with.
+
+Everything is appended as users finish, so a crashed run keeps the users it completed.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from numpy import ndarray
+from pydantic import BaseModel
+
+from ..models import USAGE_VERSION, ModelSpecifier, UsageData
+from .analysis import AnalysisResult, AnalysisResultSet, AnalysisResultUser
+from .extraction import Extraction
+from .types import Profile, UserId
+
+SAMPLE_DTYPE = np.dtype(
+    [
+        ("user", "<u4"),
+        ("sample", "<u4"),
+        ("identity", "<f8"),
+        ("input_tokens", "<i8"),
+        ("cached_input_tokens", "<i8"),
+        ("output_tokens", "<i8"),
+        ("reasoning_tokens", "<i8"),
+        # Blob indices, -1 for None.
+        ("cot", "<i8"),
+        ("model", "<i8"),
+        ("extraction", "<i8"),
+    ]
+)
+BLOB_DTYPE = np.dtype([("hash", "S32"), ("offset", "<i8"), ("length", "<i8")])
+
+
+class ResultsWriter:
+    def __init__(self, path: Path, usage_version: int = USAGE_VERSION) -> None:
+        path.mkdir(parents=True, exist_ok=True)
+        if (path / "users.jsonl").exists():
+            raise ValueError(f"A results store already exists at {path}")
+        self.path = path
+        (path / "meta.json").write_text(json.dumps({"usage_version": usage_version}), encoding="utf-8")
+        self._samples = (path / "samples.bin").open("wb")
+        self._users = (path / "users.jsonl").open("w", encoding="utf-8")
+        self._blobs = (path / "blobs.bin").open("wb")
+        self._blob_index = (path / "blob_index.bin").open("wb")
+        self._blob_ids: dict[bytes, int] = {}
+        self._blob_offset = 0
+        self._num_users = 0
+
+    def __enter__(self) -> "ResultsWriter":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def _blob(self, content: str | None) -> int:
+        if content is None:
+            return -1
+        data = content.encode("utf-8")
+        digest = hashlib.sha256(data).digest()
+        if digest not in self._blob_ids:
+            self._blob_ids[digest] = len(self._blob_ids)
+            self._blobs.write(data)
+            self._blob_index.write(np.array([(digest, self._blob_offset, len(data))], dtype=BLOB_DTYPE).tobytes())
+            self._blob_offset += len(data)
+        return self._blob_ids[digest]
+
+    def _json_blob(self, model: BaseModel | None) -> int:
+        return -1 if model is None else self._blob(model.model_dump_json())
+
+    def add_user(self, user_id: UserId, user_result: AnalysisResultUser) -> None:
+        user_index = self._num_users
+        self._num_users += 1
+        messages = [self._blob(message.model_dump_json()) for message in user_result.llm_messages]
+        samples = np.array(
+            [
+                (
+                    user_index,
+                    i,
+                    result.profile.identity,
+                    result.response_metadata.input_tokens,
+                    result.response_metadata.cached_input_tokens,
+                    result.response_metadata.output_tokens,
+                    result.response_metadata.reasoning_tokens,
+                    self._blob(result.cot),
+                    self._json_blob(result.model),
+                    self._json_blob(result.extraction),
+                )
+                for i, result in enumerate(user_result.analysis_results)
+            ],
+            dtype=SAMPLE_DTYPE,
+        )
+        # Blobs go first, so every record that is written refers to blobs that are.
+        self._blobs.flush()
+        self._blob_index.flush()
+        self._samples.write(samples.tobytes())
+        self._samples.flush()
+        user_line = {
+            "user_id": user_id.root,
+            "first_name": user_result.first_name,
+            "last_name": user_result.last_name,
+            "messages": messages,
+            "failures": [failure.model_dump() for failure in user_result.failures],
+        }
+        self._users.write(json.dumps(user_line, ensure_ascii=False) + "\n")
+        self._users.flush()
+
+    def add_all(self, result: AnalysisResultSet) -> None:
+        for user_id, user_result in result.items():
+            self.add_user(user_id, user_result)
+
+    def close(self) -> None:
+        for f in (self._samples, self._users, self._blobs, self._blob_index):
+            f.close()
+
+
+class ResultsReader:
+    """Memory-maps a results store. Blobs are only decoded when asked for."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        with (path / "users.jsonl").open("r", encoding="utf-8") as f:
+            self.users: list[dict[str, Any]] = [json.loads(line) for line in f]
+        self.user_ids = [UserId(user["user_id"]) for user in self.users]
+        self.samples = _memmap(path / "samples.bin", SAMPLE_DTYPE)
+        # A crash can leave samples of a user whose line was not written yet. Users are written in index order.
+        self.samples = self.samples[: np.searchsorted(self.samples["user"], len(self.users))]
+        self._blob_index = _memmap(path / "blob_index.bin", BLOB_DTYPE)
+        self._blobs = _memmap(path / "blobs.bin", np.dtype("u1"))
+        # Stores made before meta.json existed counted tokens as in version 1.
+        meta_path = path / "meta.json"
+        meta = json.loads(meta_path.read_text(encoding="utf-8")) if meta_path.exists() else {}
+        self.usage_version: int = meta.get("usage_version", 1)
+
+    @staticmethod
+    def exists(path: Path) -> bool:
+        return (path / "users.jsonl").exists()
+
+    def blob(self, index: int) -> str | None:
+        if index < 0:
+            return None
+        entry = self._blob_index[index]
+        return bytes(self._blobs[entry["offset"] : entry["offset"] + entry["length"]]).decode("utf-8")
+
+    def identity_matrix(self, user_ids: list[UserId] | None = None) -> ndarray:
+        """Identity samples with shape (num_users, max samples per user), padded with NaN.
+
+        Rows follow `user_ids`, or the order of the store if not given.
+        """
+        row_of_user = np.full(len(self.users), -1)
+        if user_ids is None:
+            row_of_user[:] = np.arange(len(self.users))
+            num_rows = len(self.users)
+        else:
+            index_of_user = {user_id: i for i, user_id in enumerate(self.user_ids)}
+            row_of_user[[index_of_user[user_id] for user_id in user_ids]] = np.arange(len(user_ids))
+            num_rows = len(user_ids)
+        rows = row_of_user[self.samples["user"]]
+        included = rows >= 0
+        num_samples = int(self.samples["sample"][included].max()) + 1 if included.any() else 0
+        identity_values = np.full((num_rows, num_samples), np.nan)
+        identity_values[rows[included], self.samples["sample"][included]] = self.samples["identity"][included]
+        return identity_values
+
+    def to_result_set(self) -> AnalysisResultSet:
+        """Load the full results, e.g. for exporting them as JSON."""
+        results: list[list[AnalysisResult]] = [[] for _ in self.users]
+        for record in self.samples:
+            model = self.blob(int(record["model"]))
+            extraction = self.blob(int(record["extraction"]))
+            results[record["user"]].append(
+                AnalysisResult(
+                    profile=Profile(identity=float(record["identity"])),
+                    cot=self.blob(int(record["cot"])),
+                    response_metadata=UsageData(
+                        input_tokens=int(record["input_tokens"]),
+                        cached_input_tokens=int(record["cached_input_tokens"]),
+                        output_tokens=int(record["output_tokens"]),
+                        reasoning_tokens=int(record["reasoning_tokens"]),
+                    ),
+                    model=ModelSpecifier.model_validate_json(model) if model is not None else None,
+                    extraction=Extraction.model_validate_json(extraction) if extraction is not None else None,
+                )
+            )
+        return AnalysisResultSet(
+            {
+                user_id: AnalysisResultUser(
+                    first_name=user["first_name"],
+                    last_name=user["last_name"],
+                    llm_messages=[json.loads(self.blob(index) or "null") for index in user["messages"]],
+                    analysis_results=user_results,
+                    failures=user.get("failures", []),
+                )
+                for user_id, user, user_results in zip(self.user_ids, self.users, results, strict=True)
+            }
+        )
+
+
+def _memmap(path: Path, dtype: np.dtype) -> ndarray:
+    # A crash can leave a partly written record at the end. np.memmap cannot map empty files.
+    num_records = path.stat().st_size // dtype.itemsize
+    if num_records == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(num_records,))
+
+
+def load_results(run_dir: Path) -> AnalysisResultSet:
+    """Load the results of a run from its results store, or from analysis.json for runs made before it existed."""
+    if ResultsReader.exists(run_dir / "results"):
+        return ResultsReader(run_dir / "results").to_result_set()
+    return AnalysisResultSet.model_validate_json((run_dir / "analysis.json").read_text(encoding="utf-8"))
+
+
+def load_usage_version(run_dir: Path) -> int:
+    """The `USAGE_VERSION` of a run's token counts. Runs with only analysis.json predate version 2."""
+    if ResultsReader.exists(run_dir / "results"):
+        return ResultsReader(run_dir / "results").usage_version
+    return 1
+
+
+def export_json(result: AnalysisResultSet, path: Path) -> None:
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(result.model_dump(), f, indent=2, ensure_ascii=False)
@@ -2,20 +2,31 @@ import asyncio
 import json
 import logging
 import os
+from collections.abc import Mapping
 from datetime import datetime
 from pathlib import Path
+from typing import Callable
 
 import numpy as np
 
-from .. import models
-from ..models import Model, ModelSpecifier
-from . import analysis, stats
-from .analysis import AnalysisResultSet, Analyzer
+from .. import http_pool, models, usage_ledger, utils
+from ..models import Model, ModelSpecifier, UsageData
+from . import analysis, results_store, stats
+from .analysis import (
+    AnalysisResult,
+    AnalysisResultSet,
+    AnalysisResultUser,
+    Analyzer,
+    CascadeAnalyzer,
+    CascadeReport,
+    DecomposedAnalyzer,
+)
+from .answer_cache import AnswerScoreCache
+from .answer_index import AnswerIndex
 from .types import (
     BaseData,
     CoupleId,
     CouplePairs,
-    QuestionResponse,
     QuestionSet,
     RunConfig,
     UserId,
@@ -47,8 +58,8 @@ def filter_questions(questions: QuestionSet, config: RunConfig) -> QuestionSet:
         else None
     )
 
-    return QuestionSet(
-        {
+    return QuestionSet.model_construct(
+        root={
             q_id: q
             for q_id, q in questions.items()
             if q_id not in exclusion_set and (inclusion_set is None or q_id in inclusion_set)
@@ -56,21 +67,13 @@ def filter_questions(questions: QuestionSet, config: RunConfig) -> QuestionSet:
     )
 
 
-def word_count(text: str) -> int:
-    return len(text.strip().split())
-
-
-def answer_progress(response: QuestionResponse, examples: list[str]) -> float:
-    if not examples:
-        raise ValueError("No examples provided for progress calculation.")
-    response_length = word_count(response.response)
-    examples_length_max = np.max([word_count(example) for example in examples])
-    return response_length / examples_length_max
-
-
 def filter_users(
-    users: UserSet, questions: QuestionSet, couple_pairs: CouplePairs, config: RunConfig
+    users: UserSet, questions: QuestionSet, couple_pairs: CouplePairs, config: RunConfig, answer_index: AnswerIndex
 ) -> tuple[UserSet, CouplePairs]:
+    """Filter users and their answers using the answers' progress from `answer_index`.
+
+    `users` is not modified, so one loaded snapshot can be filtered with many configs.
+    """
     exclusion_set: set[UserId] = {
         UserId(line.strip())
         for set_name in config.user_exclusion_sets
@@ -86,55 +89,87 @@ def filter_users(
         else None
     )
 
-    users = UserSet(
-        {
+    users = UserSet.model_construct(
+        root={
             user_id: user
             for user_id, user in users.items()
             if user_id not in exclusion_set and (inclusion_set is None or user_id in inclusion_set)
         }
     )
-    for user in users.values():
-        language_code = user.language_code
-        user.response.responses = {
-            q_id: resp
-            for q_id, resp in user.response.responses.items()
-            if q_id in questions
-            and answer_progress(resp, questions[q_id].translations[language_code].examples)
-            >= config.answer_progress_minimum
+    answer_mask = answer_index.answer_mask(set(questions.keys()), config.answer_progress_minimum, set(users.keys()))
+    kept_questions = answer_index.kept_questions(answer_mask)
+    users = UserSet.model_construct(
+        root={
+            user_id: user
+            for user_id, user in users.items()
+            if len(kept_questions.get(user_id, [])) >= config.num_answers_minimum
         }
-    users = UserSet(
-        {user_id: user for user_id, user in users.items() if len(user.response.responses) >= config.num_answers_minimum}
     )
     couple_pairs = CouplePairs(
         {couple_id: (id1, id2) for couple_id, (id1, id2) in couple_pairs.items() if id1 in users and id2 in users}
     )
     couple_users = {user_id for couple in couple_pairs.values() for user_id in couple}
-    users = UserSet(
-        {user_id: user for user_id, user in users.items() if not config.only_couples or user_id in couple_users}
+    users = UserSet.model_construct(
+        root={
+            user_id: user.with_responses(
+                {question_id: user.response.responses[question_id] for question_id in kept_questions[user_id]}
+            )
+            for user_id, user in users.items()
+            if not config.only_couples or user_id in couple_users
+        }
     )
     return users, couple_pairs
 
 
-def usage_report(analysis_results: AnalysisResultSet, model_specifier: ModelSpecifier) -> str:
-    total_non_cached_input_tokens = sum(
-        result.response_metadata.input_tokens
-        for user_result in analysis_results.values()
-        for result in user_result.analysis_results
-    )
-    total_cached_input_tokens = sum(
-        result.response_metadata.cached_input_tokens
-        for user_result in analysis_results.values()
-        for result in user_result.analysis_results
-    )
-    total_output_tokens = sum(
-        result.response_metadata.output_tokens
-        for user_result in analysis_results.values()
-        for result in user_result.analysis_results
-    )
-    total_reasoning_tokens = sum(
-        result.response_metadata.reasoning_tokens
+def usage_report(
+    analysis_results: AnalysisResultSet, model_specifier: ModelSpecifier, multi_sample: bool = False
+) -> str:
+    result_models = {
+        result.model or model_specifier
         for user_result in analysis_results.values()
         for result in user_result.analysis_results
+    }
+    if len(result_models) == 1:
+        [model_specifier] = result_models
+    elif len(result_models) > 1:
+        # Results from a model cascade are priced and reported separately for each model.
+        return "\n".join(
+            f"{result_model.name}:\n"
+            + usage_report(
+                AnalysisResultSet(
+                    {
+                        user_id: user_result.model_copy(
+                            update={
+                                "analysis_results": [
+                                    result
+                                    for result in user_result.analysis_results
+                                    if (result.model or model_specifier) == result_model
+                                ]
+                            }
+                        )
+                        for user_id, user_result in analysis_results.items()
+                    }
+                ),
+                result_model,
+                multi_sample,
+            )
+            for result_model in sorted(result_models, key=lambda specifier: specifier.name)
+        )
+    tokens = np.array(
+        [
+            (
+                result.response_metadata.input_tokens,
+                result.response_metadata.cached_input_tokens,
+                result.response_metadata.output_tokens,
+                result.response_metadata.reasoning_tokens,
+            )
+            for user_result in analysis_results.values()
+            for result in user_result.analysis_results
+        ],
+        dtype=np.int64,
+    ).reshape(-1, 4)
+    total_non_cached_input_tokens, total_cached_input_tokens, total_output_tokens, total_reasoning_tokens = (
+        int(total) for total in tokens.sum(axis=0)
     )
 
     pricing_info = models.model_pricing[model_specifier]
@@ -147,19 +182,182 @@ def usage_report(analysis_results: AnalysisResultSet, model_specifier: ModelSpec
         (100 * pricing_info.cached_input * total_cached_input_tokens / total_cost) if total_cost > 0 else 0
     )
     output_cost_percentage = (100 * pricing_info.output * total_output_tokens / total_cost) if total_cost > 0 else 0
+    # Reasoning tokens are billed as output tokens, and are included in the output token count.
     reasoning_cost_percentage = (
-        (100 * pricing_info.input * total_reasoning_tokens / total_cost) if total_cost > 0 else 0
+        (100 * pricing_info.output * total_reasoning_tokens / total_cost) if total_cost > 0 else 0
+    )
+
+    # Estimate the other sampling mode assuming the same output and cache hit rate. A multi-sample call sends the
+    # input once for all of a user's samples, while independent calls send it once per sample.
+    def other_mode_input(tokens: Callable[[UsageData], int]) -> float:
+        return sum(
+            sum(tokens(result.response_metadata) for result in user_result.analysis_results)
+            * (len(user_result.analysis_results) if multi_sample else 1 / len(user_result.analysis_results))
+            for user_result in analysis_results.values()
+            if user_result.analysis_results
+        )
+
+    other_mode_cost = pricing_info.calculate(
+        round(other_mode_input(lambda usage: usage.input_tokens)),
+        round(other_mode_input(lambda usage: usage.cached_input_tokens)),
+        total_output_tokens,
+    )
+    num_calls = sum(
+        1 if multi_sample else len(user_result.analysis_results)
+        for user_result in analysis_results.values()
+        if user_result.analysis_results
+    )
+    mode = "multi-sample" if multi_sample else "one call per sample"
+    total_input_tokens = total_non_cached_input_tokens + total_cached_input_tokens
+    cache_hit_ratio = total_cached_input_tokens / total_input_tokens if total_input_tokens > 0 else 0
+    cache_savings = (pricing_info.input - pricing_info.cached_input) * total_cached_input_tokens
+    calls_with_cache_hits = sum(
+        1
+        for user_result in analysis_results.values()
+        for result in user_result.analysis_results
+        if result.response_metadata.cached_input_tokens > 0
     )
+    num_results = sum(len(user_result.analysis_results) for user_result in analysis_results.values())
+    other_mode = "one call per sample" if multi_sample else "multi-sample"
+    extraction_summary = extraction_report(analysis_results, model_specifier)
     return f"""Estimated overall cost: {total_cost:.2f}$
 Total non-cached input tokens: {total_non_cached_input_tokens} ({non_cached_cost_percentage:.1f}%)
 Total cached input tokens: {total_cached_input_tokens} ({cached_cost_percentage:.1f}%)
 Total output tokens: {total_output_tokens} ({output_cost_percentage:.1f}%)
     Total implicit reasoning tokens: {total_reasoning_tokens} ({reasoning_cost_percentage:.1f}%)
+Cache hit ratio: {100 * cache_hit_ratio:.1f}% of input tokens, {calls_with_cache_hits}/{num_results} results with hits
+    Saved by caching: {cache_savings:.2f}$
+Sampling mode: {mode} ({num_calls} calls)
+    Estimated cost with {other_mode}: {other_mode_cost:.2f}$ ({other_mode_cost - total_cost:+.2f}$)
+{extraction_summary}"""
+
+
+# Rough size of the extraction prompt and structured output around the analysis text, used to estimate savings
+# when no extractions were made with the analysis model.
+EXTRACTION_PROMPT_TOKENS = 60
+EXTRACTION_OUTPUT_TOKENS = 10
+
+
+def extraction_report(analysis_results: AnalysisResultSet, model_specifier: ModelSpecifier) -> str:
+    """Summarize which extractors produced the scores in two-step analysis and what the cheaper paths saved."""
+    results = [
+        result
+        for user_result in analysis_results.values()
+        for result in user_result.analysis_results
+        if result.extraction is not None
+    ]
+    if not results:
+        return ""
+    pricing_info = models.model_pricing[model_specifier]
+    path_counts: dict[str, int] = {}
+    for result in results:
+        assert result.extraction is not None
+        path_counts[result.extraction.path] = path_counts.get(result.extraction.path, 0) + 1
+
+    same_model_costs = [
+        result.extraction.usage.calculate_cost(pricing_info)
+        for result in results
+        if result.extraction is not None and result.extraction.model == model_specifier
+    ]
+    separate_model_cost = sum(
+        result.extraction.usage.calculate_cost(models.model_pricing[result.extraction.model])
+        for result in results
+        if result.extraction is not None
+        and result.extraction.model is not None
+        and result.extraction.model != model_specifier
+    )
+
+    def same_model_cost(result: AnalysisResult) -> float:
+        if same_model_costs:
+            return sum(same_model_costs) / len(same_model_costs)
+        # The extraction call reads the visible part of the step 1 output.
+        visible_output_tokens = result.response_metadata.output_tokens - result.response_metadata.reasoning_tokens
+        return pricing_info.calculate(visible_output_tokens + EXTRACTION_PROMPT_TOKENS, 0, EXTRACTION_OUTPUT_TOKENS)
+
+    saved = (
+        sum(
+            same_model_cost(result)
+            for result in results
+            if result.extraction is not None and result.extraction.model != model_specifier
+        )
+        - separate_model_cost
+    )
+    paths = ", ".join(f"{count} {path}" for path, count in sorted(path_counts.items()))
+    return f"""Extraction: {paths}
+    Cost of separate extraction models: {separate_model_cost:.2f}$
+    Estimated saved by not extracting with {model_specifier.name}: {saved:.2f}$
 """
 
 
-def run(config: RunConfig) -> None:
-    with config.secrets_path.open("r") as f:
+def usage_breakdown(ledger: usage_ledger.UsageLedger) -> str:
+    """Usage of every call made in the run, including calls to extraction models, by model, step and user."""
+    return "\n\n".join(ledger.report(by, models.model_pricing) for by in ("model", "step", "user"))
+
+
+def load_base_data(data_dir: Path) -> tuple[BaseData, AnswerIndex]:
+    with (data_dir / "base_data.json").open("r", encoding="utf-8") as f:
+        base_data = BaseData.model_validate_json(f.read())
+    return base_data, AnswerIndex.load_or_build(data_dir / "base_data.json", base_data)
+
+
+def load_users(config: RunConfig, base_data: tuple[BaseData, AnswerIndex] | None = None) -> tuple[UserSet, CouplePairs]:
+    """`base_data` is the loaded data of `config.data_dir`, for callers that filter it with several configs."""
+    with (config.data_dir / "couples.json").open("r", encoding="utf-8") as f:
+        couple_pairs_raw: CouplePairs = {
+            CoupleId(couple_id): (UserId(id1), UserId(id2)) for couple_id, (id1, id2) in json.load(f).items()
+        }
+
+    data, answer_index = base_data if base_data is not None else load_base_data(config.data_dir)
+
+    questions = filter_questions(data.questions, config)
+    logging.info(f"Loaded {len(questions)} questions after filtering from {len(data.questions)} total.")
+
+    users, couple_pairs = filter_users(data.users, questions, couple_pairs_raw, config, answer_index)
+    logging.info(f"Loaded {len(users)} users after filtering from {len(data.users)} total.")
+    removed_users = set(data.users.keys()) - set(users.keys())
+    for removed_user in removed_users:
+        logging.debug(f"Removed user {removed_user} due to filtering.")
+
+    logging.info(f"Loaded {len(couple_pairs)} couples from {len(couple_pairs_raw)} total.")
+
+    return users, couple_pairs
+
+
+def scored_users(
+    result: AnalysisResultSet, users: UserSet, couple_pairs: CouplePairs
+) -> tuple[AnalysisResultSet, UserSet, CouplePairs]:
+    """Restrict the filtered users and the results to each other, leaving out users without any scores."""
+    unscored = [user_id for user_id in users.keys() if user_id not in result or not result[user_id].analysis_results]
+    if unscored:
+        logging.warning(f"{len(unscored)} users pass the filters but have no scores. Leaving them out.")
+    users = UserSet.model_construct(
+        root={
+            user_id: user for user_id, user in users.items() if user_id in result and result[user_id].analysis_results
+        }
+    )
+    couple_pairs = {
+        couple_id: (id1, id2) for couple_id, (id1, id2) in couple_pairs.items() if id1 in users and id2 in users
+    }
+    return AnalysisResultSet({user_id: result[user_id] for user_id in users.keys()}), users, couple_pairs
+
+
+def write_analysis(result: AnalysisResultSet, users: UserSet, couple_pairs: CouplePairs, config: RunConfig) -> None:
+    """Write the reports of the scored users, whose results are also in the results store in the output directory."""
+    if config.export_analysis_json:
+        analysis_dump_path = config.output_dir / "analysis.json"
+        results_store.export_json(result, analysis_dump_path)
+        logging.info(f"Wrote analysis results to {analysis_dump_path}")
+
+    fig = stats.identity_histogram(result)
+    histogram_path = config.output_dir / "identity_histogram.png"
+    fig.savefig(histogram_path)
+    logging.info(f"Wrote identity histogram to {histogram_path}")
+
+    stats.analyze(results_store.ResultsReader(config.output_dir / "results"), users, couple_pairs, config)
+
+
+def set_api_keys(secrets_path: Path) -> None:
+    with secrets_path.open("r") as f:
         secrets = json.load(f)
         if secrets["OPENAI_API_KEY"]:
             os.environ["OPENAI_API_KEY"] = secrets["OPENAI_API_KEY"]
@@ -168,43 +366,38 @@ def run(config: RunConfig) -> None:
         if secrets["GEMINI_API_KEY"]:
             os.environ["GEMINI_API_KEY"] = secrets["GEMINI_API_KEY"]
 
-    llm = Model.from_specifier(
-        ModelSpecifier(
-            name=config.model,
-            provider=config.model_provider,
-        ),
-        reasoning_effort=config.reasoning_effort,
-    )
 
-    with (config.data_dir / "couples.json").open("r", encoding="utf-8") as f:
-        couple_pairs_raw: CouplePairs = {
-            CoupleId(couple_id): (UserId(id1), UserId(id2)) for couple_id, (id1, id2) in json.load(f).items()
-        }
+def run(config: RunConfig) -> None:
+    set_api_keys(config.secrets_path)
+    http_pool.configure(config.http_pool)
+    users, couple_pairs = load_users(config)
 
-    with (config.data_dir / "base_data.json").open("r", encoding="utf-8") as f:
-        base_data = BaseData.model_validate_json(f.read())
+    async def main() -> None:
+        async with utils.loop_lag_monitor():
+            try:
+                await run_loaded(config, users, couple_pairs)
+            finally:
+                logging.info(f"HTTP pool usage: {http_pool.stats()}")
+                await http_pool.aclose()
 
-        questions = filter_questions(base_data.questions, config)
-        logging.info(f"Loaded {len(questions)} questions after filtering from {len(base_data.questions)} total.")
+    asyncio.run(main())
 
-        users, couple_pairs = filter_users(base_data.users, questions, couple_pairs_raw, config)
-        logging.info(f"Loaded {len(users)} users after filtering from {len(base_data.users)} total.")
-        removed_users = set(base_data.users.keys()) - set(users.keys())
-        for removed_user in removed_users:
-            logging.debug(f"Removed user {removed_user} due to filtering.")
 
-        logging.info(f"Loaded {len(couple_pairs)} couples from {len(couple_pairs_raw)} total.")
+async def run_loaded(config: RunConfig, users: UserSet, couple_pairs: CouplePairs) -> None:
+    """Run the experiment on already filtered users.
+
+    The caller sets up the API keys and the HTTP pool and closes the pool afterwards, so runs can share them.
+    """
+    write_prompts(config)
+    results_path = config.output_dir / "results"
+    ledger = usage_ledger.UsageLedger()
+    with results_store.ResultsWriter(results_path) as writer, usage_ledger.scope(ledger=ledger):
+        result, cascade_report = await generate_results(config, users, writer)
+    logging.info(f"Wrote analysis results to {results_path}")
+    write_reports(config, result, users, couple_pairs, ledger, cascade_report)
 
-    analyzer = Analyzer(
-        identity_prompt=config.identity_prompt,
-        identity_extraction_prompt=config.identity_extraction_prompt,
-        explicit_cot=config.explicit_cot,
-        two_step_analysis=config.two_step_analysis,
-        system_prompt=config.system_prompt,
-        user_prompt=config.user_prompt,
-        llm=llm,
-    )
 
+def write_prompts(config: RunConfig) -> None:
     prompt_output_dir = config.output_dir / "prompts"
     prompt_output_dir.mkdir(exist_ok=True)
 
@@ -221,32 +414,134 @@ def run(config: RunConfig) -> None:
     with (prompt_output_dir / "user_prompt.txt").open("w", encoding="utf-8") as f:
         f.write("")
 
+
+async def generate_results(
+    config: RunConfig,
+    users: UserSet,
+    writer: results_store.ResultsWriter,
+    previous: Mapping[UserId, AnalysisResultUser] | None = None,
+) -> tuple[AnalysisResultSet, CascadeReport | None]:
+    """Score `users` as `config` says, writing each user's results to `writer` as soon as they are done.
+
+    Users in `previous` keep their successful samples, and only their failed samples are scored again.
+    """
+    llm = Model.from_specifier(
+        ModelSpecifier(
+            name=config.model,
+            provider=config.model_provider,
+        ),
+        reasoning_effort=config.reasoning_effort,
+    )
+
+    analyzer = Analyzer(
+        identity_prompt=config.identity_prompt,
+        identity_extraction_prompt=config.identity_extraction_prompt,
+        explicit_cot=config.explicit_cot,
+        two_step_analysis=config.two_step_analysis,
+        system_prompt=config.system_prompt,
+        user_prompt=config.user_prompt,
+        llm=llm,
+        multi_sample=config.multi_sample,
+        cache_aware=config.cache_aware,
+        local_extraction=config.local_extraction,
+        extraction_llm=Model.from_specifier(config.extraction_model, reasoning_effort=config.reasoning_effort)
+        if config.extraction_model is not None
+        else None,
+        retry_policies=config.retry_policies,
+    )
+    cascade: CascadeAnalyzer | None = None
+    if config.cascade is not None:
+        if config.adaptive_sampling is not None:
+            raise ValueError("Adaptive sampling cannot be combined with a model cascade.")
+        if config.num_tests < 2:
+            raise ValueError("A model cascade needs num_tests of at least 2 to measure disagreement.")
+        cascade = CascadeAnalyzer(
+            tiers=[
+                analyzer.model_copy(
+                    update={"llm": Model.from_specifier(specifier, reasoning_effort=config.reasoning_effort)}
+                )
+                for specifier in config.cascade.models
+            ],
+            max_stddev=config.cascade.max_stddev,
+        )
+    answer_cache: AnswerScoreCache | None = None
+    decomposed: DecomposedAnalyzer | None = None
+    if config.answer_cache_path is not None:
+        if config.adaptive_sampling is not None or cascade is not None:
+            raise ValueError("Decomposed scoring cannot be combined with adaptive sampling or a model cascade.")
+        config.answer_cache_path.parent.mkdir(parents=True, exist_ok=True)
+        answer_cache = AnswerScoreCache(config.answer_cache_path)
+        decomposed = DecomposedAnalyzer.create(
+            analyzer, answer_cache, model_settings=f"reasoning_effort={config.reasoning_effort}"
+        )
+
     logging.info(f"Generating {config.num_tests} profiles per user for {len(users)} users...")
     # Synchronously get current time
     time_started = datetime.now()
-    result: AnalysisResultSet = asyncio.run(
-        analysis.generate_profiles(analyzer, users, config.num_tests, user_subset=None)
-    )
+
+    try:
+        if config.adaptive_sampling is not None:
+            result = await analysis.generate_profiles_adaptive(
+                analyzer,
+                users,
+                config.adaptive_sampling,
+                user_subset=None,
+                on_user=writer.add_user,
+                previous=previous,
+            )
+        else:
+            result = await analysis.generate_profiles(
+                decomposed or cascade or analyzer,
+                users,
+                config.num_tests,
+                user_subset=None,
+                on_user=writer.add_user,
+                retry_passes=config.retry_passes,
+                previous=previous,
+            )
+    finally:
+        if answer_cache is not None:
+            logging.info(
+                f"Reused {answer_cache.hits} of {answer_cache.hits + answer_cache.misses} answer scores "
+                f"from {config.answer_cache_path}"
+            )
+            answer_cache.close()
 
     time_ended = datetime.now()
     logging.info(
         f"Generated profiles for {len(users)} users in {(time_ended - time_started).total_seconds():.2f} seconds."
     )
-
-    analysis_dump_path = config.output_dir / "analysis.json"
-    with analysis_dump_path.open("w", encoding="utf-8") as f:
-        json.dump(result.model_dump(), f, indent=2, ensure_ascii=False)
-    logging.info(f"Wrote analysis results to {analysis_dump_path}")
-
-    fig = stats.identity_histogram(result)
-    histogram_path = config.output_dir / "identity_histogram.png"
-    fig.savefig(histogram_path)
-    logging.info(f"Wrote identity histogram to {histogram_path}")
-
-    stats.analyze(result, users, couple_pairs, config)
-
-    cost_report = usage_report(result, llm.specifier)
+    return result, cascade.report if cascade is not None else None
+
+
+def write_reports(
+    config: RunConfig,
+    result: AnalysisResultSet,
+    users: UserSet,
+    couple_pairs: CouplePairs,
+    ledger: usage_ledger.UsageLedger,
+    cascade_report: CascadeReport | None,
+) -> None:
+    if users and not any(user_result.analysis_results for user_result in result.values()):
+        raise ValueError(f"Every sample failed, see the failures in {config.output_dir / 'results'}")
+    scored_result, scored, scored_couple_pairs = scored_users(result, users, couple_pairs)
+    write_analysis(scored_result, scored, scored_couple_pairs, config)
+
+    cost_report = usage_report(
+        result, ModelSpecifier(name=config.model, provider=config.model_provider), config.multi_sample
+    )
     cost_report_path = config.output_dir / "usage_report.txt"
     with cost_report_path.open("w", encoding="utf-8") as f:
         f.write(cost_report)
     logging.info(f"Wrote usage report to {cost_report_path}")
+
+    usage_breakdown_path = config.output_dir / "usage_breakdown.txt"
+    with usage_breakdown_path.open("w", encoding="utf-8") as f:
+        f.write(usage_breakdown(ledger))
+    logging.info(f"Wrote usage breakdown to {usage_breakdown_path}")
+
+    if cascade_report is not None:
+        cascade_report_path = config.output_dir / "cascade_report.txt"
+        with cascade_report_path.open("w", encoding="utf-8") as f:
+            f.write(cascade_report.report())
+        logging.info(f"Wrote cascade report to {cascade_report_path}")
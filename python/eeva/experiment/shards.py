@@ -0,0 +1,200 @@
+"""Run an experiment in shards of users on a local process pool, then merge the shards into one run.
+
+A single process spends much of a large run building requests and parsing responses on one interpreter. With
+`num_shards` above 1, users are split between that many worker processes by a hash of their id, so a user always lands
+in the same shard. Each shard keeps its progress in `shards/<shard>/` of the run's output directory:
+- `<attempt>/results`: the results store of each time the shard was started, holding the users it completed.
+- `<attempt>/usage_ledger.npz` and `<attempt>/cascade_report.json`, written when the attempt finishes.
+- `done`, once every user of the shard has been scored without retryable failures.
+
+Starting the run again with the same output directory (`hydra.run.dir=...`) skips the finished shards and the users
+that unfinished shards completed. Samples that failed with retryable errors are scored again, while the samples that
+succeeded are kept: each attempt stores the whole results of its users, including the samples of earlier attempts.
+After the shards have run, their results are merged into the run's results store and reported on as for an
+unsharded run. Calls of attempts that were stopped are missing from the usage breakdown, but not from the usage
+report, which is computed from the results.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import shutil
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from .. import http_pool, usage_ledger, utils
+from ..http_pool import HttpPoolConfig
+from . import results_store, run
+from .analysis import AnalysisResultSet, AnalysisResultUser, CascadeReport
+from .types import RunConfig, User, UserId, UserSet
+
+
+def shard_of(user_id: UserId, num_shards: int) -> int:
+    # Not hash(), which is salted per process.
+    digest = hashlib.sha256(user_id.root.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "little") % num_shards
+
+
+def partition_users(users: UserSet, num_shards: int) -> list[UserSet]:
+    shards: list[dict[UserId, User]] = [{} for _ in range(num_shards)]
+    for user_id, user in users.items():
+        shards[shard_of(user_id, num_shards)][user_id] = user
+    return [UserSet.model_construct(root=shard) for shard in shards]
+
+
+def shard_dir(config: RunConfig, shard: int) -> Path:
+    return config.output_dir / "shards" / str(shard)
+
+
+def attempt_dirs(path: Path) -> list[Path]:
+    return sorted((child for child in path.iterdir() if child.name.isdigit()), key=lambda child: int(child.name))
+
+
+def shard_pool_config(config: HttpPoolConfig, num_shards: int) -> HttpPoolConfig:
+    """Every process has its own pool, so the run's limits are split between the shards."""
+    return config.model_copy(
+        update={
+            "max_connections": max(1, config.max_connections // num_shards),
+            "max_keepalive_connections": config.max_keepalive_connections // num_shards,
+            "max_requests_per_second": config.max_requests_per_second / num_shards
+            if config.max_requests_per_second is not None
+            else None,
+        }
+    )
+
+
+def load_shard_results(path: Path) -> dict[UserId, AnalysisResultUser]:
+    """The users completed by every attempt of a shard so far, each with the attempt that failed fewest samples."""
+    completed: dict[UserId, AnalysisResultUser] = {}
+    for attempt_dir in attempt_dirs(path):
+        if results_store.ResultsReader.exists(attempt_dir / "results"):
+            for user_id, user_result in results_store.ResultsReader(attempt_dir / "results").to_result_set().items():
+                if user_id not in completed or len(user_result.failures) <= len(completed[user_id].failures):
+                    completed[user_id] = user_result
+    return completed
+
+
+def unfinished_users(users: UserSet, completed: dict[UserId, AnalysisResultUser]) -> UserSet:
+    """Users not completed yet, or with samples that failed with errors worth retrying."""
+    return UserSet.model_construct(
+        root={
+            user_id: user
+            for user_id, user in users.items()
+            if user_id not in completed or completed[user_id].retryable_failures()
+        }
+    )
+
+
+def run_shard(config: RunConfig, shard: int, users: UserSet) -> None:
+    """Score the users of a shard that earlier attempts did not complete. Runs in a worker process."""
+    path = shard_dir(config, shard)
+    path.mkdir(parents=True, exist_ok=True)
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"%(asctime)s | %(levelname)-8s | shard {shard} | %(name)s | %(message)s",
+        handlers=[logging.StreamHandler(), logging.FileHandler(path / "info.log")],
+    )
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    completed = load_shard_results(path)
+    remaining = unfinished_users(users, completed)
+    attempt_dir = path / str(len(attempt_dirs(path)))
+    logging.info(f"Scoring {len(remaining)} of {len(users)} users in {attempt_dir}")
+
+    run.set_api_keys(config.secrets_path)
+    http_pool.configure(shard_pool_config(config.http_pool, config.num_shards))
+    ledger = usage_ledger.UsageLedger()
+
+    async def main() -> CascadeReport | None:
+        async with utils.loop_lag_monitor():
+            try:
+                with (
+                    results_store.ResultsWriter(attempt_dir / "results") as writer,
+                    usage_ledger.scope(ledger=ledger),
+                ):
+                    _, cascade_report = await run.generate_results(
+                        config,
+                        remaining,
+                        writer,
+                        # Users with failed samples keep the samples that succeeded, only the failed ones are retried.
+                        previous={user_id: completed[user_id] for user_id in remaining.keys() if user_id in completed},
+                    )
+                return cascade_report
+            finally:
+                logging.info(f"HTTP pool usage: {http_pool.stats()}")
+                await http_pool.aclose()
+
+    cascade_report = asyncio.run(main())
+    ledger.save(attempt_dir / "usage_ledger.npz")
+    if cascade_report is not None:
+        (attempt_dir / "cascade_report.json").write_text(cascade_report.model_dump_json(), encoding="utf-8")
+    unfinished = unfinished_users(users, load_shard_results(path))
+    if unfinished:
+        logging.warning(f"{len(unfinished)} users have retryable failures, run again to retry them")
+    else:
+        (path / "done").touch()
+
+
+def merge_shards(
+    config: RunConfig, users: UserSet
+) -> tuple[AnalysisResultSet, usage_ledger.UsageLedger, CascadeReport | None]:
+    merged: dict[UserId, AnalysisResultUser] = {}
+    ledger = usage_ledger.UsageLedger()
+    cascade_reports = []
+    for shard in range(config.num_shards):
+        path = shard_dir(config, shard)
+        merged.update(load_shard_results(path))
+        for attempt_dir in attempt_dirs(path):
+            if (attempt_dir / "usage_ledger.npz").exists():
+                ledger.extend(usage_ledger.UsageLedger.load(attempt_dir / "usage_ledger.npz"))
+            if (attempt_dir / "cascade_report.json").exists():
+                cascade_reports.append(
+                    CascadeReport.model_validate_json((attempt_dir / "cascade_report.json").read_text(encoding="utf-8"))
+                )
+    result = AnalysisResultSet({user_id: merged[user_id] for user_id in users.keys() if user_id in merged})
+    return result, ledger, CascadeReport.combined(cascade_reports) if cascade_reports else None
+
+
+def run_sharded(config: RunConfig) -> None:
+    users, couple_pairs = run.load_users(config)
+    run.write_prompts(config)
+
+    shards_path = config.output_dir / "shards"
+    shards_path.mkdir(exist_ok=True)
+    layout_path = shards_path / "shards.json"
+    if layout_path.exists() and json.loads(layout_path.read_text())["num_shards"] != config.num_shards:
+        raise ValueError(f"{config.output_dir} was started with another num_shards, so its users are split differently")
+    layout_path.write_text(json.dumps({"num_shards": config.num_shards}))
+
+    shards = partition_users(users, config.num_shards)
+    pending = [shard for shard in range(config.num_shards) if not (shard_dir(config, shard) / "done").exists()]
+    logging.info(
+        f"Running {len(pending)} of {config.num_shards} shards with {[len(shards[shard]) for shard in pending]} users"
+    )
+    time_started = datetime.now()
+    futures: dict[int, Future[None]] = {}
+    # Spawned rather than forked, since the parent may hold locks of logging and HTTP threads.
+    with ProcessPoolExecutor(max_workers=max(1, len(pending)), mp_context=multiprocessing.get_context("spawn")) as pool:
+        for shard in pending:
+            futures[shard] = pool.submit(run_shard, config, shard, shards[shard])
+    failed = []
+    for shard, future in futures.items():
+        error = future.exception()
+        if error is not None:
+            logging.error(f"Shard {shard} failed: {error!r}", exc_info=error)
+            failed.append(shard)
+    if failed:
+        raise ValueError(f"Shards {failed} failed. Run again with hydra.run.dir={config.output_dir} to resume them.")
+    logging.info(f"Ran {len(pending)} shards in {(datetime.now() - time_started).total_seconds():.2f} seconds.")
+
+    result, ledger, cascade_report = merge_shards(config, users)
+    results_path = config.output_dir / "results"
+    # The merged store is rebuilt from the shards every time, e.g. when a finished run is started again.
+    shutil.rmtree(results_path, ignore_errors=True)
+    with results_store.ResultsWriter(results_path) as writer:
+        writer.add_all(result)
+    logging.info(f"Merged the results of {len(result)} users into {results_path}")
+    run.write_reports(config, result, users, couple_pairs, ledger, cascade_report)
@@ -1,25 +1,28 @@
 import json
 import logging
-from typing import Callable
+from typing import TYPE_CHECKING, Callable
 
 import numpy as np
 import tabulate
 from beartype import beartype
 from jaxtyping import Float, UInt, jaxtyped
-from matplotlib import pyplot as plt
-from matplotlib.figure import Figure
 from numpy import ndarray
 from pydantic import BaseModel
 
 from .analysis import AnalysisResultSet
+from .results_store import ResultsReader
 from .types import CouplePairs, RunConfig, UserSet
 
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
 
-def identity_histogram(analysis_results: AnalysisResultSet) -> Figure:
+
+def identity_histogram(analysis_results: AnalysisResultSet) -> "Figure":
     """Create a histogram plot of identity values from analysis results.
 
     Returns a matplotlib figure that can be saved with fig.savefig() or displayed.
     """
+    from matplotlib import pyplot as plt
 
     # Extract all identity values from analysis results
     identity_values = []
@@ -40,6 +43,7 @@ def identity_histogram(analysis_results: AnalysisResultSet) -> Figure:
 
 class CouplesReport(BaseModel):
     mean_individual_stddev: float
+    mean_samples_per_user: float
     average_multipliers: list[float]
     median_distances: list[float]
     all_distances: list[list[float]]
@@ -55,14 +59,25 @@ class CouplesReport(BaseModel):
         identity_values: Float[ndarray, "num_users num_tests"],
         couples_indices: UInt[ndarray, "num_couples 2"],
     ) -> "CouplesReport":
+        """Missing samples are NaN, for users that were sampled fewer than `num_tests` times.
+
+        Per-sample distances compare the i'th samples of users, so missing samples are filled with the user's mean.
+        The median, mean, spread and extremes only use the samples that were drawn.
+        """
         (num_users, num_tests) = identity_values.shape
         (num_couples, _) = couples_indices.shape
 
+        sampled = ~np.isnan(identity_values)
+        assert np.all(sampled.any(axis=1)), "Every user needs at least one sample"
+        user_means = np.nanmean(identity_values, axis=1, keepdims=True)
+        raw_couple_values = np.concatenate(
+            [np.nanmedian(identity_values, axis=1, keepdims=True), user_means, identity_values], axis=1
+        )[couples_indices, :]
         identity_values = np.concatenate(
             [
-                np.median(identity_values, axis=1, keepdims=True),
-                identity_values.mean(axis=1, keepdims=True),
-                identity_values,
+                np.nanmedian(identity_values, axis=1, keepdims=True),
+                user_means,
+                np.where(sampled, identity_values, user_means),
             ],
             axis=1,
         )
@@ -117,20 +132,21 @@ class CouplesReport(BaseModel):
         couple_values = identity_values[couples_indices, :]
         assert couple_values.shape == (num_couples, 2, num_tests + 2), f"{couple_values.shape}"
 
-        mean_value_std = np.mean(np.std(couple_values[:, :, 2:], axis=2)) * 100
+        mean_value_std = np.mean(np.nanstd(raw_couple_values[:, :, 2:], axis=2)) * 100
         mean_multipliers = np.reciprocal(np.mean(user_factors, axis=(0, 1)))
         user_multipliers = np.reciprocal(user_factors)
 
-        min_values = np.min(couple_values, axis=2)
-        median_values = np.median(couple_values, axis=2)
-        max_values = np.max(couple_values, axis=2)
+        min_values = np.nanmin(raw_couple_values, axis=2)
+        median_values = np.nanmedian(raw_couple_values, axis=2)
+        max_values = np.nanmax(raw_couple_values, axis=2)
 
         return CouplesReport(
             mean_individual_stddev=mean_value_std,
+            mean_samples_per_user=float(sampled.sum(axis=1).mean()),
             average_multipliers=mean_multipliers.tolist(),
             median_distances=np.median(couple_dists[:, 2:], axis=1).tolist(),
             all_distances=[d.tolist() for d in couple_dists],
-            user_values=[(v1.tolist(), v2.tolist()) for v1, v2 in couple_values],
+            user_values=[(v1[~np.isnan(v1)].tolist(), v2[~np.isnan(v2)].tolist()) for v1, v2 in raw_couple_values],
             minimum_values=[(m1, m2) for m1, m2 in min_values],
             median_values=[(m1, m2) for m1, m2 in median_values],
             maximum_values=[(m1, m2) for m1, m2 in max_values],
@@ -144,6 +160,7 @@ class CouplesReport(BaseModel):
 
     def report(self, couples_id_list: list[str]) -> str:
         couples_report = f"Mean individual stddev: {self.mean_individual_stddev:.4f}\n"
+        couples_report += f"Mean samples per user: {self.mean_samples_per_user:.2f}\n"
         couples_report += (
             f"Average multipliers: {CouplesReport.format_values(self.average_multipliers, lambda x: f'{x:3.2f}')}\n"
         )
@@ -197,18 +214,17 @@ class CouplesReport(BaseModel):
         return couples_report
 
 
-def analyze(analysis_results: AnalysisResultSet, users: UserSet, couple_pairs: CouplePairs, config: RunConfig) -> None:
-    """Compute and log statistics from the analysis results."""
+def analyze(results: ResultsReader, users: UserSet, couple_pairs: CouplePairs, config: RunConfig) -> None:
+    """Compute and log statistics from the results store of the run."""
 
     user_id_list = [
         (user_id, f"{users[user_id].response.first_name} {users[user_id].response.last_name}")
         for user_id in users.keys()
     ]
 
-    identity_values = np.array(
-        [[r.profile.identity for r in analysis_results[user_id].analysis_results] for user_id, _ in user_id_list]
-    )
-    assert identity_values.shape == (len(user_id_list), config.num_tests), f"{identity_values.shape}"
+    # Adaptive sampling gives users different numbers of samples, so rows are padded with NaN.
+    identity_values = results.identity_matrix([user_id for user_id, _ in user_id_list])
+    assert identity_values.shape[1] <= config.num_tests, f"{identity_values.shape}"
 
     user_id_to_index = {user_id: i for i, (user_id, _) in enumerate(user_id_list)}
 
@@ -0,0 +1,135 @@
+"""Run a sweep over experiment configs concurrently in one process.
+
+    python -m eeva.experiment.sweep --config-name=example model=gpt-5-nano:openai,gpt-5:openai explicit_cot=true,false
+
+Overrides take the same sweep syntax as hydra's `--multirun`, and every combination runs as its own job with its own
+output directory, which `reanalyze` reads like any other run. Unlike hydra's basic launcher, the jobs run at the
+same time and share the HTTP pool, so `http_max_connections` and `http_max_requests_per_second` limit the sweep as a
+whole, and data snapshots are loaded once for all jobs that use them.
+"""
+
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import typing
+from datetime import datetime
+from pathlib import Path
+
+import hydra
+from hydra.core.override_parser.overrides_parser import OverridesParser
+from omegaconf import DictConfig, OmegaConf
+
+from .. import http_pool, utils
+from . import run
+from .__main__ import ROOT_PATH, Config, to_run_config
+from .answer_index import AnswerIndex
+from .types import BaseData, RunConfig
+
+
+def expand_overrides(overrides: list[str]) -> list[list[str]]:
+    """The override list of every job in the sweep, one per combination of the swept values."""
+    choices = []
+    for override in OverridesParser.create().parse_overrides(overrides):
+        if override.is_sweep_override():
+            if not override.is_discrete_sweep():
+                raise ValueError(f"Only lists of values can be swept over, not {override.input_line}")
+            key = override.get_key_element()
+            choices.append([f"{key}={value}" for value in override.sweep_string_iterator()])
+        else:
+            # Only overrides made in code lack their input line.
+            assert override.input_line is not None
+            choices.append([override.input_line])
+    return [list(job) for job in itertools.product(*choices)]
+
+
+def shared_setting(configs: list[RunConfig], setting: typing.Callable[[RunConfig], object], name: str) -> None:
+    if any(setting(config) != setting(configs[0]) for config in configs[1:]):
+        raise ValueError(f"All jobs in a sweep share {name}, so it cannot be swept over")
+
+
+async def run_jobs(configs: list[RunConfig]) -> None:
+    base_data: dict[Path, tuple[BaseData, AnswerIndex]] = {}
+    jobs = []
+    for config in configs:
+        if config.data_dir not in base_data:
+            base_data[config.data_dir] = run.load_base_data(config.data_dir)
+        users, couple_pairs = run.load_users(config, base_data[config.data_dir])
+        jobs.append(run.run_loaded(config, users, couple_pairs))
+
+    async with utils.loop_lag_monitor():
+        try:
+            outcomes = await asyncio.gather(*jobs, return_exceptions=True)
+        finally:
+            logging.info(f"HTTP pool usage: {http_pool.stats()}")
+            await http_pool.aclose()
+
+    failed = []
+    for config, outcome in zip(configs, outcomes, strict=True):
+        if outcome is None:
+            logging.info(f"Job {config.output_dir} finished")
+        else:
+            logging.error(f"Job {config.output_dir} failed: {outcome!r}", exc_info=outcome)
+            failed.append(config.output_dir)
+    if failed:
+        raise ValueError(f"{len(failed)} of {len(configs)} jobs failed: {[str(path) for path in failed]}")
+
+
+def sweep(config_name: str, overrides: list[str], output_dir: Path) -> list[RunConfig]:
+    jobs = expand_overrides(overrides)
+    os.chdir(ROOT_PATH)
+    configs = []
+    with hydra.initialize_config_dir(config_dir=str(ROOT_PATH / "config"), version_base=None):
+        for i, job_overrides in enumerate(jobs):
+            composed = hydra.compose(config_name=config_name, overrides=job_overrides)
+            merged = OmegaConf.merge(OmegaConf.structured(Config), composed)
+            assert isinstance(merged, DictConfig)
+            cfg = typing.cast(Config, merged)
+            if cfg.profile:
+                raise ValueError("Jobs in a sweep cannot be profiled one at a time, profile the sweep instead")
+            if cfg.num_shards > 1:
+                raise ValueError("Jobs in a sweep share one process, so they cannot be sharded")
+            job_dir = output_dir / str(i)
+            (job_dir / ".hydra").mkdir(parents=True)
+            # Saved as composed, like hydra does, since the structured config holds paths that YAML cannot load.
+            OmegaConf.save(composed, job_dir / ".hydra" / "config.yaml")
+            OmegaConf.save(OmegaConf.create(job_overrides), job_dir / ".hydra" / "overrides.yaml")
+            configs.append(to_run_config(cfg, job_dir))
+            logging.info(f"Job {i}: {' '.join(job_overrides)}")
+
+    shared_setting(configs, lambda config: config.secrets_path, "secrets_path")
+    shared_setting(configs, lambda config: config.http_pool, "the http_* settings")
+    run.set_api_keys(configs[0].secrets_path)
+    http_pool.configure(configs[0].http_pool)
+    logging.info(f"Running {len(configs)} jobs in {output_dir}")
+    asyncio.run(run_jobs(configs))
+    return configs
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run every combination of the swept config values concurrently")
+    parser.add_argument("--config-name", default="default", help="Config in the config directory to start from")
+    parser.add_argument(
+        "overrides", nargs="*", metavar="KEY=VALUE[,VALUE...]", help="Override a config value, or sweep over values"
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        default=ROOT_PATH / "output" / "sweep" / datetime.now().strftime("%Y-%m-%d/%H-%M-%S"),
+    )
+    args = parser.parse_args()
+    output_dir = args.output_dir.resolve()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)-8s | %(name)s | %(message)s",
+        handlers=[logging.StreamHandler(), logging.FileHandler(output_dir / "info.log")],
+    )
+    # Every request is logged at INFO level, which drowns out the jobs' progress.
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    sweep(args.config_name, args.overrides, output_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,10 @@ from typing import Annotated
 
 from pydantic import BaseModel, ConfigDict, Field, RootModel
 
+from ..http_pool import HttpPoolConfig
+from ..models import CascadeConfig, ModelSpecifier
 from ..utils import ID_PATTERN
+from .faults import RetryPolicies
 
 
 class Profile(BaseModel):
@@ -33,6 +36,10 @@ class UserId(RootModel):
     model_config = ConfigDict(frozen=True)
     root: str = Field(pattern=ID_PATTERN)
 
+    def __hash__(self) -> int:
+        # User IDs key most dicts in a run, and the generated hash of frozen models is much slower.
+        return hash(self.root)
+
 
 LanguageCode = Annotated[str, Field(min_length=2, max_length=5)]
 
@@ -43,6 +50,20 @@ class User(BaseModel):
     language_code: LanguageCode = Field()
     hidden: bool = Field()
 
+    def with_responses(self, responses: dict[str, QuestionResponse]) -> "User":
+        """A copy of the user with only `responses`.
+
+        Cheaper than nested `model_copy`, as pydantic only checks the types of parts that are already models.
+        """
+        return User(
+            response=Response(
+                first_name=self.response.first_name, last_name=self.response.last_name, responses=responses
+            ),
+            prod_profile=self.prod_profile,
+            language_code=self.language_code,
+            hidden=self.hidden,
+        )
+
 
 class UserSet(RootModel):
     root: dict[UserId, User]
@@ -118,6 +139,16 @@ class BaseData(BaseModel):
     questions: QuestionSet = Field()
 
 
+class AdaptiveSampling(BaseModel):
+    min_samples: int = Field(default=3, ge=2, description="Samples drawn for every user before checking convergence")
+    max_samples: int = Field(gt=0)
+    round_size: int = Field(default=1, gt=0, description="Samples drawn per round for users that have not converged")
+    ci_width: float = Field(
+        default=0.05, gt=0, description="Stop sampling a user once the confidence interval of their mean is narrower"
+    )
+    confidence: float = Field(default=0.95, gt=0, lt=1)
+
+
 class RunConfig(BaseModel):
     secrets_path: Path = Field()
     data_dir: Path = Field()
@@ -130,10 +161,17 @@ class RunConfig(BaseModel):
     identity_extraction_prompt: str = Field()
     explicit_cot: bool = Field()
     two_step_analysis: bool = Field()
+    local_extraction: bool = Field(default=False)
+    extraction_model: ModelSpecifier | None = Field(default=None)
     system_prompt: str | None = Field()
     user_prompt: str = Field()
 
     num_tests: int = Field(gt=0)
+    multi_sample: bool = Field(default=False)
+    cache_aware: bool = Field(default=False)
+    adaptive_sampling: AdaptiveSampling | None = Field(
+        default=None, description="Sample users until their scores converge, with `num_tests` as the maximum"
+    )
 
     question_exclusion_sets: set[str] = Field()
     question_inclusion_sets: set[str] | None = Field()
@@ -143,3 +181,21 @@ class RunConfig(BaseModel):
     only_couples: bool = Field()
     answer_progress_minimum: float = Field(ge=0)
     num_answers_minimum: int = Field(ge=1)
+
+    cascade: CascadeConfig | None = Field(default=None, description="Escalate uncertain users to larger models")
+    answer_cache_path: Path | None = Field(
+        default=None, description="Score answers one at a time and cache their scores here for other question sets"
+    )
+
+    retry_policies: RetryPolicies = Field(default_factory=RetryPolicies, description="Retries of failed calls")
+    retry_passes: int = Field(
+        default=1, ge=0, description="Follow-up passes that retry failed samples after every user has been tried"
+    )
+
+    num_shards: int = Field(
+        default=1, ge=1, description="Worker processes the users are split between, see `eeva.experiment.shards`"
+    )
+    http_pool: HttpPoolConfig = Field(default_factory=HttpPoolConfig)
+    export_analysis_json: bool = Field(
+        default=False, description="Also write the results as analysis.json, next to the results store"
+    )
@@ -0,0 +1,187 @@
+import asyncio
+import importlib.util
+import logging
+import os
+import threading
+import time
+
+import httpx
+from pydantic import BaseModel, Field
+
+# Same timeouts the provider SDKs use for their own default clients.
+TIMEOUT = httpx.Timeout(600.0, connect=5.0)
+
+
+class HttpPoolConfig(BaseModel):
+    max_connections: int = Field(default=1000, gt=0, description="Maximum open connections per provider")
+    max_keepalive_connections: int = Field(default=100, ge=0, description="Idle connections kept open per provider")
+    keepalive_expiry: float = Field(default=30.0, ge=0, description="Seconds an idle connection is kept open")
+    http2: bool = Field(default=False, description="Multiplex requests over HTTP/2. Requires the h2 package.")
+    max_requests_per_second: float | None = Field(
+        default=None, gt=0, description="Requests started per second per provider, or None for no limit"
+    )
+
+    @staticmethod
+    def from_env() -> "HttpPoolConfig":
+        defaults = HttpPoolConfig()
+        return HttpPoolConfig(
+            max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", defaults.max_connections)),
+            max_keepalive_connections=int(
+                os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", defaults.max_keepalive_connections)
+            ),
+            keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", defaults.keepalive_expiry)),
+            http2=os.getenv("HTTP2", "1" if defaults.http2 else "0") == "1",
+            max_requests_per_second=float(os.environ["HTTP_MAX_REQUESTS_PER_SECOND"])
+            if os.getenv("HTTP_MAX_REQUESTS_PER_SECOND")
+            else None,
+        )
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+
+class PoolStats(BaseModel):
+    requests: int = Field(description="Requests sent since the client was created")
+    in_flight: int = Field(description="Requests waiting for a connection or whose response has not been fully read")
+    peak_in_flight: int = Field()
+    connections: int = Field(description="Open connections in the pool")
+    idle_connections: int = Field()
+    max_connections: int = Field()
+    rate_limit_wait: float = Field(description="Seconds requests spent waiting for the rate limit, summed")
+
+
+class _CountedStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, transport: "_CountingTransport") -> None:
+        self._stream = stream
+        self._transport = transport
+        self._closed = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._transport.in_flight -= 1
+        await self._stream.aclose()
+
+
+class _CountingTransport(httpx.AsyncBaseTransport):
+    """Async transport that tracks request concurrency and paces requests on top of the pooled httpx transport."""
+
+    def __init__(self, config: HttpPoolConfig) -> None:
+        self._transport = httpx.AsyncHTTPTransport(limits=config.limits(), http2=config.http2)
+        self._max_connections = config.max_connections
+        self._interval = 1 / config.max_requests_per_second if config.max_requests_per_second is not None else None
+        self._next_start = 0.0
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.rate_limit_wait = 0.0
+
+    async def _wait_for_rate_limit(self) -> None:
+        if self._interval is None:
+            return
+        # Each request reserves the next free start time, so waiting requests start in order, `_interval` apart.
+        now = time.monotonic()
+        start = max(now, self._next_start)
+        self._next_start = start + self._interval
+        if start > now:
+            self.rate_limit_wait += start - now
+            await asyncio.sleep(start - now)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await self._wait_for_rate_limit()
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            self.in_flight -= 1
+            raise
+        assert isinstance(response.stream, httpx.AsyncByteStream)
+        response.stream = _CountedStream(response.stream, self)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+    def stats(self) -> PoolStats:
+        # `_pool` is the underlying httpcore connection pool, whose `connections` property is public.
+        connections = self._transport._pool.connections
+        return PoolStats(
+            requests=self.requests,
+            in_flight=self.in_flight,
+            peak_in_flight=self.peak_in_flight,
+            connections=len(connections),
+            idle_connections=sum(1 for connection in connections if connection.is_idle()),
+            max_connections=self._max_connections,
+            rate_limit_wait=self.rate_limit_wait,
+        )
+
+
+def _supported(config: HttpPoolConfig) -> HttpPoolConfig:
+    if config.http2 and importlib.util.find_spec("h2") is None:
+        logging.warning("HTTP/2 requested but the h2 package is not installed. Falling back to HTTP/1.1.")
+        return config.model_copy(update={"http2": False})
+    return config
+
+
+_lock = threading.Lock()
+_config = _supported(HttpPoolConfig.from_env())
+_async_clients: dict[str, httpx.AsyncClient] = {}
+_sync_clients: dict[str, httpx.Client] = {}
+
+
+def configure(config: HttpPoolConfig) -> None:
+    """Set the pool settings used for clients created from now on.
+
+    Call this before constructing any chat model, since existing clients keep their settings.
+    """
+    global _config
+    config = _supported(config)
+    with _lock:
+        if _async_clients or _sync_clients:
+            logging.warning(f"HTTP pool reconfigured after clients were created for {sorted(_async_clients)}")
+        _config = config
+
+
+def async_client(provider: str) -> httpx.AsyncClient:
+    """The process-wide async HTTP client for `provider`, shared by every chat model for that provider."""
+    with _lock:
+        if provider not in _async_clients:
+            logging.info(f"Creating shared HTTP pool for {provider} with {_config}")
+            _async_clients[provider] = httpx.AsyncClient(transport=_CountingTransport(_config), timeout=TIMEOUT)
+        return _async_clients[provider]
+
+
+def sync_client(provider: str) -> httpx.Client:
+    with _lock:
+        if provider not in _sync_clients:
+            _sync_clients[provider] = httpx.Client(limits=_config.limits(), http2=_config.http2, timeout=TIMEOUT)
+        return _sync_clients[provider]
+
+
+def stats() -> dict[str, PoolStats]:
+    """Utilization of the async pool of each provider."""
+    with _lock:
+        clients = dict(_async_clients)
+    return {provider: client._transport.stats() for provider, client in clients.items()}  # type: ignore[attr-defined]
+
+
+async def aclose() -> None:
+    with _lock:
+        async_clients = list(_async_clients.values())
+        sync_clients = list(_sync_clients.values())
+        _async_clients.clear()
+        _sync_clients.clear()
+    for client in async_clients:
+        await client.aclose()
+    for sync_client in sync_clients:
+        sync_client.close()
@@ -1,10 +1,18 @@
+import asyncio
+import functools
+import logging
+import os
+import threading
 import typing
 from typing import Any, Type, TypeVar
 
-from langchain import chat_models
-from langchain.chat_models.base import BaseChatModel
-from langchain_core.language_models import LanguageModelInput
-from pydantic import BaseModel, Field
+import httpx
+from langchain_core.language_models import BaseChatModel, LanguageModelInput
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import LLMResult
+from pydantic import BaseModel, Field, create_model
+
+from . import http_pool, tracing, usage_ledger
 
 
 class ModelPricingInfo(BaseModel):
@@ -32,10 +40,81 @@ class ModelSpecifier(BaseModel):
     provider: str = Field()
 
     def init_chat_model(self, **kwargs) -> BaseChatModel:
+        # Imported here since `langchain.chat_models` is slow to import and the provider SDKs it loads are slower.
+        from langchain import chat_models
+
+        if self.provider == "openai":
+            kwargs.setdefault("http_client", http_pool.sync_client(self.provider))
+            kwargs.setdefault("http_async_client", http_pool.async_client(self.provider))
         if self.provider == "anthropic":
             if "reasoning_effort" in kwargs:
                 del kwargs["reasoning_effort"]
-        return chat_models.init_chat_model(self.name, model_provider=self.provider, **kwargs)
+        llm = chat_models.init_chat_model(self.name, model_provider=self.provider, **kwargs)
+        if self.provider == "anthropic":
+            _use_shared_anthropic_clients(llm)
+        return llm
+
+
+def _use_shared_anthropic_clients(llm: BaseChatModel) -> None:
+    # ChatAnthropic has no constructor argument for HTTP clients, unlike ChatOpenAI, but builds its SDK clients in
+    # cached properties, which use a value already in the instance dict. That is checked rather than assumed, so an
+    # SDK that changes it falls back to its own clients with a warning.
+    import anthropic
+
+    cls = type(llm)
+    if not all(
+        isinstance(getattr(cls, name, None), functools.cached_property)
+        for name in ("_client_params", "_client", "_async_client")
+    ):
+        logging.warning(f"{cls.__name__} builds its clients differently than expected, not using the shared HTTP pool")
+        return
+    # The pool's clients are httpx clients, but anthropic 1.x is built on httpx2 and rejects them.
+    if not issubclass(anthropic.DefaultHttpxClient, httpx.Client):
+        logging.warning(f"anthropic {anthropic.__version__} is not built on httpx, not using the shared HTTP pool")
+        return
+    params = llm._client_params  # type: ignore[attr-defined]
+    # Checked above: the SDK takes httpx clients, even where its stubs name the httpx2 ones.
+    vars(llm)["_client"] = anthropic.Client(
+        **params,
+        http_client=http_pool.sync_client("anthropic"),  # type: ignore[arg-type]
+    )
+    vars(llm)["_async_client"] = anthropic.AsyncClient(
+        **params,
+        http_client=http_pool.async_client("anthropic"),  # type: ignore[arg-type]
+    )
+
+
+class LazyChatModel:
+    """Chat model constructed on first use, keeping provider SDK imports and client setup off the startup path."""
+
+    def __init__(self, specifier: ModelSpecifier, **kwargs) -> None:
+        self.specifier = specifier
+        self._kwargs = kwargs
+        self._lock = threading.Lock()
+        self._llm: BaseChatModel | None = None
+
+    async def get(self) -> BaseChatModel:
+        """The model, constructed in a worker thread on first use so the SDK imports do not block the event loop."""
+        if self._llm is None:
+            return await asyncio.to_thread(self._construct)
+        return self._llm
+
+    def _construct(self) -> BaseChatModel:
+        with self._lock:
+            if self._llm is None:
+                self._llm = self.specifier.init_chat_model(**self._kwargs)
+            return self._llm
+
+    async def warm_up(self) -> None:
+        """Construct the model and open a connection to the provider."""
+        llm = await self.get()
+        try:
+            if self.specifier.provider == "openai":
+                await llm.root_async_client.models.list()  # type: ignore[attr-defined]
+            elif self.specifier.provider == "anthropic":
+                await llm._async_client.models.list()  # type: ignore[attr-defined]
+        except Exception as e:
+            logging.warning(f"Failed to warm up connection to {self.specifier.provider}: {e}")
 
 
 model_pricing: dict[ModelSpecifier, ModelPricingInfo] = {
@@ -57,8 +136,42 @@ model_pricing: dict[ModelSpecifier, ModelPricingInfo] = {
 }
 
 
+class CascadeConfig(BaseModel):
+    models: list[ModelSpecifier] = Field(min_length=1, description="Models to try, cheapest first")
+    max_stddev: float = Field(
+        default=0.05, ge=0, description="Escalate to the next model when the identity samples disagree more than this"
+    )
+    samples: int = Field(default=2, ge=2, description="Samples per model in the server. Experiments use `num_tests`.")
+
+    @staticmethod
+    def parse_models(models: list[str]) -> list[ModelSpecifier]:
+        """Parse "name:provider" strings as used in the experiment config."""
+        specifiers = []
+        for model in models:
+            [name, provider] = model.split(":")
+            specifiers.append(ModelSpecifier(name=name, provider=provider))
+        return specifiers
+
+    @staticmethod
+    def from_env() -> "CascadeConfig | None":
+        """Read the cascade from `CASCADE_MODELS`, a comma separated list of "name:provider" strings."""
+        models = os.getenv("CASCADE_MODELS")
+        if not models:
+            return None
+        return CascadeConfig(
+            models=CascadeConfig.parse_models(models.split(",")),
+            max_stddev=float(os.getenv("CASCADE_MAX_STDDEV", "0.05")),
+            samples=int(os.getenv("CASCADE_SAMPLES", "2")),
+        )
+
+
+# Bumped when UsageData counts tokens differently, so that runs counted differently are not merged. In version 2, the
+# input tokens of OpenAI calls no longer include cached tokens, and those of Anthropic calls include cache writes.
+USAGE_VERSION = 2
+
+
 class UsageData(BaseModel):
-    input_tokens: int = Field(ge=0)
+    input_tokens: int = Field(ge=0, description="Number of input tokens not served from cache")
     cached_input_tokens: int = Field(ge=0, description="Number of input tokens served from cache")
     output_tokens: int = Field(ge=0)
     reasoning_tokens: int = Field(ge=0)
@@ -66,12 +179,14 @@ class UsageData(BaseModel):
     @staticmethod
     def from_raw(raw: dict[str, Any], model_specifier: ModelSpecifier) -> "UsageData":
         if model_specifier.provider == "openai":
-            input_tokens = raw["token_usage"]["prompt_tokens"]
+            # OpenAI counts cached tokens as part of the prompt tokens
             cached_input_tokens = raw["token_usage"]["prompt_tokens_details"]["cached_tokens"]
+            input_tokens = raw["token_usage"]["prompt_tokens"] - cached_input_tokens
             output_tokens = raw["token_usage"]["completion_tokens"]
             reasoning_tokens = raw["token_usage"]["completion_tokens_details"]["reasoning_tokens"]
         elif model_specifier.provider == "anthropic":
-            input_tokens = raw["usage"]["input_tokens"]
+            # Tokens written to the cache are billed at slightly above the input price, which is ignored here
+            input_tokens = raw["usage"]["input_tokens"] + (raw["usage"].get("cache_creation_input_tokens") or 0)
             cached_input_tokens = raw["usage"]["cache_read_input_tokens"]
             output_tokens = raw["usage"]["output_tokens"]
             reasoning_tokens = 0
@@ -84,9 +199,37 @@ class UsageData(BaseModel):
             reasoning_tokens=reasoning_tokens,
         )
 
+    @staticmethod
+    def from_llm_output(result: LLMResult, model_specifier: ModelSpecifier) -> "UsageData":
+        """Usage of a whole `agenerate` call, which with `n` is only reported for the call and not per generation."""
+        if result.llm_output is None:
+            raise ValueError(f"No usage reported for call to {model_specifier.name}")
+        return UsageData.from_raw(result.llm_output, model_specifier)
+
     def calculate_cost(self, pricing_info: ModelPricingInfo) -> float:
         return pricing_info.calculate(self.input_tokens, self.cached_input_tokens, self.output_tokens)
 
+    def split(self, n: int) -> list["UsageData"]:
+        """Apportion usage of one call evenly over `n` results, such that the parts sum to the whole."""
+
+        def parts(total: int) -> list[int]:
+            return [total // n + (1 if i < total % n else 0) for i in range(n)]
+
+        return [
+            UsageData(input_tokens=i, cached_input_tokens=c, output_tokens=o, reasoning_tokens=r)
+            for i, c, o, r in zip(
+                parts(self.input_tokens),
+                parts(self.cached_input_tokens),
+                parts(self.output_tokens),
+                parts(self.reasoning_tokens),
+                strict=True,
+            )
+        ]
+
+    def cache_hit_ratio(self) -> float:
+        total_input_tokens = self.input_tokens + self.cached_input_tokens
+        return self.cached_input_tokens / total_input_tokens if total_input_tokens > 0 else 0.0
+
     def combine(self, other: "UsageData") -> "UsageData":
         return UsageData(
             input_tokens=self.input_tokens + other.input_tokens,
@@ -99,6 +242,26 @@ class UsageData(BaseModel):
 R = TypeVar("R", bound=BaseModel)
 
 
+def mark_cache_prefix(messages: list[BaseMessage], provider: str) -> list[BaseMessage]:
+    """Mark the leading system message as the end of the stable prompt prefix.
+
+    OpenAI caches prompt prefixes automatically, but Anthropic only caches up to explicit `cache_control` breakpoints.
+    Since tool schemas come before the system prompt, the breakpoint also covers the structured output schema.
+    """
+    if provider != "anthropic" or not messages or not isinstance(messages[0], SystemMessage):
+        return messages
+    system_message = messages[0]
+    if isinstance(system_message.content, str):
+        blocks: list[str | dict] = [{"type": "text", "text": system_message.content}]
+    else:
+        blocks = list(system_message.content)
+    last_block = blocks[-1]
+    if isinstance(last_block, str):
+        last_block = {"type": "text", "text": last_block}
+    blocks[-1] = {**last_block, "cache_control": {"type": "ephemeral"}}
+    return [SystemMessage(content=blocks), *messages[1:]]
+
+
 class Model(BaseModel):
     specifier: ModelSpecifier = Field()
     llm: BaseChatModel = Field()
@@ -114,20 +277,88 @@ class Model(BaseModel):
         else:
             raise ValueError(f"No pricing info for model specifier: {self.specifier}")
 
+    def _trace_usage(self, usage: UsageData) -> None:
+        tracing.set_attributes(**usage.model_dump(), cache_hit=usage.cached_input_tokens > 0)
+        usage_ledger.record(self.specifier, usage)
+
     async def get_structured_output(self, input: LanguageModelInput, output_type: Type[R]) -> tuple[R, UsageData]:
-        str_llm = self.llm.with_structured_output(output_type, include_raw=True)
-        message = typing.cast(dict[str, Any], await str_llm.ainvoke(input))
-        parsed: R = message["parsed"]
-        raw_metadata = message["raw"].response_metadata
-        metadata = UsageData.from_raw(raw_metadata, self.specifier)
-        return parsed, metadata
+        with tracing.span("llm.structured_output", model=self.specifier.name, provider=self.specifier.provider):
+            with tracing.span("llm.structured_output_setup"):
+                str_llm = self.llm.with_structured_output(output_type, include_raw=True)
+            with tracing.span("llm.call"):
+                message = typing.cast(dict[str, Any], await str_llm.ainvoke(input))
+            raw_metadata = message["raw"].response_metadata
+            metadata = UsageData.from_raw(raw_metadata, self.specifier)
+            # An output that does not parse was still paid for.
+            self._trace_usage(metadata)
+            if message["parsing_error"] is not None:
+                raise message["parsing_error"]
+            parsed: R = message["parsed"]
+            return parsed, metadata
 
     async def get_unstructured_output(self, input: LanguageModelInput) -> tuple[str, UsageData]:
-        response = await self.llm.ainvoke(input)
-        if isinstance(response.content, str):
-            content = response.content
-        else:
-            raise ValueError(f"Unexpected response content type: {type(response.content)}. Expected str.")
-        raw_metadata = response.response_metadata
-        metadata = UsageData.from_raw(raw_metadata, self.specifier)
-        return content, metadata
+        with tracing.span("llm.unstructured_output", model=self.specifier.name, provider=self.specifier.provider):
+            with tracing.span("llm.call"):
+                response = await self.llm.ainvoke(input)
+            if isinstance(response.content, str):
+                content = response.content
+            else:
+                raise ValueError(f"Unexpected response content type: {type(response.content)}. Expected str.")
+            raw_metadata = response.response_metadata
+            metadata = UsageData.from_raw(raw_metadata, self.specifier)
+            self._trace_usage(metadata)
+            return content, metadata
+
+    def supports_n(self) -> bool:
+        """Whether the provider can return several independent completions for one request."""
+        return self.specifier.provider == "openai"
+
+    async def get_structured_outputs(
+        self, messages: list[BaseMessage], output_type: Type[R], n: int
+    ) -> tuple[list[R], UsageData]:
+        """Get `n` samples from a single call, paying for the input once.
+
+        Uses the `n` parameter where the provider supports it, so the samples are independent completions.
+        Otherwise the model is asked for a list of `n` outputs in one response, which are not fully independent since
+        later items can see the earlier ones.
+        """
+        with tracing.span(
+            "llm.structured_outputs", model=self.specifier.name, provider=self.specifier.provider, n=n
+        ) as call_span:
+            if self.supports_n():
+                with tracing.span("llm.call"):
+                    result = await self.llm.agenerate([messages], n=n, response_format=output_type)
+                generations = result.generations[0]
+                metadata = UsageData.from_llm_output(result, self.specifier)
+                self._trace_usage(metadata)
+                outputs = [output_type.model_validate_json(generation.text) for generation in generations]
+            else:
+                list_type = create_model(
+                    f"{output_type.__name__}Samples",
+                    __doc__=f"{n} independent answers to the request.",
+                    samples=(list[output_type], Field(min_length=n, max_length=n)),  # type: ignore[valid-type]
+                )
+                instruction = HumanMessage(
+                    content=f"Answer the request above {n} times independently, as if each answer were the only one. "
+                    "Return the answers as a list."
+                )
+                samples, metadata = await self.get_structured_output([*messages, instruction], list_type)
+                outputs = samples.samples  # type: ignore[attr-defined]
+            call_span.attributes["samples"] = len(outputs)
+            return outputs, metadata
+
+    async def get_unstructured_outputs(self, messages: list[BaseMessage], n: int) -> tuple[list[str], UsageData]:
+        """Get `n` free text samples, in one call where the provider supports `n` and in separate calls otherwise."""
+        if not self.supports_n():
+            results = await asyncio.gather(*(self.get_unstructured_output(messages) for _ in range(n)))
+            usage = results[0][1]
+            for _, other in results[1:]:
+                usage = usage.combine(other)
+            return [content for content, _ in results], usage
+        with tracing.span("llm.unstructured_outputs", model=self.specifier.name, provider=self.specifier.provider, n=n):
+            with tracing.span("llm.call"):
+                result = await self.llm.agenerate([messages], n=n)
+            generations = result.generations[0]
+            metadata = UsageData.from_llm_output(result, self.specifier)
+            self._trace_usage(metadata)
+            return [generation.text for generation in generations], metadata
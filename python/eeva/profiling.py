@@ -0,0 +1,117 @@
+import contextlib
+import cProfile
+import io
+import logging
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from types import FrameType
+from typing import Any, Iterator
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+Frame = tuple[str, str, int]
+
+
+def _frame_key(frame: FrameType) -> Frame:
+    code = frame.f_code
+    return (code.co_qualname, code.co_filename, frame.f_lineno)
+
+
+class SamplingProfiler:
+    """Statistical profiler that samples one thread's stack from a background thread.
+
+    In the server the sampled thread runs the event loop, so samples include whatever else the loop was doing
+    while the profiled request was in flight.
+    """
+
+    def __init__(self, thread_id: int | None = None, interval: float = 0.001) -> None:
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.samples: list[tuple[Frame, ...]] = []
+        # Seconds since the previous sample. Under GIL contention samples arrive later than `interval`.
+        self.weights: list[float] = []
+        self.duration = 0.0
+        self._started = 0.0
+        self._stopped = threading.Event()
+        self._sampler: threading.Thread | None = None
+
+    def _sample(self) -> None:
+        previous = time.perf_counter()
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_key(frame))
+                frame = frame.f_back
+            now = time.perf_counter()
+            self.samples.append(tuple(reversed(stack)))
+            self.weights.append(now - previous)
+            previous = now
+
+    def start(self) -> None:
+        self._started = time.perf_counter()
+        self._sampler = threading.Thread(target=self._sample, name="eeva-sampling-profiler", daemon=True)
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        self.duration = time.perf_counter() - self._started
+
+    def top_functions(self, limit: int = 20) -> list[tuple[str, int, int]]:
+        """Return (function, self samples, total samples) for the functions with the most self samples."""
+        own: Counter[str] = Counter()
+        total: Counter[str] = Counter()
+        for stack in self.samples:
+            if not stack:
+                continue
+            own[stack[-1][0]] += 1
+            total.update({name for name, _, _ in stack})
+        return [(name, count, total[name]) for name, count in own.most_common(limit)]
+
+    def summary(self, limit: int = 20) -> str:
+        lines = [f"{len(self.samples)} samples over {self.duration:.3f}s", "   self  total  function"]
+        lines += [f"{own:7d} {total:6d}  {name}" for name, own, total in self.top_functions(limit)]
+        return "\n".join(lines)
+
+    def to_speedscope(self, name: str) -> dict[str, Any]:
+        frame_indices: dict[Frame, int] = {}
+        samples = [[frame_indices.setdefault(frame, len(frame_indices)) for frame in stack] for stack in self.samples]
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": name,
+            "exporter": "eeva",
+            "shared": {"frames": [{"name": n, "file": f, "line": line} for n, f, line in frame_indices]},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(self.weights),
+                    "samples": samples,
+                    "weights": self.weights,
+                }
+            ],
+        }
+
+
+@contextlib.contextmanager
+def profile_run(output_dir: Path, name: str = "profile", limit: int = 30) -> Iterator[None]:
+    """Profile a whole run with cProfile, writing `{name}.pstats` to `output_dir` and logging the top functions."""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profile_path = output_dir / f"{name}.pstats"
+        profiler.dump_stats(profile_path)
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+        logging.info(f"Wrote profile to {profile_path}. Top functions by cumulative time:\n{summary.getvalue()}")
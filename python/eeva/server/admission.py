@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+from fastapi import APIRouter, FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
+
+
+class AdmissionConfig(BaseModel):
+    max_in_flight: int = Field(default=40, gt=0, description="Concurrent requests per endpoint")
+    max_queue: int = Field(default=20, ge=0, description="Requests per endpoint allowed to wait for a slot")
+    queue_timeout: float = Field(default=5.0, ge=0, description="Seconds a request may wait for a slot")
+    retry_after: int = Field(default=2, ge=0, description="Retry-After value in seconds sent with a 503")
+
+
+class EndpointMetrics(BaseModel):
+    in_flight: int = Field()
+    queued: int = Field()
+    admitted: int = Field()
+    rejected_queue_full: int = Field()
+    rejected_timeout: int = Field()
+    mean_wait: float = Field(description="Mean queue wait in seconds over admitted requests")
+    max_wait: float = Field(description="Longest queue wait in seconds over admitted requests")
+    saturated: bool = Field(description="All slots taken and the wait queue is full")
+
+
+class EndpointLimiter:
+    def __init__(self, config: AdmissionConfig) -> None:
+        self.config = config
+        self._semaphore = asyncio.Semaphore(config.max_in_flight)
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def saturated(self) -> bool:
+        return self.in_flight >= self.config.max_in_flight and self.queued >= self.config.max_queue
+
+    async def acquire(self) -> bool:
+        """Wait for a slot, returning False if the request should be shed instead."""
+        # The semaphore stays locked from a release until the woken waiter takes the slot, so requests arriving in
+        # between queue behind it instead of waiting for the slot uncounted.
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            self._admit(0.0)
+            return True
+        if self.queued >= self.config.max_queue:
+            self.rejected_queue_full += 1
+            return False
+        self.queued += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.config.queue_timeout)
+        except TimeoutError:
+            self.rejected_timeout += 1
+            return False
+        finally:
+            self.queued -= 1
+        self._admit(time.monotonic() - started)
+        return True
+
+    def _admit(self, wait: float) -> None:
+        self.in_flight += 1
+        self.admitted += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def metrics(self) -> EndpointMetrics:
+        return EndpointMetrics(
+            in_flight=self.in_flight,
+            queued=self.queued,
+            admitted=self.admitted,
+            rejected_queue_full=self.rejected_queue_full,
+            rejected_timeout=self.rejected_timeout,
+            mean_wait=self.total_wait / self.admitted if self.admitted > 0 else 0.0,
+            max_wait=self.max_wait,
+            saturated=self.saturated(),
+        )
+
+
+class AdmissionController:
+    """Bounds in-flight LLM-backed requests per endpoint and sheds the excess with a fast 503."""
+
+    def __init__(self, config: AdmissionConfig, paths: list[str]) -> None:
+        self.config = config
+        self._limiters = {path: EndpointLimiter(config) for path in paths}
+
+    def saturated(self) -> bool:
+        return any(limiter.saturated() for limiter in self._limiters.values())
+
+    def metrics(self) -> dict[str, EndpointMetrics]:
+        return {path: limiter.metrics() for path, limiter in self._limiters.items()}
+
+    def limiter(self, name: str) -> EndpointLimiter:
+        """A limiter for LLM calls made outside any limited request, such as background work, reported as `name`."""
+        if name not in self._limiters:
+            self._limiters[name] = EndpointLimiter(self.config)
+        return self._limiters[name]
+
+    def install(self, app: FastAPI) -> None:
+        @app.middleware("http")
+        async def admission_control(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
+            limiter = self._limiters.get(request.url.path)
+            if limiter is None:
+                return await call_next(request)
+            if not await limiter.acquire():
+                logging.warning(f"Shedding {request.method} {request.url.path}: endpoint is saturated")
+                return JSONResponse(
+                    status_code=503,
+                    content={"detail": "Server is busy, please retry", "path": str(request.url.path)},
+                    headers={"Retry-After": str(self.config.retry_after)},
+                )
+            try:
+                return await call_next(request)
+            finally:
+                limiter.release()
+
+
+def create_router(controller: AdmissionController) -> APIRouter:
+    router = APIRouter()
+
+    @router.get("/metrics")
+    async def metrics() -> dict[str, EndpointMetrics]:
+        return controller.metrics()
+
+    return router
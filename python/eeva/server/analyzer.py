@@ -1,26 +1,160 @@
+import asyncio
 import logging
 from pathlib import Path
+from typing import Annotated
 
-from fastapi import APIRouter
-from langchain.chat_models.base import BaseChatModel
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import Field
 
-from eeva import analyzer
-from eeva.analyzer import Profile, RelationshipProfile, Response
+from eeva import analyzer, tracing
+from eeva.analyzer import Profile, QuestionResponse, RelationshipProfile, Response
+from eeva.models import LazyChatModel
+from eeva.utils import ID_PATTERN, NetworkModel
 
+from .cascade import ModelCascade
+from .matching import IdentityIndex
+from .sessions import SessionManager
+from .speculation import SpeculativeScheduler
+from .store import ProfileStore, StoredProfile, content_hash
 
-def create_router(llm: BaseChatModel, data_path: Path) -> APIRouter:
+
+class UserIdPair(NetworkModel):
+    user_id1: str = Field(pattern=ID_PATTERN)
+    user_id2: str = Field(pattern=ID_PATTERN)
+
+
+class SessionStart(NetworkModel):
+    first_name: str = Field()
+    last_name: str | None = Field()
+
+
+def create_router(
+    llm: LazyChatModel,
+    data_path: Path,
+    store: ProfileStore,
+    index: IdentityIndex,
+    scheduler: SpeculativeScheduler,
+    sessions: SessionManager,
+    cascade: ModelCascade | None = None,
+) -> APIRouter:
     router = APIRouter()
 
+    async def score(response: Response) -> Profile:
+        if cascade is not None:
+            return await cascade.analyze(response)
+        return await analyzer.analyze(response, await llm.get(), data_path)
+
+    async def relationship(
+        response1: Response, profile1: Profile, response2: Response, profile2: Profile
+    ) -> RelationshipProfile:
+        hash1 = content_hash(response1)
+        hash2 = content_hash(response2)
+        scheduler.record_request(hash1, hash2)
+        cached = await asyncio.to_thread(store.get_relationship, hash1, hash2)
+        tracing.set_attributes(cache_hit=cached is not None)
+        if cached is not None:
+            return cached
+        speculative = scheduler.in_flight(hash1, hash2)
+        if speculative is not None:
+            try:
+                return await asyncio.shield(speculative)
+            except Exception:
+                logging.info("Speculative relationship analysis failed, falling back to a direct call")
+        with scheduler.foreground():
+            result = await analyzer.analyze_relationship(
+                response1, profile1, response2, profile2, await llm.get(), data_path
+            )
+        await asyncio.to_thread(store.put_relationship, hash1, hash2, result)
+        return result
+
+    async def remember(
+        user_id: str, response: Response, profile: Profile, hidden: bool, summarized: bool = False
+    ) -> None:
+        await asyncio.to_thread(store.put_profile, user_id, response, profile, hidden, summarized)
+        index.update(user_id, profile.identity, hidden)
+        if not hidden:
+            scheduler.schedule(user_id)
+
+    async def stored_profile(user_id: str) -> StoredProfile:
+        stored = await asyncio.to_thread(store.get_profile, user_id)
+        if stored is None:
+            raise HTTPException(status_code=404, detail=f"No stored profile for user {user_id}")
+        return stored
+
     @router.post("/analyze")
-    async def analyze(response: Response) -> Profile:
+    async def analyze(
+        response: Response, user_id: Annotated[str | None, Query(pattern=ID_PATTERN)] = None, hidden: bool = False
+    ) -> Profile:
         logging.info(f"Analyzing response for user {response.first_name}")
-        return await analyzer.analyze(response, llm, data_path)
+        if user_id is None:
+            with scheduler.foreground():
+                return await score(response)
+        stored = await asyncio.to_thread(store.get_profile, user_id)
+        # A profile scored from interview summaries is not what analyzing the full response would give.
+        if stored is not None and (stored.content_hash != content_hash(response) or stored.summarized):
+            stored = None
+        tracing.set_attributes(cache_hit=stored is not None)
+        if stored is not None:
+            if stored.hidden == hidden:
+                return stored.profile
+            profile = stored.profile
+        else:
+            with scheduler.foreground():
+                profile = await score(response)
+        await remember(user_id, response, profile, hidden)
+        return profile
+
+    @router.post("/sessions/start")
+    async def start_session(user_id: Annotated[str, Query(pattern=ID_PATTERN)], session: SessionStart) -> None:
+        logging.info(f"Starting interview session for user {user_id}")
+        sessions.start(user_id, session.first_name, session.last_name)
+
+    @router.post("/sessions/answer")
+    async def add_session_answer(
+        user_id: Annotated[str, Query(pattern=ID_PATTERN)],
+        question_id: Annotated[str, Query(pattern=ID_PATTERN)],
+        question_response: QuestionResponse,
+    ) -> None:
+        if sessions.get(user_id) is None:
+            raise HTTPException(status_code=404, detail=f"No interview session for user {user_id}")
+        sessions.add_answer(user_id, question_id, question_response)
+
+    @router.post("/sessions/finalize")
+    async def finalize_session(user_id: Annotated[str, Query(pattern=ID_PATTERN)], hidden: bool = False) -> Profile:
+        session = sessions.take(user_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail=f"No interview session for user {user_id}")
+        logging.info(f"Finalizing interview session for user {user_id}")
+        try:
+            response = session.response()
+            stored = await asyncio.to_thread(store.get_profile, user_id)
+            if stored is not None and stored.content_hash == content_hash(response):
+                profile = stored.profile
+                summarized = stored.summarized
+            else:
+                with scheduler.foreground():
+                    summaries = await sessions.summaries(user_id, session)
+                    profile = await analyzer.analyze_summaries(summaries, await llm.get(), data_path)
+                summarized = True
+        except BaseException:
+            sessions.restore(user_id, session)
+            raise
+        session.cancel()
+        await remember(user_id, response, profile, hidden, summarized)
+        return profile
 
     @router.post("/analyze-relationship")
     async def analyze_relationship(
         response1: Response, profile1: Profile, response2: Response, profile2: Profile
     ) -> RelationshipProfile:
         logging.info(f"Analyzing link for users {response1.first_name} and {response2.first_name}")
-        return await analyzer.analyze_relationship(response1, profile1, response2, profile2, llm, data_path)
+        return await relationship(response1, profile1, response2, profile2)
+
+    @router.post("/analyze-relationship-by-id")
+    async def analyze_relationship_by_id(user_ids: UserIdPair) -> RelationshipProfile:
+        logging.info(f"Analyzing link for users {user_ids.user_id1} and {user_ids.user_id2}")
+        stored1 = await stored_profile(user_ids.user_id1)
+        stored2 = await stored_profile(user_ids.user_id2)
+        return await relationship(stored1.response, stored1.profile, stored2.response, stored2.profile)
 
     return router
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import statistics
+import time
+from pathlib import Path
+
+from fastapi import APIRouter
+from langchain_core.callbacks import get_usage_metadata_callback
+from pydantic import BaseModel, Field
+
+from eeva import analyzer, tracing
+from eeva.analyzer import Profile, Response
+from eeva.models import CascadeConfig, LazyChatModel, ModelPricingInfo, model_pricing
+
+
+class TierMetrics(BaseModel):
+    model: str = Field()
+    scored: int = Field(description="Requests scored by this model")
+    escalated: int = Field(description="Requests passed on to the next model")
+    cost: float = Field(description="Estimated cost in USD")
+    mean_latency: float = Field(description="Mean seconds spent on this model per scored request")
+
+
+class CascadeMetrics(BaseModel):
+    requests: int = Field()
+    escalated_fraction: float = Field(description="Fraction of requests escalated past the first model")
+    blended_cost: float = Field(description="Mean estimated cost in USD per request over all models")
+    mean_latency: float = Field(description="Mean seconds per request over all models")
+    tiers: list[TierMetrics] = Field()
+
+
+def _usage_cost(usage: dict, pricing_info: ModelPricingInfo) -> float:
+    cost = 0.0
+    for model_usage in usage.values():
+        cached = model_usage.get("input_token_details", {}).get("cache_read", 0)
+        cost += pricing_info.calculate(model_usage["input_tokens"] - cached, cached, model_usage["output_tokens"])
+    return cost
+
+
+class ModelCascade:
+    """Scores with the cheapest model first and escalates to larger models when its samples disagree."""
+
+    def __init__(self, config: CascadeConfig, data_path: Path) -> None:
+        self.config = config
+        self._data_path = data_path
+        self._llms = [LazyChatModel(specifier) for specifier in config.models]
+        self._scored = [0] * len(config.models)
+        self._escalated = [0] * len(config.models)
+        self._cost = [0.0] * len(config.models)
+        self._latency = [0.0] * len(config.models)
+
+    async def analyze(self, response: Response) -> Profile:
+        for i, (specifier, llm) in enumerate(zip(self.config.models, self._llms, strict=True)):
+            started = time.perf_counter()
+            with tracing.span("cascade.tier", model=specifier.name), get_usage_metadata_callback() as usage:
+                model = await llm.get()
+                profiles = await asyncio.gather(
+                    *(analyzer.analyze(response, model, self._data_path) for _ in range(self.config.samples))
+                )
+            self._latency[i] += time.perf_counter() - started
+            self._scored[i] += 1
+            if specifier in model_pricing:
+                self._cost[i] += _usage_cost(usage.usage_metadata, model_pricing[specifier])
+            stddev = statistics.stdev(profile.identity for profile in profiles)
+            if stddev <= self.config.max_stddev or i == len(self._llms) - 1:
+                break
+            logging.info(f"Escalating analysis of {response.first_name} past {specifier.name} (stddev {stddev:.3f})")
+            self._escalated[i] += 1
+        tracing.set_attributes(cascade_model=specifier.name)
+        return Profile(
+            identity=statistics.fmean(profile.identity for profile in profiles), horoscope=profiles[0].horoscope
+        )
+
+    def metrics(self) -> CascadeMetrics:
+        requests = self._scored[0]
+        return CascadeMetrics(
+            requests=requests,
+            escalated_fraction=self._escalated[0] / requests if requests else 0.0,
+            blended_cost=sum(self._cost) / requests if requests else 0.0,
+            mean_latency=sum(self._latency) / requests if requests else 0.0,
+            tiers=[
+                TierMetrics(
+                    model=specifier.name,
+                    scored=scored,
+                    escalated=escalated,
+                    cost=cost,
+                    mean_latency=latency / scored if scored else 0.0,
+                )
+                for specifier, scored, escalated, cost, latency in zip(
+                    self.config.models, self._scored, self._escalated, self._cost, self._latency, strict=True
+                )
+            ],
+        )
+
+
+def create_router(cascade: ModelCascade) -> APIRouter:
+    router = APIRouter()
+
+    @router.get("/metrics")
+    def metrics() -> CascadeMetrics:
+        return cascade.metrics()
+
+    return router
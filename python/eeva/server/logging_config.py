@@ -1,8 +1,23 @@
-import json
+import atexit
+import contextlib
 import logging
+import queue
+import random
 import sys
 import traceback
-from typing import Any, Dict
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Iterator
+
+import orjson
+
+from eeva import tracing
+
+# Attributes every LogRecord carries. Anything else on a record was passed through `extra` and is logged as a field.
+RESERVED_ATTRS = frozenset(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime"}
+
+_log_context: ContextVar[dict[str, Any] | None] = ContextVar("log_context", default=None)
+_listener: QueueListener | None = None
 
 
 class SingleLineFormatter(logging.Formatter):
@@ -42,37 +57,82 @@ class StructuredFormatter(logging.Formatter):
 
         # Add extra fields from the record
         for key, value in record.__dict__.items():
-            if key not in [
-                "name",
-                "msg",
-                "args",
-                "levelname",
-                "levelno",
-                "pathname",
-                "filename",
-                "module",
-                "exc_info",
-                "exc_text",
-                "stack_info",
-                "lineno",
-                "funcName",
-                "created",
-                "msecs",
-                "relativeCreated",
-                "thread",
-                "threadName",
-                "processName",
-                "process",
-                "getMessage",
-            ]:
+            if key not in RESERVED_ATTRS:
                 log_entry[key] = value
 
-        # Ensure the JSON is on a single line
-        return json.dumps(log_entry, ensure_ascii=False, separators=(",", ":"))
+        # orjson never escapes non-ASCII and emits a single line
+        return orjson.dumps(log_entry, default=str).decode("utf-8")
+
+
+class ContextFilter(logging.Filter):
+    """Copies the request-scoped fields set with `log_context` and the active trace onto each record."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        fields = _log_context.get()
+        if fields:
+            for key, value in fields.items():
+                if not hasattr(record, key):
+                    setattr(record, key, value)
+        active_span = tracing.current_span()
+        if active_span is not None:
+            record.trace_id = active_span.trace_id
+            record.span_id = active_span.span_id
+        return True
+
+
+class InfoSamplingFilter(logging.Filter):
+    """Keeps only a fraction of INFO and lower records. Warnings and errors always pass."""
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        if not 0 <= rate <= 1:
+            raise ValueError(f"Sample rate must be between 0 and 1, got {rate}")
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.INFO or self.rate >= 1 or random.random() < self.rate
+
 
+class InProcessQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
 
-def setup_logging() -> None:
-    """Configure logging for Cloud Run deployment."""
+    The stdlib handler copies and formats records on the calling thread so they can be pickled. The queue here
+    never leaves the process and is the only root handler, so the record is passed on as is, with just the message
+    arguments merged eagerly in case they are mutated after the call.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+@contextlib.contextmanager
+def log_context(**fields: Any) -> Iterator[None]:
+    """Attach fields such as request id, endpoint or model to every record logged in this context."""
+    token = _log_context.set({**(_log_context.get() or {}), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+def stop_logging() -> None:
+    """Flush and stop the background log writer."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_logging(info_sample_rate: float = 1.0) -> None:
+    """Configure logging for Cloud Run deployment.
+
+    Records are put on a queue on the calling thread and formatted and written by a background listener thread,
+    so logging never blocks the event loop on serialization or stdout.
+    """
+    global _listener
 
     # Get the root logger
     root_logger = logging.getLogger()
@@ -81,6 +141,7 @@ def setup_logging() -> None:
     # Remove any existing handlers
     for handler in root_logger.handlers[:]:
         root_logger.removeHandler(handler)
+    stop_logging()
 
     # Create console handler
     handler = logging.StreamHandler(sys.stdout)
@@ -90,7 +151,15 @@ def setup_logging() -> None:
     formatter = StructuredFormatter()
     handler.setFormatter(formatter)
 
-    root_logger.addHandler(handler)
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    queue_handler = InProcessQueueHandler(log_queue)
+    queue_handler.setLevel(logging.INFO)
+    queue_handler.addFilter(InfoSamplingFilter(info_sample_rate))
+    queue_handler.addFilter(ContextFilter())
+    root_logger.addHandler(queue_handler)
+
+    _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
 
     # Set up specific loggers
     logging.getLogger("eeva").setLevel(logging.INFO)
@@ -98,6 +167,9 @@ def setup_logging() -> None:
     logging.getLogger("uvicorn").setLevel(logging.INFO)
 
 
+atexit.register(stop_logging)
+
+
 def log_exception(logger: logging.Logger, message: str, exc: Exception) -> None:
     """Helper function to log exceptions with context."""
     logger.error(message, exc_info=exc, extra={"error_type": type(exc).__name__, "error_message": str(exc)})
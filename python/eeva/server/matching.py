@@ -0,0 +1,102 @@
+import bisect
+import logging
+import threading
+from typing import Annotated, Iterable
+
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import Field
+
+from eeva.utils import ID_PATTERN, NetworkModel
+
+
+class Match(NetworkModel):
+    user_id: str = Field()
+    identity: float = Field(ge=0, le=1)
+    distance: float = Field(ge=0, le=1, description="Same metric as `Profile.cmp`")
+
+
+class IdentityIndex:
+    """Sorted index over identity scores answering nearest-neighbour queries in O(log n + k).
+
+    Hidden users are skipped during the outward scan, so queries that exclude them additionally pay
+    for every hidden user lying between the query point and the k-th match.
+    """
+
+    def __init__(self, entries: Iterable[tuple[str, float, bool]] = ()) -> None:
+        self._lock = threading.Lock()
+        self._identity_of: dict[str, float] = {}
+        self._hidden: set[str] = set()
+        for user_id, identity, hidden in entries:
+            self._identity_of[user_id] = identity
+            if hidden:
+                self._hidden.add(user_id)
+        # Ties on identity are broken by user id so every entry has a unique position to bisect to.
+        self._keys: list[tuple[float, str]] = sorted(
+            (identity, user_id) for user_id, identity in self._identity_of.items()
+        )
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._identity_of
+
+    def identity(self, user_id: str) -> float | None:
+        return self._identity_of.get(user_id)
+
+    def update(self, user_id: str, identity: float, hidden: bool = False) -> None:
+        with self._lock:
+            old_identity = self._identity_of.get(user_id)
+            if old_identity is not None:
+                del self._keys[bisect.bisect_left(self._keys, (old_identity, user_id))]
+            bisect.insort(self._keys, (identity, user_id))
+            self._identity_of[user_id] = identity
+            if hidden:
+                self._hidden.add(user_id)
+            else:
+                self._hidden.discard(user_id)
+
+    def remove(self, user_id: str) -> None:
+        with self._lock:
+            identity = self._identity_of.pop(user_id)
+            del self._keys[bisect.bisect_left(self._keys, (identity, user_id))]
+            self._hidden.discard(user_id)
+
+    def nearest(self, identity: float, k: int, exclude: str | None = None, exclude_hidden: bool = True) -> list[Match]:
+        """Return the k users whose identity is closest to `identity`, closest first."""
+        matches: list[Match] = []
+        with self._lock:
+            keys = self._keys
+            right = bisect.bisect_left(keys, (identity, ""))
+            left = right - 1
+            while len(matches) < k and (left >= 0 or right < len(keys)):
+                if right >= len(keys) or (left >= 0 and identity - keys[left][0] <= keys[right][0] - identity):
+                    candidate_identity, user_id = keys[left]
+                    left -= 1
+                else:
+                    candidate_identity, user_id = keys[right]
+                    right += 1
+                if user_id == exclude or (exclude_hidden and user_id in self._hidden):
+                    continue
+                matches.append(
+                    Match(user_id=user_id, identity=candidate_identity, distance=abs(identity - candidate_identity))
+                )
+        return matches
+
+
+def create_router(index: IdentityIndex) -> APIRouter:
+    router = APIRouter()
+
+    @router.get("/top-k")
+    async def top_k(
+        user_id: Annotated[str, Query(pattern=ID_PATTERN)],
+        k: Annotated[int, Query(gt=0, le=1000)] = 10,
+        exclude_hidden: bool = True,
+    ) -> list[Match]:
+        identity = index.identity(user_id)
+        if identity is None:
+            raise HTTPException(status_code=404, detail=f"No stored profile for user {user_id}")
+        logging.info(f"Finding {k} closest matches for user {user_id}")
+        return index.nearest(identity, k, exclude=user_id, exclude_hidden=exclude_hidden)
+
+    return router
@@ -1,22 +1,56 @@
+import asyncio
 import os
+import random
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Literal
 
-from fastapi import FastAPI, Request
+import orjson
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from langchain import chat_models
 
-from . import analyzer
-from .logging_config import get_logger, log_exception, setup_logging
+from eeva import http_pool, profiling, tracing, usage_ledger
+from eeva.models import CascadeConfig, LazyChatModel, ModelSpecifier, model_pricing
+
+from . import admission, analyzer, cascade, matching, sessions, speculation
+from .logging_config import get_logger, log_context, log_exception, setup_logging
+from .store import ProfileStore
 
 
 def create_app() -> FastAPI:
     # Setup logging first
-    setup_logging()
+    setup_logging(info_sample_rate=float(os.getenv("LOG_INFO_SAMPLE_RATE", "1.0")))
+    # Spans are only written when TRACE_PATH is set, e.g. to a persistent volume, and not to Cloud Run's in-memory
+    # filesystem by default.
+    trace_path = os.getenv("TRACE_PATH")
+    tracing.configure(tracing.JsonlFileExporter(trace_path) if trace_path else None)
+    http_pool.configure(http_pool.HttpPoolConfig.from_env())
+    # The server's calls are only reported by step and model, so they are summed rather than kept for its lifetime.
+    ledger = usage_ledger.UsageLedger(max_records=10_000)
+    usage_ledger.install(ledger)
     logger = get_logger(__name__)
     logger.info("Starting Eeva application")
 
-    app = FastAPI()
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        scheduler.start()
+        # Build the model client and open a provider connection once the server is accepting requests, instead of
+        # paying for the SDK imports and the first TLS handshake before binding or on the first request.
+        warm_up = asyncio.create_task(llm.warm_up()) if os.getenv("WARMUP", "1") != "0" else None
+        yield
+        if warm_up is not None:
+            warm_up.cancel()
+        await scheduler.stop()
+        await http_pool.aclose()
+        store.close()
+        tracing.configure(None)
+        usage_ledger.install(None)
+
+    app = FastAPI(lifespan=lifespan)
 
     # Global exception handler for unhandled errors
     @app.exception_handler(Exception)
@@ -24,6 +58,63 @@ def create_app() -> FastAPI:
         log_exception(logger, f"Unhandled exception in {request.method} {request.url.path}", exc)
         return JSONResponse(status_code=500, content={"detail": "Internal server error", "path": str(request.url.path)})
 
+    admission_controller = admission.AdmissionController(
+        admission.AdmissionConfig(
+            max_in_flight=int(os.getenv("MAX_IN_FLIGHT", "40")),
+            max_queue=int(os.getenv("MAX_QUEUE", "20")),
+        ),
+        [
+            "/api/analyzer/analyze",
+            "/api/analyzer/analyze-relationship",
+            "/api/analyzer/analyze-relationship-by-id",
+            "/api/analyzer/sessions/finalize",
+        ],
+    )
+    # Installed before CORS so that shed requests still carry CORS headers.
+    admission_controller.install(app)
+
+    profile_token = os.getenv("PROFILE_TOKEN")
+    profile_sample_rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    profile_dir = Path(os.getenv("PROFILE_DIR", "profiles")).resolve()
+
+    def write_profile(profiler: profiling.SamplingProfiler, name: str) -> Path:
+        profile_dir.mkdir(parents=True, exist_ok=True)
+        profile_path = profile_dir / f"{name}.speedscope.json"
+        profile_path.write_bytes(orjson.dumps(profiler.to_speedscope(name)))
+        return profile_path
+
+    @app.middleware("http")
+    async def sample_profile(request: Request, call_next):
+        requested = profile_token is not None and request.headers.get("X-Eeva-Profile") == profile_token
+        if not requested and random.random() >= profile_sample_rate:
+            return await call_next(request)
+        profiler = profiling.SamplingProfiler(thread_id=threading.get_ident())
+        profiler.start()
+        try:
+            return await call_next(request)
+        finally:
+            profiler.stop()
+            endpoint = request.url.path.strip("/").replace("/", "-")
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{uuid.uuid4().hex[:8]}"
+            profile_path = await asyncio.to_thread(write_profile, profiler, name)
+            logger.info(f"Wrote request profile to {profile_path}\n{profiler.summary()}")
+
+    @app.middleware("http")
+    async def request_log_context(request: Request, call_next):
+        # Cloud Run sets X-Cloud-Trace-Context to "TRACE_ID/SPAN_ID;o=OPTIONS"
+        trace_header = request.headers.get("X-Cloud-Trace-Context")
+        request_id = trace_header.split("/")[0] if trace_header else uuid.uuid4().hex
+        with (
+            log_context(request_id=request_id, endpoint=request.url.path, model=llm_model),
+            usage_ledger.scope(step=request.url.path),
+            tracing.span(
+                "http.request", trace_id=request_id, method=request.method, endpoint=request.url.path
+            ) as request_span,
+        ):
+            response = await call_next(request)
+            request_span.attributes["status_code"] = response.status_code
+            return response
+
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["https://eeva.site"],
@@ -39,15 +130,73 @@ def create_app() -> FastAPI:
     else:
         data_path = Path(data_path_str).resolve()
 
-    llm = chat_models.init_chat_model("gpt-5", model_provider="openai")
+    llm_model = "gpt-5"
+    llm = LazyChatModel(ModelSpecifier(name=llm_model, provider="openai"))
+
+    # The default is a file in the working directory. On Cloud Run that is the instance's in-memory filesystem, so
+    # the store is lost when the instance stops and is not shared between instances. Set STORE_PATH to a file on a
+    # persistent volume to keep profiles and horoscopes across instances.
+    store_path_str = os.getenv("STORE_PATH")
+    if store_path_str is None:
+        logger.warning("STORE_PATH is not set, so the profile store only lives as long as this instance")
+    store_path = Path(store_path_str or "eeva_store.sqlite3").resolve()
+    logger.info(f"Using profile store at {store_path}")
+    store = ProfileStore(store_path)
+    index = matching.IdentityIndex(store.identities())
+    logger.info(f"Loaded {len(index)} stored identities into the matching index")
+
+    scheduler = speculation.SpeculativeScheduler(
+        speculation.SpeculationConfig(budget_calls=int(os.getenv("SPECULATION_BUDGET_CALLS", "200"))),
+        store,
+        index,
+        llm,
+        data_path,
+    )
+
+    session_manager = sessions.SessionManager(
+        llm, data_path, admission_controller.limiter("session-answer-summaries"), scheduler
+    )
+
+    cascade_config = CascadeConfig.from_env()
+    model_cascade = cascade.ModelCascade(cascade_config, data_path) if cascade_config is not None else None
+    if cascade_config is not None:
+        logger.info(f"Scoring profiles with a model cascade over {[m.name for m in cascade_config.models]}")
+
+    @app.get("/live")
+    def live() -> str:
+        """
+        Liveness check endpoint. Responds with OK as long as the server is running, also while it is saturated.
+        """
+        return "OK"
 
     @app.get("/ready")
-    def ready() -> str:
+    def ready(response: Response) -> str:
         """
-        Health check endpoint.
+        Readiness check endpoint. Responds with 503 while an LLM endpoint is saturated, so traffic goes to other
+        instances. Use /live for liveness checks, since a saturated instance must not be restarted.
         """
+        if admission_controller.saturated():
+            response.status_code = 503
+            return "Saturated"
         return "OK"
 
-    app.include_router(analyzer.create_router(llm, data_path), prefix="/api/analyzer")
+    @app.get("/api/http-pool/metrics")
+    def http_pool_metrics() -> dict[str, http_pool.PoolStats]:
+        return http_pool.stats()
+
+    @app.get("/api/usage/metrics")
+    def usage_metrics(by: Literal["step", "model"] = "step") -> list[usage_ledger.UsageGroup]:
+        """Token usage and estimated cost of the model calls made since startup, by endpoint or model."""
+        return ledger.group(by, model_pricing)
+
+    app.include_router(
+        analyzer.create_router(llm, data_path, store, index, scheduler, session_manager, model_cascade),
+        prefix="/api/analyzer",
+    )
+    if model_cascade is not None:
+        app.include_router(cascade.create_router(model_cascade), prefix="/api/cascade")
+    app.include_router(matching.create_router(index), prefix="/api/matching")
+    app.include_router(speculation.create_router(scheduler), prefix="/api/speculation")
+    app.include_router(admission.create_router(admission_controller), prefix="/api/admission")
 
     return app
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import time
+from pathlib import Path
+
+from eeva import analyzer
+from eeva.analyzer import QuestionResponse, Response
+from eeva.models import LazyChatModel
+
+from .admission import EndpointLimiter
+from .speculation import SpeculativeScheduler
+
+
+class InterviewSession:
+    def __init__(self, first_name: str, last_name: str | None) -> None:
+        self.first_name = first_name
+        self.last_name = last_name
+        self.responses: dict[str, QuestionResponse] = {}
+        self.summaries: dict[str, asyncio.Task[str]] = {}
+        self.last_active = time.monotonic()
+
+    def response(self) -> Response:
+        return Response(first_name=self.first_name, last_name=self.last_name, responses=dict(self.responses))
+
+    def cancel(self) -> None:
+        for task in self.summaries.values():
+            task.cancel()
+
+
+class SessionManager:
+    """Running per-answer analysis for interviews that are still in progress.
+
+    Every answer is summarised in the background as soon as it arrives, so finalizing a session only has to
+    analyze the short summaries instead of running a cold analysis over the full interview. Summaries take a slot of
+    `limiter` like requests to LLM endpoints do, and count as foreground calls for `scheduler`.
+    """
+
+    def __init__(
+        self,
+        llm: LazyChatModel,
+        data_path: Path,
+        limiter: EndpointLimiter,
+        scheduler: SpeculativeScheduler,
+        max_concurrent_summaries: int = 16,
+        ttl: float = 6 * 3600,
+    ) -> None:
+        self._llm = llm
+        self._data_path = data_path
+        self._limiter = limiter
+        self._scheduler = scheduler
+        self._semaphore = asyncio.Semaphore(max_concurrent_summaries)
+        self._ttl = ttl
+        self._sessions: dict[str, InterviewSession] = {}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        for user_id in [user_id for user_id, s in self._sessions.items() if now - s.last_active > self._ttl]:
+            logging.info(f"Expiring interview session for user {user_id}")
+            self._sessions.pop(user_id).cancel()
+
+    def start(self, user_id: str, first_name: str, last_name: str | None) -> None:
+        self._expire()
+        if user_id in self._sessions:
+            self._sessions.pop(user_id).cancel()
+        self._sessions[user_id] = InterviewSession(first_name, last_name)
+
+    def get(self, user_id: str) -> InterviewSession | None:
+        return self._sessions.get(user_id)
+
+    async def _summarize(self, question_response: QuestionResponse) -> str:
+        if not await self._limiter.acquire():
+            # Finalizing the session retries the summary.
+            raise RuntimeError("Answer summary shed: the server is saturated")
+        try:
+            with self._scheduler.foreground():
+                async with self._semaphore:
+                    return await analyzer.summarize_answer(question_response, await self._llm.get(), self._data_path)
+        finally:
+            self._limiter.release()
+
+    def add_answer(self, user_id: str, question_id: str, question_response: QuestionResponse) -> None:
+        session = self._sessions[user_id]
+        session.last_active = time.monotonic()
+        if session.responses.get(question_id) == question_response:
+            return
+        if question_id in session.summaries:
+            session.summaries[question_id].cancel()
+        session.responses[question_id] = question_response
+        session.summaries[question_id] = asyncio.create_task(self._summarize(question_response))
+
+    async def summaries(self, user_id: str, session: InterviewSession) -> list[str]:
+        """Wait for all outstanding summaries, re-running any that failed."""
+        summaries = []
+        for question_id, task in list(session.summaries.items()):
+            try:
+                summaries.append(await task)
+            except Exception as e:
+                logging.warning(f"Summary of answer {question_id} for user {user_id} failed, retrying: {e}")
+                task = asyncio.create_task(self._summarize(session.responses[question_id]))
+                session.summaries[question_id] = task
+                summaries.append(await task)
+        return summaries
+
+    def take(self, user_id: str) -> InterviewSession | None:
+        """Remove a session to finalize it, so that finalizing it again or starting a new one does not interfere."""
+        return self._sessions.pop(user_id, None)
+
+    def restore(self, user_id: str, session: InterviewSession) -> None:
+        """Put back a taken session whose finalization failed, unless a new session was started meanwhile."""
+        if user_id in self._sessions:
+            session.cancel()
+        else:
+            self._sessions[user_id] = session
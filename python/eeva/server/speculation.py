@@ -0,0 +1,214 @@
+import asyncio
+import contextlib
+import logging
+import time
+from collections import deque
+from pathlib import Path
+from typing import Iterator
+
+from fastapi import APIRouter
+from pydantic import BaseModel, Field
+
+from eeva import analyzer, usage_ledger
+from eeva.analyzer import RelationshipProfile
+from eeva.models import LazyChatModel
+
+from .matching import IdentityIndex
+from .store import ProfileStore, pair_key
+
+
+class SpeculationConfig(BaseModel):
+    candidates_per_profile: int = Field(default=5, ge=0, description="Closest candidates to precompute per profile")
+    budget_calls: int = Field(default=200, ge=0, description="Maximum speculative LLM calls per budget window")
+    budget_window: float = Field(default=3600, gt=0, description="Length of the budget window in seconds")
+    max_foreground: int = Field(
+        default=0, ge=0, description="Only speculate while at most this many client LLM calls are in flight"
+    )
+    max_queue_size: int = Field(default=10_000, gt=0)
+    idle_poll_interval: float = Field(default=0.5, gt=0)
+
+
+class SpeculationMetrics(BaseModel):
+    scheduled: int = Field(description="Candidate pairs queued for precomputation")
+    computed: int = Field(description="Speculative LLM calls completed")
+    failed: int = Field(description="Speculative LLM calls that raised")
+    dropped: int = Field(description="Candidate pairs dropped because the queue was full")
+    budget_exhausted: int = Field(description="Times the worker waited for the cost budget to refill")
+    hits: int = Field(description="Client requests served from a speculative result")
+    queued: int = Field()
+    hit_rate: float = Field(description="Fraction of computed speculations that a client later requested")
+    wasted_calls: int = Field(description="Computed speculations no client has requested yet")
+
+
+class SpeculativeScheduler:
+    """Precomputes relationship horoscopes for a new profile's closest matches while the server is idle.
+
+    Candidates are prioritised by `Profile.cmp` distance, so the most likely matches are computed first. Results
+    are written to the profile store, where the relationship endpoints find them like any other cached result.
+    """
+
+    def __init__(
+        self,
+        config: SpeculationConfig,
+        store: ProfileStore,
+        index: IdentityIndex,
+        llm: LazyChatModel,
+        data_path: Path,
+    ) -> None:
+        self.config = config
+        self._store = store
+        self._index = index
+        self._llm = llm
+        self._data_path = data_path
+        self._queue: asyncio.PriorityQueue[tuple[float, int, str, str]] = asyncio.PriorityQueue(config.max_queue_size)
+        self._sequence = 0
+        self._foreground = 0
+        self._spent: deque[float] = deque()
+        self._in_flight: dict[tuple[str, str], asyncio.Task[RelationshipProfile]] = {}
+        self._unrequested: set[tuple[str, str]] = set()
+        self._requested_in_flight: set[tuple[str, str]] = set()
+        self._worker: asyncio.Task[None] | None = None
+
+        self._scheduled = 0
+        self._computed = 0
+        self._failed = 0
+        self._dropped = 0
+        self._budget_exhausted = 0
+        self._hits = 0
+
+    def start(self) -> None:
+        if self._worker is None and self.config.candidates_per_profile > 0 and self.config.budget_calls > 0:
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._worker
+            self._worker = None
+        # Analyses in flight are not cancelled with the worker, since client requests may be awaiting them.
+        await asyncio.gather(*self._in_flight.values(), return_exceptions=True)
+        self._in_flight.clear()
+
+    @contextlib.contextmanager
+    def foreground(self) -> Iterator[None]:
+        """Mark a client-initiated LLM call as in flight so speculation yields to it."""
+        self._foreground += 1
+        try:
+            yield
+        finally:
+            self._foreground -= 1
+
+    def schedule(self, user_id: str) -> None:
+        if self._worker is None:
+            return
+        identity = self._index.identity(user_id)
+        if identity is None:
+            return
+        for match in self._index.nearest(identity, self.config.candidates_per_profile, exclude=user_id):
+            try:
+                self._queue.put_nowait((match.distance, self._sequence, user_id, match.user_id))
+            except asyncio.QueueFull:
+                self._dropped += 1
+                continue
+            self._sequence += 1
+            self._scheduled += 1
+
+    def in_flight(self, hash1: str, hash2: str) -> asyncio.Task[RelationshipProfile] | None:
+        return self._in_flight.get(pair_key(hash1, hash2))
+
+    def record_request(self, hash1: str, hash2: str) -> None:
+        """Count a client request for a pair, crediting a hit if the pair was speculated."""
+        key = pair_key(hash1, hash2)
+        if key in self._in_flight:
+            self._requested_in_flight.add(key)
+            self._hits += 1
+        elif key in self._unrequested:
+            self._unrequested.remove(key)
+            self._hits += 1
+
+    def metrics(self) -> SpeculationMetrics:
+        return SpeculationMetrics(
+            scheduled=self._scheduled,
+            computed=self._computed,
+            failed=self._failed,
+            dropped=self._dropped,
+            budget_exhausted=self._budget_exhausted,
+            hits=self._hits,
+            queued=self._queue.qsize(),
+            hit_rate=self._hits / self._computed if self._computed > 0 else 0.0,
+            wasted_calls=len(self._unrequested),
+        )
+
+    async def _wait_for_capacity(self) -> None:
+        while True:
+            now = time.monotonic()
+            while self._spent and now - self._spent[0] > self.config.budget_window:
+                self._spent.popleft()
+            if len(self._spent) >= self.config.budget_calls:
+                self._budget_exhausted += 1
+                await asyncio.sleep(self.config.budget_window - (now - self._spent[0]))
+            elif self._foreground > self.config.max_foreground:
+                await asyncio.sleep(self.config.idle_poll_interval)
+            else:
+                return
+
+    async def _run(self) -> None:
+        while True:
+            _, _, user_id1, user_id2 = await self._queue.get()
+            try:
+                await self._speculate(user_id1, user_id2)
+            except Exception:
+                logging.exception(f"Speculation for {user_id1} and {user_id2} failed")
+
+    async def _speculate(self, user_id1: str, user_id2: str) -> None:
+        stored1 = await asyncio.to_thread(self._store.get_profile, user_id1)
+        stored2 = await asyncio.to_thread(self._store.get_profile, user_id2)
+        if stored1 is None or stored2 is None:
+            return
+        key = pair_key(stored1.content_hash, stored2.content_hash)
+        if key in self._in_flight or await asyncio.to_thread(self._store.get_relationship, *key) is not None:
+            return
+        await self._wait_for_capacity()
+        self._spent.append(time.monotonic())
+        llm = await self._llm.get()
+        with usage_ledger.scope(step="speculation"):
+            task = asyncio.create_task(
+                analyzer.analyze_relationship(
+                    stored1.response,
+                    stored1.profile,
+                    stored2.response,
+                    stored2.profile,
+                    llm,
+                    self._data_path,
+                )
+            )
+        self._in_flight[key] = task
+        try:
+            # Shielded, so stopping the worker leaves the analysis running for requests awaiting it.
+            relationship = await asyncio.shield(task)
+        except Exception as e:
+            self._failed += 1
+            self._requested_in_flight.discard(key)
+            logging.warning(f"Speculative relationship analysis for {user_id1} and {user_id2} failed: {e}")
+            return
+        finally:
+            # When the worker is stopped mid-analysis, stop() waits for the task and clears it.
+            if task.done():
+                del self._in_flight[key]
+        await asyncio.to_thread(self._store.put_relationship, *key, relationship)
+        self._computed += 1
+        if key in self._requested_in_flight:
+            self._requested_in_flight.remove(key)
+        else:
+            self._unrequested.add(key)
+
+
+def create_router(scheduler: SpeculativeScheduler) -> APIRouter:
+    router = APIRouter()
+
+    @router.get("/metrics")
+    async def metrics() -> SpeculationMetrics:
+        return scheduler.metrics()
+
+    return router
@@ -0,0 +1,180 @@
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Generic, Hashable, TypeVar
+
+from pydantic import BaseModel, Field
+
+from eeva.analyzer import Profile, RelationshipProfile, Response
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+def content_hash(response: Response) -> str:
+    return hashlib.sha256(response.model_dump_json().encode("utf-8")).hexdigest()
+
+
+def pair_key(hash1: str, hash2: str) -> tuple[str, str]:
+    """Relationship horoscopes are symmetric, so pairs are keyed independently of order."""
+    return (hash1, hash2) if hash1 <= hash2 else (hash2, hash1)
+
+
+class LRUCache(Generic[K, V]):
+    def __init__(self, capacity: int) -> None:
+        if capacity <= 0:
+            raise ValueError(f"LRU capacity must be positive, got {capacity}")
+        self.capacity = capacity
+        self._entries: OrderedDict[K, V] = OrderedDict()
+
+    def get(self, key: K) -> V | None:
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def put(self, key: K, value: V) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class StoredProfile(BaseModel):
+    user_id: str = Field()
+    content_hash: str = Field()
+    response: Response = Field()
+    profile: Profile = Field()
+    hidden: bool = Field(default=False)
+    summarized: bool = Field(
+        default=False, description="Scored from an interview session's answer summaries rather than the full response"
+    )
+
+
+class ProfileStore:
+    """Profiles and relationship horoscopes the server has already generated.
+
+    SQLite holds everything on disk, and an LRU keeps the most recently used entries in memory. Methods block on
+    SQLite, so async code calls them with `asyncio.to_thread`.
+    """
+
+    def __init__(self, path: Path | str, cache_size: int = 4096) -> None:
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(path), check_same_thread=False)
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS profiles (
+                user_id TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                response TEXT NOT NULL,
+                profile TEXT NOT NULL,
+                hidden INTEGER NOT NULL DEFAULT 0,
+                summarized INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS relationships (
+                hash1 TEXT NOT NULL,
+                hash2 TEXT NOT NULL,
+                relationship TEXT NOT NULL,
+                PRIMARY KEY (hash1, hash2)
+            );
+            """
+        )
+        columns = {row[1] for row in self._connection.execute("PRAGMA table_info(profiles)")}
+        if "hidden" not in columns:
+            self._connection.execute("ALTER TABLE profiles ADD COLUMN hidden INTEGER NOT NULL DEFAULT 0")
+        if "summarized" not in columns:
+            self._connection.execute("ALTER TABLE profiles ADD COLUMN summarized INTEGER NOT NULL DEFAULT 0")
+        self._connection.commit()
+        self._profiles: LRUCache[str, StoredProfile] = LRUCache(cache_size)
+        self._relationships: LRUCache[tuple[str, str], RelationshipProfile] = LRUCache(cache_size)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def get_profile(self, user_id: str) -> StoredProfile | None:
+        with self._lock:
+            stored = self._profiles.get(user_id)
+            if stored is not None:
+                return stored
+            row = self._connection.execute(
+                "SELECT content_hash, response, profile, hidden, summarized FROM profiles WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            stored = StoredProfile(
+                user_id=user_id,
+                content_hash=row[0],
+                response=Response.model_validate_json(row[1]),
+                profile=Profile.model_validate_json(row[2]),
+                hidden=bool(row[3]),
+                summarized=bool(row[4]),
+            )
+            self._profiles.put(user_id, stored)
+            return stored
+
+    def put_profile(
+        self, user_id: str, response: Response, profile: Profile, hidden: bool = False, summarized: bool = False
+    ) -> StoredProfile:
+        stored = StoredProfile(
+            user_id=user_id,
+            content_hash=content_hash(response),
+            response=response,
+            profile=profile,
+            hidden=hidden,
+            summarized=summarized,
+        )
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO profiles (user_id, content_hash, response, profile, hidden, summarized) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    user_id,
+                    stored.content_hash,
+                    response.model_dump_json(),
+                    profile.model_dump_json(),
+                    hidden,
+                    summarized,
+                ),
+            )
+            self._connection.commit()
+            self._profiles.put(user_id, stored)
+        return stored
+
+    def identities(self) -> list[tuple[str, float, bool]]:
+        """Return (user id, identity, hidden) for every stored profile."""
+        with self._lock:
+            rows = self._connection.execute("SELECT user_id, profile, hidden FROM profiles").fetchall()
+        return [
+            (user_id, Profile.model_validate_json(profile).identity, bool(hidden)) for user_id, profile, hidden in rows
+        ]
+
+    def get_relationship(self, hash1: str, hash2: str) -> RelationshipProfile | None:
+        key = pair_key(hash1, hash2)
+        with self._lock:
+            relationship = self._relationships.get(key)
+            if relationship is not None:
+                return relationship
+            row = self._connection.execute(
+                "SELECT relationship FROM relationships WHERE hash1 = ? AND hash2 = ?", key
+            ).fetchone()
+            if row is None:
+                return None
+            relationship = RelationshipProfile.model_validate_json(row[0])
+            self._relationships.put(key, relationship)
+            return relationship
+
+    def put_relationship(self, hash1: str, hash2: str, relationship: RelationshipProfile) -> None:
+        key = pair_key(hash1, hash2)
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO relationships (hash1, hash2, relationship) VALUES (?, ?, ?)",
+                (*key, relationship.model_dump_json()),
+            )
+            self._connection.commit()
+            self._relationships.put(key, relationship)
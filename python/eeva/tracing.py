@@ -0,0 +1,130 @@
+import contextlib
+import logging
+import os
+import queue
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Iterator, Protocol
+
+import orjson
+from pydantic import BaseModel, Field
+
+
+class Span(BaseModel):
+    name: str = Field()
+    trace_id: str = Field()
+    span_id: str = Field()
+    parent_id: str | None = Field()
+    start_time: float = Field(description="Unix time in seconds")
+    duration: float | None = Field(default=None, description="Wall-clock duration in seconds")
+    status: str = Field(default="ok")
+    attributes: dict[str, Any] = Field(default_factory=dict)
+
+
+class SpanExporter(Protocol):
+    def export(self, span: Span) -> None: ...
+
+    def shutdown(self) -> None: ...
+
+
+class JsonlFileExporter:
+    """Appends each finished span as one JSON line to a local file.
+
+    Spans are serialized and written by a background thread, so exporting never blocks the caller on file I/O. Spans
+    are dropped while `max_queue` of them wait to be written. Once the file passes `max_bytes` it is moved to
+    `<path>.1`, replacing the previous one, so at most about twice `max_bytes` is kept.
+    """
+
+    def __init__(self, path: Path | str, max_bytes: int = 64 * 1024 * 1024, max_queue: int = 10_000) -> None:
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        self._queue: queue.Queue[Span | None] = queue.Queue(max_queue)
+        self._file = self.path.open("ab")
+        self._thread = threading.Thread(target=self._write_spans, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_spans(self) -> None:
+        while (span := self._queue.get()) is not None:
+            try:
+                self._file.write(orjson.dumps(span.model_dump(), default=str) + b"\n")
+                if self._queue.empty():
+                    self._file.flush()
+                if self._file.tell() >= self.max_bytes:
+                    self._file.close()
+                    self.path.replace(self.path.with_name(f"{self.path.name}.1"))
+                    self._file = self.path.open("ab")
+            except Exception as e:
+                logging.warning(f"Failed to export span {span.name}: {e!r}")
+
+    def shutdown(self) -> None:
+        """Write the spans still queued and close the file."""
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+
+
+_exporter: SpanExporter | None = None
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def configure(exporter: SpanExporter | None) -> None:
+    """Set the exporter finished spans are sent to. Without one, spans are still tracked but not exported."""
+    global _exporter
+    if _exporter is not None:
+        _exporter.shutdown()
+    _exporter = exporter
+
+
+def _new_id(num_bytes: int) -> str:
+    return os.urandom(num_bytes).hex()
+
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+def set_attributes(**attributes: Any) -> None:
+    """Add attributes to the innermost active span, if any."""
+    active = _current_span.get()
+    if active is not None:
+        active.attributes.update(attributes)
+
+
+@contextlib.contextmanager
+def span(name: str, trace_id: str | None = None, **attributes: Any) -> Iterator[Span]:
+    """Time a block as a span nested under the active one.
+
+    A new trace is started if no span is active, using `trace_id` when given so traces can continue one started
+    by the caller, e.g. from an incoming trace header.
+    """
+    parent = _current_span.get()
+    new_span = Span(
+        name=name,
+        trace_id=parent.trace_id if parent is not None else (trace_id or _new_id(16)),
+        span_id=_new_id(8),
+        parent_id=parent.span_id if parent is not None else None,
+        start_time=time.time(),
+        attributes=attributes,
+    )
+    token = _current_span.set(new_span)
+    started = time.perf_counter()
+    try:
+        yield new_span
+    except BaseException as e:
+        new_span.status = "error"
+        new_span.attributes["error_type"] = type(e).__name__
+        raise
+    finally:
+        new_span.duration = time.perf_counter() - started
+        _current_span.reset(token)
+        if _exporter is not None:
+            _exporter.export(new_span)
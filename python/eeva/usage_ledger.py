@@ -0,0 +1,299 @@
+"""Token usage of every model call, kept in a NumPy structured array for vectorized group-by reporting.
+
+Calls are attributed to the user, sample and step of the innermost `scope` they were made in, and recorded in the
+ledger of that scope, or in the installed ledger if no scope sets one. A ledger with `max_records` sums calls with the
+same labels into one record once it holds that many, so a long-running server keeps totals rather than every call.
+"""
+
+import contextlib
+import threading
+from collections.abc import Iterator
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Literal
+
+import numpy as np
+import tabulate
+from numpy import ndarray
+from pydantic import BaseModel, Field
+
+if TYPE_CHECKING:
+    from .models import ModelPricingInfo, ModelSpecifier, UsageData
+
+LEDGER_DTYPE = np.dtype(
+    [
+        ("user", "<i4"),
+        ("sample", "<i4"),
+        ("step", "<i4"),
+        ("model", "<i4"),
+        ("calls", "<i8"),
+        ("input_tokens", "<i8"),
+        ("cached_input_tokens", "<i8"),
+        ("output_tokens", "<i8"),
+        ("reasoning_tokens", "<i8"),
+    ]
+)
+LABEL_COLUMNS = ["user", "sample", "step", "model"]
+TOKEN_COLUMNS = ["input_tokens", "cached_input_tokens", "output_tokens", "reasoning_tokens"]
+
+GroupBy = Literal["user", "sample", "step", "model"]
+
+
+class UsageGroup(BaseModel):
+    key: str = Field(description="User, sample, step or model name, or empty if the calls were made outside one")
+    calls: int = Field()
+    input_tokens: int = Field(description="Input tokens not served from cache")
+    cached_input_tokens: int = Field()
+    output_tokens: int = Field(description="Output tokens, including reasoning tokens")
+    reasoning_tokens: int = Field()
+    cost: float | None = Field(description="Estimated cost in USD, or None if a model in the group has no pricing")
+    reasoning_cost: float | None = Field(description="Part of the cost spent on reasoning tokens, billed as output")
+
+
+def _cost(cost: float) -> float | None:
+    return None if np.isnan(cost) else float(cost)
+
+
+class _Labels:
+    """Interns labels as indices into the ledger columns. Index -1 means no label."""
+
+    def __init__(self) -> None:
+        self.values: list = []
+        self._indices: dict = {}
+
+    def index(self, value) -> int:
+        if value is None:
+            return -1
+        if value not in self._indices:
+            self._indices[value] = len(self.values)
+            self.values.append(value)
+        return self._indices[value]
+
+
+class UsageLedger:
+    def __init__(self, capacity: int = 1024, max_records: int | None = None) -> None:
+        self._lock = threading.Lock()
+        self._records = np.zeros(capacity, dtype=LEDGER_DTYPE)
+        self._size = 0
+        self.max_records = max_records
+        self._labels: dict[str, _Labels] = {"user": _Labels(), "step": _Labels(), "model": _Labels()}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(
+        self,
+        model: "ModelSpecifier",
+        usage: "UsageData",
+        user: str | None = None,
+        sample: int | None = None,
+        step: str | None = None,
+    ) -> None:
+        with self._lock:
+            self._reserve(1)
+            self._records[self._size] = (
+                self._labels["user"].index(user),
+                -1 if sample is None else sample,
+                self._labels["step"].index(step),
+                self._labels["model"].index(model),
+                1,
+                usage.input_tokens,
+                usage.cached_input_tokens,
+                usage.output_tokens,
+                usage.reasoning_tokens,
+            )
+            self._size += 1
+
+    def _reserve(self, num_records: int) -> None:
+        """Make room for `num_records` more records, summing records first if the ledger holds `max_records`."""
+        if self._size + num_records <= len(self._records):
+            return
+        if self.max_records is not None and self._size + num_records > self.max_records:
+            self._compact()
+            if self._size + num_records <= len(self._records):
+                return
+        self._records = np.resize(self._records, max(2 * len(self._records), self._size + num_records))
+
+    def _compact(self) -> None:
+        records = self._records[: self._size]
+        labels, inverse = np.unique(
+            np.stack([records[column] for column in LABEL_COLUMNS], axis=1), axis=0, return_inverse=True
+        )
+        compacted = np.zeros(len(labels), dtype=LEDGER_DTYPE)
+        for i, column in enumerate(LABEL_COLUMNS):
+            compacted[column] = labels[:, i]
+        for column in ["calls", *TOKEN_COLUMNS]:
+            np.add.at(compacted[column], inverse.ravel(), records[column])
+        self._records[: len(compacted)] = compacted
+        self._size = len(compacted)
+
+    @property
+    def records(self) -> ndarray:
+        """A snapshot of the records, each of `calls` calls with the same labels."""
+        with self._lock:
+            return self._records[: self._size].copy()
+
+    @property
+    def models(self) -> list["ModelSpecifier"]:
+        return list(self._labels["model"].values)
+
+    def extend(self, other: "UsageLedger") -> None:
+        """Add the calls recorded in `other`, e.g. by another process."""
+        records = other.records
+        for column, labels in other._labels.items():
+            # Appending -1 makes calls without a label, index -1, keep having none.
+            indices = np.array([*(self._labels[column].index(value) for value in labels.values), -1], dtype="<i4")
+            records[column] = indices[records[column]]
+        with self._lock:
+            self._reserve(len(records))
+            self._records[self._size : self._size + len(records)] = records
+            self._size += len(records)
+
+    def save(self, path: Path) -> None:
+        np.savez(
+            path,
+            records=self.records,
+            users=np.array(self._labels["user"].values, dtype=np.str_),
+            steps=np.array(self._labels["step"].values, dtype=np.str_),
+            models=np.array([model.model_dump_json() for model in self._labels["model"].values], dtype=np.str_),
+        )
+
+    @staticmethod
+    def load(path: Path) -> "UsageLedger":
+        from .models import ModelSpecifier
+
+        ledger = UsageLedger()
+        with np.load(path) as saved:
+            records = saved["records"]
+            ledger._records = np.zeros(len(records), dtype=LEDGER_DTYPE)
+            # Ledgers saved before records were summed have one call per record.
+            ledger._records["calls"] = 1
+            for column in records.dtype.names:
+                ledger._records[column] = records[column]
+            ledger._size = len(records)
+            for column, values in [
+                ("user", saved["users"].tolist()),
+                ("step", saved["steps"].tolist()),
+                ("model", [ModelSpecifier.model_validate_json(model) for model in saved["models"].tolist()]),
+            ]:
+                for value in values:
+                    ledger._labels[column].index(value)
+        return ledger
+
+    def _prices(self, pricing: dict["ModelSpecifier", "ModelPricingInfo"]) -> ndarray:
+        """Prices with shape (num models, 3) for non-cached input, cached input and output. NaN if unknown."""
+        prices = np.full((len(self._labels["model"].values), 3), np.nan)
+        for i, model in enumerate(self._labels["model"].values):
+            if model in pricing:
+                prices[i] = (pricing[model].input, pricing[model].cached_input, pricing[model].output)
+        return prices
+
+    def group(self, by: GroupBy, pricing: dict["ModelSpecifier", "ModelPricingInfo"]) -> list[UsageGroup]:
+        records = self.records
+        prices = self._prices(pricing)[records["model"]]
+        costs = (
+            records["input_tokens"] * prices[:, 0]
+            + records["cached_input_tokens"] * prices[:, 1]
+            + records["output_tokens"] * prices[:, 2]
+        )
+        reasoning_costs = records["reasoning_tokens"] * prices[:, 2]
+        keys, inverse = np.unique(records[by], return_inverse=True)
+        calls = np.bincount(inverse, weights=records["calls"], minlength=len(keys))
+        totals = {
+            column: np.bincount(inverse, weights=records[column], minlength=len(keys)) for column in TOKEN_COLUMNS
+        }
+        group_costs = np.bincount(inverse, weights=costs, minlength=len(keys))
+        group_reasoning_costs = np.bincount(inverse, weights=reasoning_costs, minlength=len(keys))
+        return [
+            UsageGroup(
+                key=self._key(by, int(key)),
+                calls=int(calls[i]),
+                **{column: int(totals[column][i]) for column in TOKEN_COLUMNS},
+                cost=_cost(group_costs[i]),
+                reasoning_cost=_cost(group_reasoning_costs[i]),
+            )
+            for i, key in enumerate(keys)
+        ]
+
+    def _key(self, by: GroupBy, key: int) -> str:
+        if key < 0:
+            return ""
+        if by == "sample":
+            return str(key)
+        value = self._labels[by].values[key]
+        return value if isinstance(value, str) else value.name
+
+    def report(self, by: GroupBy, pricing: dict["ModelSpecifier", "ModelPricingInfo"]) -> str:
+        groups = self.group(by, pricing)
+        return tabulate.tabulate(
+            [
+                [
+                    group.key or "-",
+                    group.calls,
+                    group.input_tokens,
+                    group.cached_input_tokens,
+                    group.output_tokens,
+                    group.reasoning_tokens,
+                    "?" if group.cost is None else f"{group.cost:.4f}$",
+                    "?" if group.reasoning_cost is None else f"{group.reasoning_cost:.4f}$",
+                ]
+                for group in groups
+            ],
+            headers=[
+                by.capitalize(),
+                "Calls",
+                "Input",
+                "Cached input",
+                "Output",
+                "Reasoning",
+                "Cost",
+                "Reasoning cost",
+            ],
+            tablefmt="plain",
+        )
+
+
+@dataclass(frozen=True)
+class _Scope:
+    ledger: UsageLedger | None = None
+    user: str | None = None
+    sample: int | None = None
+    step: str | None = None
+
+
+_scope: ContextVar[_Scope | None] = ContextVar("usage_scope", default=None)
+_installed: UsageLedger | None = None
+
+
+def install(ledger: UsageLedger | None) -> None:
+    """Record calls made outside any scope with a ledger, e.g. in background tasks, in `ledger`."""
+    global _installed
+    _installed = ledger
+
+
+@contextlib.contextmanager
+def scope(
+    ledger: UsageLedger | None = None, user: str | None = None, sample: int | None = None, step: str | None = None
+) -> Iterator[None]:
+    """Attribute calls made inside the block to the given labels. Labels that are not given are inherited."""
+    current = _scope.get() or _Scope()
+    token = _scope.set(
+        _Scope(
+            ledger=ledger if ledger is not None else current.ledger,
+            user=user if user is not None else current.user,
+            sample=sample if sample is not None else current.sample,
+            step=step if step is not None else current.step,
+        )
+    )
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def record(model: "ModelSpecifier", usage: "UsageData") -> None:
+    current = _scope.get() or _Scope()
+    ledger = current.ledger if current.ledger is not None else _installed
+    if ledger is not None:
+        ledger.add(model, usage, user=current.user, sample=current.sample, step=current.step)
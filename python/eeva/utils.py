@@ -1,6 +1,10 @@
+import asyncio
+import contextlib
 import json
+import logging
 import os
 from pathlib import Path
+from typing import AsyncIterator
 
 from pydantic import BaseModel, ConfigDict, alias_generators
 
@@ -19,3 +23,25 @@ def load_secrets(path: str | Path):
     secrets = json.load(open(path))
     for key, value in secrets.items():
         os.environ[key] = value
+
+
+async def _watch_loop_lag(threshold: float, interval: float) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = loop.time() - started - interval
+        if lag > threshold:
+            logging.warning(f"Event loop was blocked for {lag:.3f}s")
+
+
+@contextlib.asynccontextmanager
+async def loop_lag_monitor(threshold: float = 0.1, interval: float = 0.05) -> AsyncIterator[None]:
+    """Log a warning whenever the running event loop stalls for longer than `threshold` seconds."""
+    watcher = asyncio.create_task(_watch_loop_lag(threshold, interval))
+    try:
+        yield
+    finally:
+        watcher.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await watcher
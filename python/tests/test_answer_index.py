@@ -0,0 +1,118 @@
+from pathlib import Path
+
+import pytest
+
+from eeva.experiment import run
+from eeva.experiment.answer_index import AnswerIndex, word_count
+from eeva.experiment.types import (
+    BaseData,
+    CouplePairs,
+    Question,
+    QuestionResponse,
+    QuestionSet,
+    QuestionTranslation,
+    Response,
+    RunConfig,
+    User,
+    UserId,
+    UserSet,
+)
+
+
+def question(examples: list[str]) -> Question:
+    return Question(translations={"en": QuestionTranslation(text="?", examples=examples)}, active=True)
+
+
+def user(name: str, answers: dict[str, str]) -> User:
+    return User(
+        response=Response(
+            first_name=name,
+            last_name="Doe",
+            responses={q: QuestionResponse(question="?", response=text) for q, text in answers.items()},
+        ),
+        prod_profile=None,
+        language_code="en",
+        hidden=False,
+    )
+
+
+QUESTIONS = QuestionSet(
+    {
+        "q1": question(["one two three four"]),
+        "q2": question(["one two", "one two three four five six seven eight"]),
+        "q3": question([]),
+    }
+)
+USERS = UserSet(
+    {
+        UserId("u1"): user("A", {"q1": "a b c", "q2": "a b", "q3": "x"}),
+        UserId("u2"): user("B", {"q1": "a", "q2": "a b c d e f g"}),
+        UserId("u3"): user("C", {"q1": "a b c d e", "q2": "a b c d", "unknown": "a b c"}),
+    }
+)
+
+
+def reference_kept_questions(users: UserSet, questions: QuestionSet, minimum: float) -> dict[UserId, list[str]]:
+    """Per-answer progress filter, as computed before the answer index existed."""
+    kept: dict[UserId, list[str]] = {}
+    for user_id, user in users.items():
+        kept[user_id] = []
+        for question_id, response in user.response.responses.items():
+            if question_id not in questions:
+                continue
+            examples = questions[question_id].translations[user.language_code].examples
+            if not examples:
+                raise ValueError("No examples provided for progress calculation.")
+            if word_count(response.response) / max(word_count(example) for example in examples) >= minimum:
+                kept[user_id].append(question_id)
+    return kept
+
+
+def config(data_dir: Path, **overrides) -> RunConfig:
+    fields = dict(
+        secrets_path=data_dir / "secrets.json",
+        data_dir=data_dir,
+        output_dir=data_dir / "output",
+        model="gpt-5-nano",
+        model_provider="openai",
+        reasoning_effort="minimal",
+        identity_prompt="",
+        identity_extraction_prompt="",
+        explicit_cot=False,
+        two_step_analysis=False,
+        system_prompt=None,
+        user_prompt="",
+        num_tests=1,
+        question_exclusion_sets=set(),
+        question_inclusion_sets=None,
+        user_exclusion_sets=set(),
+        user_inclusion_sets=None,
+        only_couples=False,
+        answer_progress_minimum=0.5,
+        num_answers_minimum=1,
+    )
+    return RunConfig(**{**fields, **overrides})
+
+
+@pytest.mark.parametrize("minimum", [0.0, 0.3, 0.5, 0.75, 1.0])
+def test_answer_mask_matches_per_answer_progress(minimum: float):
+    index = AnswerIndex.build(BaseData(users=USERS, questions=QUESTIONS), "test")
+    questions = QuestionSet({q: QUESTIONS[q] for q in ("q1", "q2")})
+    users = {UserId("u2"), UserId("u3")}
+    kept = index.kept_questions(index.answer_mask(set(questions.keys()), minimum, users))
+    expected = reference_kept_questions(UserSet({u: USERS[u] for u in users}), questions, minimum)
+    assert {user_id: kept[user_id] for user_id in users} == expected
+    assert kept[UserId("u1")] == []
+
+
+def test_answers_without_examples_only_fail_for_included_users(tmp_path: Path):
+    index = AnswerIndex.build(BaseData(users=USERS, questions=QUESTIONS), "test")
+    with pytest.raises(ValueError, match="No examples"):
+        index.answer_mask(set(QUESTIONS.keys()), 0.5)
+    (tmp_path / "user_sets").mkdir()
+    (tmp_path / "user_sets" / "skip.txt").write_text("u1  # answered q3\n", encoding="utf-8")
+    users, _ = run.filter_users(USERS, QUESTIONS, CouplePairs(), config(tmp_path, user_exclusion_sets={"skip"}), index)
+    assert {user_id: list(user.response.responses) for user_id, user in users.items()} == {
+        UserId("u2"): ["q2"],
+        UserId("u3"): ["q1", "q2"],
+    }
@@ -0,0 +1,38 @@
+import pytest
+
+from eeva.experiment.extraction import parse_identity_score
+
+
+@pytest.mark.parametrize(
+    ("text", "expected"),
+    [
+        ("Identity score: 0.72", 0.72),
+        ("**Identity:** 72%", 0.72),
+        ("**Identity score:** .4", 0.4),
+        ("Final score: 72/100", 0.72),
+        ("identity: 0.8 / 1.0", 0.8),
+        ("identity = 72 out of 100", 0.72),
+        ("Identity: 0.3\nOn reflection, identity: 0.9", 0.9),
+    ],
+)
+def test_parses_stated_scores(text: str, expected: float):
+    assert parse_identity_score(text) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "No score here.",
+        "identity: 7",
+        "Identity: 1/10",
+        "identity: 1 out of 10",
+        "Identity score: 1 on a scale of 1-10",
+        "identity = 1/2",
+        "identity: 0.5/5",
+        "Identity: 0.9\nidentity: 8/10",
+        "Identity: 0.3. After reconsidering, final score: 7",
+        "Identity score: 0.4 initially; revised identity score: 1.5",
+    ],
+)
+def test_rejects_ambiguous_scales(text: str):
+    assert parse_identity_score(text) is None
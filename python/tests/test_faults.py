@@ -0,0 +1,101 @@
+import asyncio
+import json
+
+import httpx
+import pydantic
+import pytest
+from langchain_core.exceptions import OutputParserException
+
+from eeva.experiment.faults import RetryPolicies, RetryPolicy, classify_error, with_retries
+
+
+class RateLimitError(Exception):
+    """Stands in for the provider SDKs' error of the same name."""
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int) -> None:
+        super().__init__(status_code)
+        self.status_code = status_code
+
+
+def validation_error() -> pydantic.ValidationError:
+    try:
+        pydantic.TypeAdapter(int).validate_python("not a number")
+    except pydantic.ValidationError as e:
+        return e
+    raise AssertionError("unreachable")
+
+
+def json_error() -> json.JSONDecodeError:
+    try:
+        json.loads("{")
+    except json.JSONDecodeError as e:
+        return e
+    raise AssertionError("unreachable")
+
+
+@pytest.mark.parametrize(
+    ("error", "expected"),
+    [
+        (validation_error(), "invalid_output"),
+        (OutputParserException("no score"), "invalid_output"),
+        (json_error(), "invalid_output"),
+        (TimeoutError(), "transient"),
+        (httpx.ConnectError("refused"), "transient"),
+        (httpx.ReadTimeout("slow"), "transient"),
+        (RateLimitError(), "transient"),
+        (StatusError(429), "transient"),
+        (StatusError(408), "transient"),
+        (StatusError(503), "transient"),
+        (StatusError(401), "fatal"),
+        (StatusError(400), "fatal"),
+        (KeyError("token_usage"), "fatal"),
+    ],
+)
+def test_classify_error(error: BaseException, expected: str):
+    assert classify_error(error) == expected
+
+
+def test_with_retries_retries_transient_errors_only():
+    policies = RetryPolicies(transient=RetryPolicy(max_attempts=3), invalid_output=RetryPolicy(max_attempts=1))
+    calls = []
+
+    async def flaky() -> str:
+        calls.append(1)
+        if len(calls) < 3:
+            raise TimeoutError()
+        return "ok"
+
+    assert asyncio.run(with_retries(policies, flaky)) == "ok"
+    assert len(calls) == 3
+
+    async def invalid() -> str:
+        calls.append(1)
+        raise OutputParserException("no score")
+
+    calls.clear()
+    with pytest.raises(OutputParserException):
+        asyncio.run(with_retries(policies, invalid))
+    assert len(calls) == 1
+
+
+def test_with_retries_counts_attempts_per_error_class():
+    policies = RetryPolicies(transient=RetryPolicy(max_attempts=3), invalid_output=RetryPolicy(max_attempts=2))
+    errors: list[Exception] = [TimeoutError(), TimeoutError(), OutputParserException("no score")]
+    calls = []
+
+    async def flaky() -> str:
+        calls.append(1)
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    assert asyncio.run(with_retries(policies, flaky)) == "ok"
+    assert len(calls) == 4
+
+    errors[:] = [OutputParserException("no score"), TimeoutError(), TimeoutError(), TimeoutError()]
+    calls.clear()
+    with pytest.raises(TimeoutError):
+        asyncio.run(with_retries(policies, flaky))
+    assert len(calls) == 4
@@ -0,0 +1,96 @@
+import asyncio
+import json
+
+import httpx
+from langchain_core.messages import HumanMessage
+from langchain_openai import ChatOpenAI
+from pydantic import BaseModel, SecretStr
+
+from eeva import usage_ledger
+from eeva.models import Model, ModelSpecifier, UsageData
+
+SPECIFIER = ModelSpecifier(name="gpt-5-nano", provider="openai")
+
+
+class Answer(BaseModel):
+    score: int
+
+
+def completion(contents: list[str]) -> dict:
+    return {
+        "id": "chatcmpl-1",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-5-nano",
+        "choices": [
+            {"index": i, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+            for i, content in enumerate(contents)
+        ],
+        "usage": {
+            "prompt_tokens": 100,
+            "completion_tokens": 30,
+            "total_tokens": 130,
+            "prompt_tokens_details": {"cached_tokens": 40},
+            "completion_tokens_details": {"reasoning_tokens": 12},
+        },
+    }
+
+
+def canned_model(contents: list[str]) -> tuple[Model, list[dict]]:
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        return httpx.Response(200, json=completion(contents))
+
+    llm = ChatOpenAI(
+        model="gpt-5-nano",
+        api_key=SecretStr("test"),
+        max_retries=0,
+        http_async_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    return Model(specifier=SPECIFIER, llm=llm), requests
+
+
+EXPECTED_USAGE = UsageData(input_tokens=60, cached_input_tokens=40, output_tokens=30, reasoning_tokens=12)
+
+
+def test_structured_outputs_usage_with_n():
+    model, requests = canned_model([json.dumps({"score": score}) for score in (1, 2, 3)])
+    ledger = usage_ledger.UsageLedger()
+    with usage_ledger.scope(ledger=ledger):
+        outputs, usage = asyncio.run(model.get_structured_outputs([HumanMessage(content="hi")], Answer, n=3))
+    assert [output.score for output in outputs] == [1, 2, 3]
+    assert usage == EXPECTED_USAGE
+    assert requests[0]["n"] == 3
+    assert len(ledger.records) == 1
+
+
+def test_unstructured_outputs_usage_with_n():
+    model, requests = canned_model(["a", "b", "c"])
+    ledger = usage_ledger.UsageLedger()
+    with usage_ledger.scope(ledger=ledger):
+        outputs, usage = asyncio.run(model.get_unstructured_outputs([HumanMessage(content="hi")], n=3))
+    assert outputs == ["a", "b", "c"]
+    assert usage == EXPECTED_USAGE
+    assert requests[0]["n"] == 3
+    assert len(ledger.records) == 1
+
+
+def test_structured_outputs_without_n_records_usage_once(monkeypatch):
+    from langchain_anthropic import ChatAnthropic
+
+    specifier = ModelSpecifier(name="claude-3-5-haiku-20241022", provider="anthropic")
+    model = Model(specifier=specifier, llm=ChatAnthropic(model_name=specifier.name, api_key="test"))  # type: ignore[call-arg]
+
+    async def get_structured_output(self: Model, input, output_type):
+        self._trace_usage(EXPECTED_USAGE)
+        return output_type(samples=[Answer(score=score) for score in (1, 2, 3)]), EXPECTED_USAGE
+
+    monkeypatch.setattr(Model, "get_structured_output", get_structured_output)
+    ledger = usage_ledger.UsageLedger()
+    with usage_ledger.scope(ledger=ledger):
+        outputs, usage = asyncio.run(model.get_structured_outputs([HumanMessage(content="hi")], Answer, n=3))
+    assert [output.score for output in outputs] == [1, 2, 3]
+    assert usage == EXPECTED_USAGE
+    assert len(ledger.records) == 1
@@ -0,0 +1,73 @@
+import json
+from pathlib import Path
+
+import pytest
+from omegaconf import OmegaConf
+
+from eeva.experiment import reanalyze, results_store
+from eeva.experiment.analysis import AnalysisResult, AnalysisResultSet, AnalysisResultUser
+from eeva.experiment.types import Profile, UserId
+from eeva.models import UsageData
+
+ROOT_PATH = Path(__file__).resolve().parents[2]
+USAGE = UsageData(input_tokens=1, cached_input_tokens=0, output_tokens=1, reasoning_tokens=0)
+
+
+def write_data(data_dir: Path) -> None:
+    (data_dir / "prompts").mkdir(parents=True)
+    for name in ["identity", "identity_extraction", "default_system_message", "default_user_message"]:
+        (data_dir / "prompts" / f"{name}.txt").write_text(name, encoding="utf-8")
+    question = {"translations": {"en": {"text": "?", "examples": ["one two"]}}, "active": True}
+    user = {
+        "response": {
+            "first_name": "First",
+            "last_name": "Last",
+            "responses": {"q1": {"question": "?", "response": "a"}},
+        },
+        "prod_profile": None,
+        "language_code": "en",
+        "hidden": False,
+    }
+    base_data = {"users": {"a": user, "b": user}, "questions": {"q1": question}}
+    (data_dir / "base_data.json").write_text(json.dumps(base_data), encoding="utf-8")
+    (data_dir / "couples.json").write_text(json.dumps({"c1": ["a", "b"]}), encoding="utf-8")
+
+
+def write_run(run_dir: Path, data_dir: Path, identity: float, **config: object) -> None:
+    (run_dir / ".hydra").mkdir(parents=True)
+    OmegaConf.save(
+        OmegaConf.create({"data_dir": str(data_dir), "user_exclusion_sets": [], **config}),
+        run_dir / ".hydra" / "config.yaml",
+    )
+    result = AnalysisResultUser(
+        first_name="First",
+        last_name="Last",
+        llm_messages=[],
+        analysis_results=[AnalysisResult(profile=Profile(identity=identity), cot=None, response_metadata=USAGE)],
+    )
+    with results_store.ResultsWriter(run_dir / "results") as writer:
+        writer.add_all(AnalysisResultSet({UserId("a"): result, UserId("b"): result}))
+
+
+def test_merges_runs_differing_only_in_output(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(reanalyze, "ROOT_PATH", ROOT_PATH)
+    write_data(tmp_path / "data")
+    write_run(tmp_path / "run1", tmp_path / "data", 0.25, export_analysis_json=False)
+    write_run(tmp_path / "run2", tmp_path / "data", 0.75, export_analysis_json=True)
+
+    config = reanalyze.reanalyze([tmp_path / "run1", tmp_path / "run2"], [], tmp_path / "merged")
+
+    merged = results_store.ResultsReader(tmp_path / "merged" / "results")
+    assert merged.identity_matrix([UserId("a"), UserId("b")]).tolist() == [[0.25, 0.75], [0.25, 0.75]]
+    assert config.num_tests == 2
+    assert (tmp_path / "merged" / "couples_report.json").exists()
+
+
+def test_refuses_runs_differing_in_analysis(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(reanalyze, "ROOT_PATH", ROOT_PATH)
+    write_data(tmp_path / "data")
+    write_run(tmp_path / "run1", tmp_path / "data", 0.25)
+    write_run(tmp_path / "run2", tmp_path / "data", 0.75, explicit_cot=False)
+
+    with pytest.raises(ValueError, match="explicit_cot"):
+        reanalyze.reanalyze([tmp_path / "run1", tmp_path / "run2"], [], tmp_path / "merged")
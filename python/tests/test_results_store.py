@@ -0,0 +1,69 @@
+from pathlib import Path
+
+import numpy as np
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from eeva.experiment import results_store
+from eeva.experiment.analysis import AnalysisResult, AnalysisResultSet, AnalysisResultUser
+from eeva.experiment.extraction import Extraction
+from eeva.experiment.faults import SampleFailure
+from eeva.experiment.types import Profile, UserId
+from eeva.models import ModelSpecifier, UsageData
+
+
+def sample(identity: float, cot: str | None, extraction: Extraction | None = None) -> AnalysisResult:
+    return AnalysisResult(
+        profile=Profile(identity=identity),
+        cot=cot,
+        response_metadata=UsageData(input_tokens=10, cached_input_tokens=5, output_tokens=3, reasoning_tokens=1),
+        model=ModelSpecifier(name="gpt-5-nano", provider="openai"),
+        extraction=extraction,
+    )
+
+
+def result_set() -> AnalysisResultSet:
+    no_usage = UsageData(input_tokens=0, cached_input_tokens=0, output_tokens=0, reasoning_tokens=0)
+    messages = [SystemMessage(content="system"), HumanMessage(content="answers")]
+    return AnalysisResultSet(
+        {
+            UserId("a"): AnalysisResultUser(
+                first_name="Ann",
+                last_name="Lee",
+                llm_messages=messages,
+                analysis_results=[sample(0.25, "same"), sample(0.5, "same"), sample(0.75, None)],
+            ),
+            UserId("b"): AnalysisResultUser(
+                first_name="Bo",
+                last_name="Kim",
+                llm_messages=messages,
+                analysis_results=[sample(0.1, "other", Extraction(path="local", usage=no_usage))],
+                failures=[SampleFailure.from_error(1, TimeoutError("slow"))],
+            ),
+        }
+    )
+
+
+def test_round_trip(tmp_path: Path):
+    result = result_set()
+    with results_store.ResultsWriter(tmp_path) as writer:
+        writer.add_all(result)
+    loaded = results_store.ResultsReader(tmp_path).to_result_set()
+    assert loaded.model_dump() == result.model_dump()
+
+
+def test_blobs_are_deduplicated(tmp_path: Path):
+    with results_store.ResultsWriter(tmp_path) as writer:
+        writer.add_all(result_set())
+    reader = results_store.ResultsReader(tmp_path)
+    # Two messages, two CoTs and one model, plus the extraction, each stored once.
+    assert len(reader._blob_index) == 6
+
+
+def test_identity_matrix(tmp_path: Path):
+    with results_store.ResultsWriter(tmp_path) as writer:
+        writer.add_all(result_set())
+    reader = results_store.ResultsReader(tmp_path)
+    np.testing.assert_array_equal(
+        reader.identity_matrix([UserId("b"), UserId("a")]), [[0.1, np.nan, np.nan], [0.25, 0.5, 0.75]]
+    )
+    np.testing.assert_array_equal(reader.identity_matrix([UserId("b")]), [[0.1]])
@@ -0,0 +1,94 @@
+import asyncio
+from pathlib import Path
+
+from eeva.experiment import analysis, results_store, shards
+from eeva.experiment.analysis import AnalysisResult, AnalysisResultSet, AnalysisResultUser
+from eeva.experiment.faults import SampleFailure
+from eeva.experiment.types import Profile, Response, User, UserId, UserSet
+from eeva.models import UsageData
+
+USAGE = UsageData(input_tokens=1, cached_input_tokens=0, output_tokens=1, reasoning_tokens=0)
+
+
+def user_result(num_scored: int, errors: list[BaseException]) -> AnalysisResultUser:
+    return AnalysisResultUser(
+        first_name="First",
+        last_name="Last",
+        llm_messages=[],
+        analysis_results=[
+            AnalysisResult(profile=Profile(identity=0.5), cot=None, response_metadata=USAGE) for _ in range(num_scored)
+        ],
+        failures=[SampleFailure.from_error(num_scored + i, error) for i, error in enumerate(errors)],
+    )
+
+
+def write_attempt(path: Path, attempt: int, results: dict[str, AnalysisResultUser]) -> None:
+    with results_store.ResultsWriter(path / str(attempt) / "results") as writer:
+        writer.add_all(AnalysisResultSet({UserId(user_id): result for user_id, result in results.items()}))
+
+
+def users(*user_ids: str) -> UserSet:
+    user = User(
+        response=Response(first_name="First", last_name="Last", responses={}),
+        prod_profile=None,
+        language_code="en",
+        hidden=False,
+    )
+    return UserSet({UserId(user_id): user for user_id in user_ids})
+
+
+def test_resume_retries_only_users_with_retryable_failures(tmp_path: Path):
+    write_attempt(
+        tmp_path,
+        0,
+        {
+            "scored": user_result(2, []),
+            "timed-out": user_result(1, [TimeoutError()]),
+            "fatal": user_result(1, [PermissionError()]),
+        },
+    )
+    completed = shards.load_shard_results(tmp_path)
+    unfinished = shards.unfinished_users(users("scored", "timed-out", "fatal", "new"), completed)
+    assert set(unfinished.keys()) == {UserId("timed-out"), UserId("new")}
+
+
+def test_attempt_with_fewest_failures_is_kept(tmp_path: Path):
+    write_attempt(tmp_path, 0, {"a": user_result(1, [TimeoutError()]), "b": user_result(2, [])})
+    write_attempt(tmp_path, 1, {"a": user_result(2, []), "b": user_result(0, [TimeoutError(), TimeoutError()])})
+    completed = shards.load_shard_results(tmp_path)
+    assert completed[UserId("a")].failures == []
+    assert len(completed[UserId("b")].analysis_results) == 2
+    assert not shards.unfinished_users(users("a", "b"), completed)
+
+
+class FakeAnalyzer:
+    cache_aware = False
+
+    def __init__(self) -> None:
+        self.num_samples: list[int] = []
+
+    async def generate_user_profiles(
+        self, user_id: UserId, user: User, num_samples: int
+    ) -> tuple[UserId, AnalysisResultUser]:
+        self.num_samples.append(num_samples)
+        return user_id, user_result(num_samples, [])
+
+
+def test_resume_keeps_successful_samples(tmp_path: Path):
+    write_attempt(tmp_path, 0, {"a": user_result(2, [TimeoutError(), PermissionError(), TimeoutError()])})
+    completed = shards.load_shard_results(tmp_path)
+    remaining = shards.unfinished_users(users("a", "new"), completed)
+    analyzer = FakeAnalyzer()
+    result = asyncio.run(
+        analysis.generate_profiles(
+            analyzer,  # type: ignore[arg-type]  # Only generate_user_profiles and cache_aware are used.
+            remaining,
+            num_tests=5,
+            user_subset=None,
+            previous={user_id: completed[user_id] for user_id in remaining.keys() if user_id in completed},
+        )
+    )
+    assert sorted(analyzer.num_samples) == [2, 5]
+    assert len(result[UserId("a")].analysis_results) == 4
+    assert [failure.error_class for failure in result[UserId("a")].failures] == ["fatal"]
+    assert len(result[UserId("new")].analysis_results) == 5
@@ -0,0 +1,99 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from eeva import analyzer
+from eeva.analyzer import Profile, RelationshipProfile, Response
+from eeva.server.matching import IdentityIndex
+from eeva.server.speculation import SpeculationConfig, SpeculativeScheduler
+from eeva.server.store import ProfileStore, content_hash
+
+
+class FakeLlm:
+    async def get(self) -> object:
+        return object()
+
+
+def scheduler_for(store: ProfileStore) -> tuple[SpeculativeScheduler, IdentityIndex]:
+    index = IdentityIndex()
+    config = SpeculationConfig(candidates_per_profile=1, idle_poll_interval=0.01)
+    return SpeculativeScheduler(config, store, index, FakeLlm(), Path()), index  # type: ignore[arg-type]
+
+
+def add_profile(store: ProfileStore, index: IdentityIndex, user_id: str, identity: float) -> Response:
+    response = Response(first_name=user_id, last_name=None, responses={})
+    store.put_profile(user_id, response, Profile(identity=identity, horoscope=""))
+    index.update(user_id, identity)
+    return response
+
+
+def test_stop_leaves_in_flight_analysis_to_waiting_requests(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    release = asyncio.Event()
+
+    async def analyze_relationship(*args: object) -> RelationshipProfile:
+        await release.wait()
+        return RelationshipProfile(horoscope="together")
+
+    monkeypatch.setattr(analyzer, "analyze_relationship", analyze_relationship)
+
+    async def main() -> None:
+        store = ProfileStore(tmp_path / "store.db")
+        scheduler, index = scheduler_for(store)
+        a = add_profile(store, index, "a", 0.1)
+        b = add_profile(store, index, "b", 0.2)
+        scheduler.start()
+        scheduler.schedule("a")
+        while scheduler.in_flight(content_hash(a), content_hash(b)) is None:
+            await asyncio.sleep(0.01)
+        speculative = scheduler.in_flight(content_hash(a), content_hash(b))
+        assert speculative is not None
+
+        async def await_speculation() -> RelationshipProfile:
+            # As the relationship endpoint does.
+            return await asyncio.shield(speculative)
+
+        request = asyncio.create_task(await_speculation())
+        stopping = asyncio.create_task(scheduler.stop())
+        await asyncio.sleep(0.01)
+        release.set()
+        assert (await request).horoscope == "together"
+        await stopping
+        assert not speculative.cancelled()
+        store.close()
+
+    asyncio.run(main())
+
+
+def test_worker_survives_errors(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    async def analyze_relationship(*args: object) -> RelationshipProfile:
+        return RelationshipProfile(horoscope="together")
+
+    monkeypatch.setattr(analyzer, "analyze_relationship", analyze_relationship)
+
+    async def main() -> None:
+        store = ProfileStore(tmp_path / "store.db")
+        scheduler, index = scheduler_for(store)
+        a = add_profile(store, index, "a", 0.1)
+        b = add_profile(store, index, "b", 0.2)
+        get_profile = store.get_profile
+        failures = [RuntimeError("database is locked")]
+
+        def flaky_get_profile(user_id: str):
+            if failures:
+                raise failures.pop()
+            return get_profile(user_id)
+
+        monkeypatch.setattr(store, "get_profile", flaky_get_profile)
+        scheduler.start()
+        scheduler.schedule("a")
+        scheduler.schedule("b")
+        for _ in range(100):
+            if store.get_relationship(content_hash(a), content_hash(b)) is not None:
+                break
+            await asyncio.sleep(0.01)
+        assert store.get_relationship(content_hash(a), content_hash(b)) is not None
+        await scheduler.stop()
+        store.close()
+
+    asyncio.run(main())
@@ -0,0 +1,56 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from eeva import usage_ledger
+from eeva.models import ModelSpecifier, UsageData, model_pricing
+
+MODELS = [ModelSpecifier(name="gpt-5-nano", provider="openai"), ModelSpecifier(name="gpt-5", provider="openai")]
+
+
+def fill(ledger: usage_ledger.UsageLedger, num_calls: int) -> None:
+    for i in range(num_calls):
+        usage = UsageData(input_tokens=i, cached_input_tokens=i % 7, output_tokens=2 * i, reasoning_tokens=i % 3)
+        ledger.add(MODELS[i % 2], usage, step=f"/step-{i % 5}", sample=i % 4 if i % 3 else None)
+
+
+def test_bounded_ledger_keeps_totals():
+    full = usage_ledger.UsageLedger(capacity=16)
+    bounded = usage_ledger.UsageLedger(capacity=16, max_records=64)
+    fill(full, 5_000)
+    fill(bounded, 5_000)
+    assert len(full) == 5_000
+    assert len(bounded) <= 64
+    for by in ["step", "model", "sample"]:
+        groups = bounded.group(by, model_pricing)
+        expected = full.group(by, model_pricing)
+        assert [group.model_dump(exclude={"cost", "reasoning_cost"}) for group in groups] == [
+            group.model_dump(exclude={"cost", "reasoning_cost"}) for group in expected
+        ]
+        assert [cost for group in groups for cost in (group.cost, group.reasoning_cost)] == pytest.approx(
+            [cost for group in expected for cost in (group.cost, group.reasoning_cost)]
+        )
+
+
+def test_extend_and_save_keep_call_counts(tmp_path: Path):
+    bounded = usage_ledger.UsageLedger(capacity=16, max_records=32)
+    fill(bounded, 1_000)
+    bounded.save(tmp_path / "ledger.npz")
+    loaded = usage_ledger.UsageLedger.load(tmp_path / "ledger.npz")
+    merged = usage_ledger.UsageLedger()
+    merged.extend(loaded)
+    merged.extend(loaded)
+    assert sum(group.calls for group in merged.group("model", model_pricing)) == 2_000
+
+
+def test_load_ledger_saved_without_call_counts(tmp_path: Path):
+    ledger = usage_ledger.UsageLedger()
+    fill(ledger, 10)
+    ledger.save(tmp_path / "ledger.npz")
+    with np.load(tmp_path / "ledger.npz") as saved:
+        arrays = dict(saved)
+    names = [name for name in usage_ledger.LEDGER_DTYPE.names or () if name != "calls"]
+    arrays["records"] = arrays["records"][names]
+    np.savez(tmp_path / "old.npz", **arrays)
+    assert [group.calls for group in usage_ledger.UsageLedger.load(tmp_path / "old.npz").group("model", {})] == [5, 5]